@@ -0,0 +1,47 @@
+"""Deleting a user account together with everything it owns.
+
+The ORM would load every recipe of the user, and every row hanging off
+each recipe, to delete them one at a time. delete_account issues one
+DELETE ... WHERE per table instead, keyed on the user's recipes. The
+foreign keys cascade in the database as well, but the dependent rows are
+deleted explicitly first so a database that predates that migration, or
+a SQLite connection without foreign_keys on, keeps no orphans either.
+"""
+import search
+from extensions import db, user_cache
+from models import CacheVersion, Recipe, RecipeIngredient, RecipeNeighbor, RecipeNeighborList, User, recipe_categories, recipe_tags
+
+
+def delete_account(user_id):
+    """Delete a user, their recipes and the rows that depend on them; returns the number of recipes.
+
+    Runs in the caller's transaction and commits it. The ORM events for
+    users and recipes don't fire for bulk deletes, so the search index and
+    the 'users' and 'recipes' versions are updated here.
+    """
+    owned = db.select(Recipe.id).where(Recipe.user_id == user_id).scalar_subquery()
+    recipe_ids = db.session.execute(db.select(Recipe.id).where(Recipe.user_id == user_id)).scalars().all()
+    # The commit expires whatever the session holds, so there is nothing to keep in step
+    options = {'synchronize_session': False}
+
+    # Other recipes' neighbor lists lose them too; the next compute-neighbors refills those
+    db.session.execute(db.delete(RecipeNeighbor).where(
+        RecipeNeighbor.recipe_id.in_(owned) | RecipeNeighbor.neighbor_id.in_(owned)
+    ), execution_options=options)
+    db.session.execute(db.delete(RecipeNeighborList).where(RecipeNeighborList.recipe_id.in_(owned)),
+                       execution_options=options)
+    db.session.execute(db.delete(RecipeIngredient).where(RecipeIngredient.recipe_id.in_(owned)),
+                       execution_options=options)
+    db.session.execute(recipe_tags.delete().where(recipe_tags.c.recipe_id.in_(owned)))
+    db.session.execute(recipe_categories.delete().where(recipe_categories.c.recipe_id.in_(owned)))
+    connection = db.session.connection()
+    search.unindex_recipes(connection, recipe_ids)
+    db.session.execute(db.delete(Recipe).where(Recipe.user_id == user_id), execution_options=options)
+    db.session.execute(db.delete(User).where(User.id == user_id), execution_options=options)
+    if recipe_ids:
+        CacheVersion.bump(connection, 'recipes')
+    CacheVersion.bump(connection, 'users')
+    db.session.commit()
+    # Deleted recipes 404 before their cached fragments are looked at, so those just age out
+    user_cache.invalidate(user_id)
+    return len(recipe_ids)
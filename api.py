@@ -0,0 +1,253 @@
+"""Read-only JSON API, mounted at /api/v1.
+
+    GET /api/v1/recipes?cursor=&limit=&fields=&include=
+    GET /api/v1/recipes/<id>?fields=&include=
+    GET /api/v1/search?q=&cursor=&limit=&fields=&include=
+    GET /api/v1/tags
+    GET /api/v1/ingredients?q=&limit=
+
+fields picks the recipe attributes to return (and to load) from
+FIELDS plus 'author'; include adds 'ingredients' and/or 'tags', each
+loaded with one batched query per page. Lists are paged with the opaque
+next_cursor of the previous page. Responses carry a weak ETag for
+If-None-Match and are compressed with brotli (when installed) or gzip.
+"""
+import base64
+import binascii
+import gzip
+
+from flask import Blueprint, current_app, jsonify, make_response, request, url_for
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import search
+from autocomplete import MAX_SUGGESTIONS, ingredient_autocomplete
+from extensions import db
+from http_cache import make_etag
+from models import Recipe, RecipeIngredient, User
+from pagination import decode_cursor, paginate_recipes
+from taxonomy import taxonomy
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+FIELDS = {
+    'title': Recipe.title,
+    'description': Recipe.description,
+    'instructions': Recipe.instructions,
+    'prep_time_minutes': Recipe.prep_time_minutes,
+    'cook_time_minutes': Recipe.cook_time_minutes,
+    'servings': Recipe.servings,
+    'created_at': Recipe.created_at,
+    'updated_at': Recipe.updated_at,
+}
+RELATIONS = ('author',)
+INCLUDES = ('ingredients', 'tags')
+DEFAULT_FIELDS = [name for name in FIELDS if name != 'instructions'] + ['author']
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@api.errorhandler(ApiError)
+def _api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+
+@api.errorhandler(404)
+def _not_found(error):
+    return jsonify({'error': 'Not found'}), 404
+
+
+def _names(param, allowed, default):
+    value = request.args.get(param)
+    if value is None:
+        return list(default)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ApiError(400, f"Unknown {param}: {', '.join(unknown)}")
+    return names
+
+
+def _fields_and_includes():
+    fields = _names('fields', list(FIELDS) + list(RELATIONS), DEFAULT_FIELDS)
+    include = _names('include', INCLUDES, [])
+    return fields, include
+
+
+def _limit():
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    return min(max(limit, 1), current_app.config['API_MAX_PAGE_SIZE'])
+
+
+def _load_options(fields, include):
+    """Loader options that fetch exactly the columns and relations asked for."""
+    # id and the cursor/ETag columns are always needed
+    columns = [FIELDS[name] for name in fields if name in FIELDS]
+    options = [load_only(Recipe.id, Recipe.created_at, Recipe.updated_at, *columns)]
+    if 'author' in fields:
+        options.append(joinedload(Recipe.author).load_only(User.username))
+    if 'ingredients' in include:
+        options.append(selectinload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient))
+    if 'tags' in include:
+        options.append(selectinload(Recipe.tags))
+    return options
+
+
+def serialize(recipe, fields, include):
+    data = {'id': recipe.id}
+    for name in fields:
+        if name in FIELDS:
+            value = getattr(recipe, name)
+            data[name] = value.isoformat() if hasattr(value, 'isoformat') else value
+    if 'author' in fields:
+        data['author'] = recipe.author.username
+    if 'ingredients' in include:
+        data['ingredients'] = [
+            {'name': item.ingredient.name, 'quantity': float(item.quantity), 'unit': item.unit}
+            for item in recipe.ingredients
+        ]
+    if 'tags' in include:
+        # Tag types come from the per-worker taxonomy instead of another query
+        data['tags'] = [
+            {'id': tag.id, 'name': tag.name, 'type': info.type_name if info else None}
+            for tag, info in ((tag, taxonomy.get(tag.id)) for tag in recipe.tags)
+        ]
+    return data
+
+
+def _recipes_etag(recipes):
+    keys = [f'{recipe.id}:{recipe.updated_at.isoformat() if recipe.updated_at else ""}' for recipe in recipes]
+    return make_etag('api', request.path, request.query_string.decode(), *keys)
+
+
+def _respond(payload, etag):
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+    return response
+
+
+def _next_link(endpoint, next_cursor):
+    if next_cursor is None:
+        return None
+    args = {key: value for key, value in request.args.items() if key != 'cursor'}
+    return url_for(endpoint, **args, cursor=next_cursor)
+
+
+@api.route('/recipes')
+def recipes():
+    fields, include = _fields_and_includes()
+    cursor = request.args.get('cursor')
+    if cursor and decode_cursor(cursor) is None:
+        raise ApiError(400, 'Invalid cursor')
+    page = paginate_recipes(Recipe.query.options(*_load_options(fields, include)), cursor, _limit())
+    payload = {
+        'data': [serialize(recipe, fields, include) for recipe in page.items],
+        'next_cursor': page.next_cursor,
+        'next': _next_link('api.recipes', page.next_cursor),
+    }
+    return _respond(payload, _recipes_etag(page.items))
+
+
+@api.route('/recipes/<int:recipe_id>')
+def recipe(recipe_id):
+    fields, include = _fields_and_includes()
+    recipe = db.session.get(Recipe, recipe_id, options=_load_options(fields, include), populate_existing=True)
+    if recipe is None:
+        raise ApiError(404, 'Recipe not found')
+    return _respond({'data': serialize(recipe, fields, include)}, _recipes_etag([recipe]))
+
+
+def _encode_offset(offset):
+    return base64.urlsafe_b64encode(f'o{offset}'.encode()).decode().rstrip('=')
+
+
+def _decode_offset(cursor):
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        if raw.startswith('o') and int(raw[1:]) >= 0:
+            return int(raw[1:])
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        pass
+    raise ApiError(400, 'Invalid cursor')
+
+
+@api.route('/search')
+def search_recipes():
+    fields, include = _fields_and_includes()
+    search_query = request.args.get('q', '').strip()
+    if not search_query:
+        raise ApiError(400, 'Missing q')
+    # Results are ranked, not ordered by a column, so the cursor is an offset
+    offset, limit = _decode_offset(request.args.get('cursor')), _limit()
+    ids = search.matching_ids(search_query, limit + 1, offset)
+    next_cursor = _encode_offset(offset + limit) if len(ids) > limit else None
+    ids = ids[:limit]
+
+    by_id = {}
+    if ids:
+        loaded = Recipe.query.options(*_load_options(fields, include)).filter(Recipe.id.in_(ids)).all()
+        by_id = {recipe.id: recipe for recipe in loaded}
+    recipes = [by_id[recipe_id] for recipe_id in ids if recipe_id in by_id]
+    payload = {
+        'data': [serialize(recipe, fields, include) for recipe in recipes],
+        'next_cursor': next_cursor,
+        'next': _next_link('api.search_recipes', next_cursor),
+    }
+    return _respond(payload, _recipes_etag(recipes))
+
+
+@api.route('/tags')
+def tags():
+    payload = {
+        'data': {
+            type_name: [{'id': tag.id, 'name': tag.name} for tag in taxonomy.tags(type_name)]
+            for type_name in taxonomy.type_names()
+        }
+    }
+    keys = [f'{tag["id"]}:{tag["name"]}' for tags in payload['data'].values() for tag in tags]
+    return _respond(payload, make_etag('api', request.path, *payload['data'], *keys))
+
+
+@api.route('/ingredients')
+def ingredients():
+    """Ingredient names with a word starting with q, most used first."""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_SUGGESTIONS)
+    suggestions = ingredient_autocomplete.suggest(request.args.get('q', ''), limit)
+    response = jsonify({'data': [suggestion._asdict() for suggestion in suggestions]})
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+    return response
+
+
+@api.after_request
+def compress(response):
+    """Compress JSON bodies with brotli or gzip when the client accepts it."""
+    if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < current_app.config['API_COMPRESS_MIN_SIZE']:
+        return response
+    if brotli is not None and request.accept_encodings['br']:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -1,12 +1,22 @@
 import logging
+import click
+from datetime import datetime
 from urllib.parse import (
     urlparse, urlunparse, urlsplit, urlunsplit, quote, quote_plus,
     unquote, unquote_plus, urlencode, parse_qs, parse_qsl, urljoin
 )
-from flask import Flask, render_template, url_for, flash, redirect, request
+from flask import (
+    Flask, Response, render_template, url_for, flash, redirect, request, make_response, stream_with_context
+)
+from markupsafe import Markup
 from flask_login import LoginManager, UserMixin, login_user, current_user, logout_user, login_required
+from sqlalchemy.orm import joinedload, load_only, selectinload
 from config import Config
-from extensions import db, migrate, bcrypt, login_manager
+from extensions import db, migrate, bcrypt, login_manager, fragment_cache, user_cache, password_hasher
+from sqlite_tuning import sqlite_tuning, run_maintenance
+from instrumentation import instrumentation
+from assets import assets, build as build_asset_files
+from images import recipe_images
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -18,13 +28,42 @@ app.config.from_object(Config)
 
 # Initialize all extensions with the app
 db.init_app(app)
+sqlite_tuning.init_app(app)
+instrumentation.init_app(app)
 migrate.init_app(app, db)
 bcrypt.init_app(app)
 login_manager.init_app(app)
+fragment_cache.init_app(app)
+user_cache.init_app(app)
+password_hasher.init_app(app)
+assets.init_app(app)
+recipe_images.init_app(app)
 
 # Import models and forms
-from models import User, Recipe, RecipeIngredient, Ingredient, Tag, TagType  # noqa: E402
-from forms import RegistrationForm, LoginForm, RecipeForm, IngredientForm  # noqa: E402
+from models import User, Recipe, RecipeIngredient, Ingredient, Tag, TagType, CacheVersion, recipe_tags  # noqa: E402
+from forms import RegistrationForm, LoginForm, RecipeForm, IngredientForm, DeleteAccountForm  # noqa: E402
+from pagination import paginate_recipes  # noqa: E402
+import search  # noqa: E402
+from ingredients import normalize_name, resolve_ingredient_ids, update_recipe_ingredients  # noqa: E402
+from cache import recipe_fragment_key  # noqa: E402
+from taxonomy import taxonomy, update_recipe_tags  # noqa: E402
+from recipe_index import cook_with, ingredient_index, tag_index  # noqa: E402
+from autocomplete import ingredient_autocomplete  # noqa: E402
+import facets  # noqa: E402
+import importer  # noqa: E402
+import exporter  # noqa: E402
+import shopping  # noqa: E402
+import accounts  # noqa: E402
+import recommendations  # noqa: E402
+from api import api  # noqa: E402
+import query_plans  # noqa: E402
+from http_cache import cache_headers, make_etag, not_modified, recipes_etag, viewer_key  # noqa: E402
+
+taxonomy.init_app(app)
+ingredient_index.init_app(app)
+tag_index.init_app(app)
+ingredient_autocomplete.init_app(app)
+app.register_blueprint(api)
 
 # Add custom Jinja2 filters
 @app.template_filter('nl2br')
@@ -35,7 +74,8 @@ def nl2br_filter(text):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(db.session, User, int(user_id),
+                           lambda: CacheVersion.current(db.session.connection(), 'users'))
 
 @app.route('/')
 def landing():
@@ -45,8 +85,16 @@ def landing():
 @app.route('/home')
 @login_required
 def home():
-    recipes = Recipe.query.all()
-    return render_template('home.html', recipes=recipes)
+    # Author and tags are loaded in bulk so each card doesn't issue its own queries
+    query = Recipe.query.options(joinedload(Recipe.author), selectinload(Recipe.tags))
+    cursor = request.args.get('cursor')
+    page = paginate_recipes(query, cursor, app.config['RECIPES_PER_PAGE'])
+    etag = recipes_etag(page.items, 'home', cursor, page.next_cursor)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    response = make_response(render_template('home.html', recipes=page.items, page=page))
+    return cache_headers(response, etag)
 
 @app.route('/about')
 def about():
@@ -63,6 +111,10 @@ def login():
         if user is None or not user.check_password(form.password.data):
             flash('Invalid email or password')
             return redirect(url_for('login'))
+        if user.password_needs_rehash():
+            # Hash parameters were raised since this password was set
+            user.set_password(form.password.data)
+            db.session.commit()
         login_user(user, remember=form.remember_me.data)
         next_page = request.args.get('next')
         if not next_page or urlparse(next_page).netloc != '':
@@ -89,11 +141,27 @@ def logout():
     logout_user()
     return redirect(url_for('landing'))
 
+@app.route('/account/delete', methods=['GET', 'POST'])
+@login_required
+def delete_account():
+    form = DeleteAccountForm()
+    if form.validate_on_submit():
+        if not current_user.check_password(form.password.data):
+            flash('Incorrect password.', 'danger')
+            return redirect(url_for('delete_account'))
+        user_id = current_user.id
+        logout_user()
+        deleted = accounts.delete_account(user_id)
+        flash(f'Your account and {deleted} recipe(s) have been deleted.', 'success')
+        return redirect(url_for('landing'))
+    return render_template('delete_account.html', title='Delete Account', form=form)
+
 @app.route('/new_recipe', methods=['GET', 'POST'])
 @login_required
 def new_recipe():
     form = RecipeForm()
     if form.validate_on_submit():
+        image_filename = form.save_image()
         recipe = Recipe(
             title=form.title.data,
             description=form.description.data,
@@ -101,30 +169,39 @@ def new_recipe():
             prep_time_minutes=form.prep_time_minutes.data,
             cook_time_minutes=form.cook_time_minutes.data or 0,
             servings=form.servings.data,
+            image_filename=image_filename,
             user_id=current_user.id
         )
         db.session.add(recipe)
-        db.session.commit()
+        # Flush to get the recipe id; everything below commits together
+        db.session.flush()
+
+        # Resolve all ingredient names at once, creating any new ones
+        entries = [
+            (normalize_name(entry.ingredient_name.data), entry.ingredient_quantity.data, entry.ingredient_unit.data)
+            for entry in form.ingredients.entries
+        ]
+        ingredient_ids = resolve_ingredient_ids([name for name, _, _ in entries])
+        recipe_ingredients = [
+            {
+                'recipe_id': recipe.id,
+                'ingredient_id': ingredient_ids[name],
+                'quantity': float(quantity),
+                'unit': unit
+            }
+            for name, quantity, unit in entries if name
+        ]
+        if recipe_ingredients:
+            db.session.execute(db.insert(RecipeIngredient), recipe_ingredients)
 
-        # Add ingredients
-        for ingredient_form in form.ingredients.entries:
-            # Get or create ingredient
-            ingredient = Ingredient.query.filter_by(name=ingredient_form.ingredient_name.data).first()
-            if not ingredient:
-                ingredient = Ingredient(name=ingredient_form.ingredient_name.data)
-                db.session.add(ingredient)
-                db.session.commit()
-
-            # Create recipe ingredient relationship
-            recipe_ingredient = RecipeIngredient(
-                recipe_id=recipe.id,
-                ingredient_id=ingredient.id,
-                quantity=float(ingredient_form.ingredient_quantity.data),
-                unit=ingredient_form.ingredient_unit.data
-            )
-            db.session.add(recipe_ingredient)
+        tag_ids = set(form.meal_tags.data or []) | set(form.diet_tags.data or [])
+        if tag_ids:
+            db.session.execute(recipe_tags.insert(), [{'recipe_id': recipe.id, 'tag_id': tag_id} for tag_id in tag_ids])
 
         db.session.commit()
+        if recipe.image_filename:
+            # Resized copies are made off the request; cards show the original until then
+            recipe_images.process(recipe.image_filename)
         flash('Your recipe has been created!', 'success')
         return redirect(url_for('recipe', recipe_id=recipe.id))
 
@@ -133,24 +210,112 @@ def new_recipe():
 @app.route('/recipe/<int:recipe_id>')
 def recipe(recipe_id):
     recipe = Recipe.query.get_or_404(recipe_id)
-    return render_template('recipe.html', recipe=recipe)
+    # Read on every request rather than cached with the body: the lists change without the recipe
+    related = recommendations.related_recipes(recipe_id, app.config['RECIPE_NEIGHBORS'])
+    related_keys = [f'{other.id}:{other.updated_at.isoformat()}:{computed_at.isoformat()}' for other, computed_at in related]
+    etag = make_etag('recipe', recipe.id, recipe.updated_at.isoformat(), viewer_key(), *related_keys)
+    last_modified = max([recipe.updated_at] + [computed_at for _, computed_at in related])
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+
+    key = recipe_fragment_key(recipe_id)
+    version = recipe.updated_at.isoformat()
+    body = fragment_cache.get(key, version)
+    if body is None:
+        # Cache miss: load everything the fragment shows in bulk, then render it
+        recipe = db.session.get(Recipe, recipe_id, populate_existing=True, options=[
+            joinedload(Recipe.author),
+            selectinload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient)
+        ])
+        body = render_template('_recipe_body.html', recipe=recipe)
+        fragment_cache.set(key, version, body)
+    response = make_response(render_template(
+        'recipe.html', recipe=recipe, recipe_body=Markup(body), related=[other for other, _ in related]
+    ))
+    return cache_headers(response, etag, last_modified)
 
 @app.route('/recipes')
 def recipes():
-    search_query = request.args.get('q', '')
-    if search_query:
-        # Search in title, description, and instructions
-        search = f"%{search_query}%"
-        recipes = Recipe.query.filter(
-            (Recipe.title.ilike(search)) |
-            (Recipe.description.ilike(search)) |
-            (Recipe.instructions.ilike(search))
-        ).order_by(Recipe.created_at.desc()).all()
+    search_query = request.args.get('q', '').strip()
+    selected = facets.selected_tags(request.args)
+    results = None
+    if search_query or any(selected.values()):
+        # Ranked full-text search and/or tag filters, one page at a time
+        page = request.args.get('page', 1, type=int)
+        results, facet_values = facets.browse(search_query, selected, page, app.config['SEARCH_RESULTS_PER_PAGE'])
+        recipes = results.items
     else:
         # Get the latest 5 recipes if no search query
-        recipes = Recipe.query.order_by(Recipe.created_at.desc()).limit(5).all()
-    
-    return render_template('recipes.html', recipes=recipes, search_query=search_query)
+        recipes = Recipe.query.options(joinedload(Recipe.author)).order_by(Recipe.created_at.desc()).limit(5).all()
+        facet_values = facets.facet_counts(search_query, selected)
+
+    # Facet counts move with every recipe write, so the index version is part of the page
+    etag = recipes_etag(recipes, 'recipes', request.query_string.decode(), tag_index.version,
+                        results.has_next if results else None)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    response = make_response(render_template(
+        'recipes.html', recipes=recipes, search_query=search_query, results=results,
+        facet_values=facet_values, selected_args=facets.facet_args(selected),
+        toggle_args=lambda tag: facets.facet_args(selected, tag)
+    ))
+    return cache_headers(response, etag)
+
+@app.route('/cook')
+def cook():
+    ingredients_query = request.args.get('ingredients', '').strip()
+    names = [name for name in ingredients_query.split(',') if name.strip()]
+    results, unknown = None, []
+    if names:
+        # Ranked by the share of each recipe's ingredients that are on hand
+        page = request.args.get('page', 1, type=int)
+        results, unknown = cook_with(names, page, app.config['SEARCH_RESULTS_PER_PAGE'])
+    matches = results.items if results else []
+
+    recipes = [match.recipe for match in matches]
+    etag = recipes_etag(recipes, 'cook', ingredients_query,
+                        (results.page, results.has_next) if results else None)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    response = make_response(render_template(
+        'cook.html', matches=matches, ingredients_query=ingredients_query, results=results, unknown=unknown
+    ))
+    return cache_headers(response, etag)
+
+@app.route('/plan')
+@login_required
+def plan():
+    planned = shopping.get_plan()
+    recipes = []
+    if planned:
+        recipes = Recipe.query.options(load_only(Recipe.id, Recipe.title)).filter(Recipe.id.in_(list(planned))) \
+            .order_by(Recipe.title).all()
+    response = make_response(render_template(
+        'plan.html', plan=planned, recipes=recipes, items=shopping.shopping_list(planned)
+    ))
+    # The plan lives in the session, so the page is never shared or reused
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/plan/<int:recipe_id>', methods=['POST'])
+@login_required
+def plan_recipe(recipe_id):
+    recipe = db.get_or_404(Recipe, recipe_id)
+    servings = request.form.get('servings', 0, type=int)
+    if not shopping.set_servings(recipe_id, servings, app.config['MEAL_PLAN_MAX_RECIPES']):
+        flash(f"A meal plan can hold {app.config['MEAL_PLAN_MAX_RECIPES']} recipes.", 'warning')
+    elif servings > 0:
+        flash(f'{recipe.title} is in your meal plan.', 'success')
+    return redirect(url_for('plan'))
+
+@app.route('/plan/clear', methods=['POST'])
+@login_required
+def clear_plan():
+    shopping.clear_plan()
+    return redirect(url_for('plan'))
 
 @app.route('/recipe/<int:recipe_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -162,17 +327,44 @@ def edit_recipe(recipe_id):
     
     form = RecipeForm(obj=recipe)
     if form.validate_on_submit():
+        # Only the ingredient and tag rows that differ from the stored ones are written
+        entries = [
+            (entry.ingredient_name.data, entry.ingredient_quantity.data, entry.ingredient_unit.data)
+            for entry in form.ingredients.entries
+        ]
+        changed = update_recipe_ingredients(recipe.id, entries)
+        tag_ids = set(form.meal_tags.data or []) | set(form.diet_tags.data or [])
+        changed = update_recipe_tags(recipe.id, tag_ids) or changed
+        if changed:
+            # The recipe row may be untouched otherwise; caches, ETags and indexes go by updated_at
+            recipe.updated_at = datetime.utcnow()
+
         recipe.title = form.title.data
         recipe.description = form.description.data
         recipe.instructions = form.instructions.data
         recipe.prep_time_minutes = form.prep_time_minutes.data
         recipe.cook_time_minutes = form.cook_time_minutes.data
         recipe.servings = form.servings.data
+        image_filename = form.save_image()
+        if image_filename:
+            recipe.image_filename = image_filename
         
         db.session.commit()
+        if image_filename:
+            recipe_images.process(image_filename)
+        fragment_cache.delete(recipe_fragment_key(recipe_id))
         flash('Recipe has been updated!', 'success')
         return redirect(url_for('recipe', recipe_id=recipe_id))
     
+    if not form.is_submitted():
+        form.ingredients.process(None, [
+            {'ingredient_quantity': item.quantity, 'ingredient_unit': item.unit, 'ingredient_name': item.ingredient.name}
+            for item in recipe.ingredients
+        ])
+        tag_ids = {tag.id for tag in recipe.tags}
+        form.meal_tags.data = [tag_id for tag_id, _ in form.meal_tags.choices if tag_id in tag_ids]
+        form.diet_tags.data = [tag_id for tag_id, _ in form.diet_tags.choices if tag_id in tag_ids]
+
     return render_template('edit_recipe.html', title='Edit Recipe', form=form, recipe=recipe)
 
 @app.route('/recipe/<int:recipe_id>/delete', methods=['POST'])
@@ -183,14 +375,30 @@ def delete_recipe(recipe_id):
         flash('You can only delete your own recipes.', 'danger')
         return redirect(url_for('recipe', recipe_id=recipe_id))
     
+    # Ingredient, tag and neighbor rows go with it through ON DELETE CASCADE
     db.session.delete(recipe)
     db.session.commit()
+    fragment_cache.delete(recipe_fragment_key(recipe_id))
     flash('Recipe has been deleted.', 'success')
     return redirect(url_for('recipes'))
 
-@app.cli.command("init-tags")
-def init_tags():
-    """Initialize tag types and tags."""
+@app.route('/export')
+@login_required
+def export():
+    fmt = request.args.get('format', 'jsonl')
+    scope = request.args.get('scope', 'mine')
+    if fmt not in exporter.FORMATS or scope not in ('mine', 'all'):
+        return make_response('Unknown export format or scope', 400)
+    user_id = current_user.id if scope == 'mine' else None
+    chunks = exporter.export_chunks(fmt, user_id, app.config['EXPORT_BATCH_SIZE'])
+    # stream_with_context keeps the session usable while the body is sent
+    response = Response(stream_with_context(chunks), mimetype=exporter.FORMATS[fmt][0])
+    response.headers['Content-Disposition'] = f'attachment; filename="{exporter.export_filename(fmt, scope)}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def create_default_tags():
+    """Create the default tag types and tags that don't exist yet."""
     # Create tag types if they don't exist
     meal_type = TagType.query.filter_by(name='meal').first()
     if not meal_type:
@@ -219,8 +427,105 @@ def init_tags():
             db.session.add(tag)
     
     db.session.commit()
+
+@app.cli.command("init-tags")
+def init_tags():
+    """Initialize tag types and tags."""
+    create_default_tags()
     print("Tags initialized successfully!")
 
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index():
+    """Rebuild the full-text search index from the recipes table."""
+    search.rebuild_index(db.session.connection())
+    db.session.commit()
+    print("Search index rebuilt successfully!")
+
+@app.cli.command("sqlite-maintenance")
+def sqlite_maintenance():
+    """Run PRAGMA optimize and checkpoint the SQLite WAL."""
+    if db.engine.dialect.name != 'sqlite':
+        print("Not a SQLite database, nothing to do.")
+        return
+    run_maintenance(db.engine)
+    print("SQLite maintenance complete!")
+
+@app.cli.command("import-recipes")
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'email', required=True, help='Email of the user the recipes are added for.')
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, default=None, help='Records per transaction (IMPORT_BATCH_SIZE).')
+@click.option('--restart', is_flag=True, help='Ignore saved progress and start from the first record.')
+def import_recipes(path, email, fmt, batch_size, restart):
+    """Stream recipes from a JSONL or CSV file into the database."""
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f"No user with email {email}")
+
+    def report(consumed, imported, rate):
+        print(f"{consumed} records read, {imported} recipes imported ({rate:.0f} rows/s)")
+
+    stats = importer.import_recipes(
+        path, user.id, fmt, batch_size or app.config['IMPORT_BATCH_SIZE'], restart, report
+    )
+    if stats.resumed_from:
+        print(f"Resumed after record {stats.resumed_from}.")
+    rate = stats.imported / stats.seconds if stats.seconds else 0
+    print(f"Imported {stats.imported} recipes, skipped {stats.skipped} invalid records "
+          f"in {stats.seconds:.1f}s ({rate:.0f} rows/s).")
+
+@app.cli.command("export-recipes")
+@click.option('--user', 'email', help='Only export the recipes of the user with this email.')
+@click.option('--format', 'fmt', type=click.Choice(list(exporter.FORMATS)), default='jsonl', show_default=True)
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='File to write to (default: stdout).')
+@click.option('--batch-size', type=int, default=None, help='Recipes per batch (EXPORT_BATCH_SIZE).')
+def export_recipes(email, fmt, output, batch_size):
+    """Stream recipes with their ingredients and tags as JSONL or a zip."""
+    user_id = None
+    if email:
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            raise click.ClickException(f"No user with email {email}")
+        user_id = user.id
+    for chunk in exporter.export_chunks(fmt, user_id, batch_size or app.config['EXPORT_BATCH_SIZE']):
+        output.write(chunk)
+
+@app.cli.command("compute-neighbors")
+@click.option('--full', is_flag=True, help='Recompute every recipe instead of only what changed.')
+@click.option('--k', type=int, help='Neighbors stored per recipe (default: RECIPE_NEIGHBORS).')
+def compute_neighbors(full, k):
+    """Precompute the similar recipes shown under "More like this"."""
+    stats = recommendations.compute_neighbors(k or app.config['RECIPE_NEIGHBORS'], full=full)
+    kind = "full" if stats.full else "incremental"
+    print(f"{kind} run: recomputed {stats.recomputed} of {stats.recipes} recipes, "
+          f"{stats.rows} neighbors stored in {stats.seconds:.1f}s")
+
+@app.cli.command("build-assets")
+def build_assets():
+    """Fingerprint and precompress the static files into static/dist."""
+    manifest = build_asset_files(app.static_folder, app.static_url_path, app.config['ASSETS_DIST_FOLDER'])
+    assets.load_manifest()
+    print(f"Built {len(manifest)} assets into {assets.dist}")
+
+@app.cli.command("explain-queries")
+def explain_queries():
+    """Check that the main route queries use indexes."""
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    missing = 0
+    for description, query in query_plans.main_route_queries():
+        plan = query_plans.explain(connection, query)
+        ok = query_plans.uses_index(dialect, plan)
+        missing += not ok
+        print(f"[{'OK' if ok else 'NO INDEX'}] {description}")
+        for line in plan:
+            print(f"    {line}")
+    if missing:
+        if dialect == 'postgresql':
+            print("Note: PostgreSQL may prefer a sequential scan on small tables; run ANALYZE first.")
+        raise SystemExit(1)
+    print("All main route queries use indexes.")
+
 
 if __name__ == '__main__':
     # Use configuration for debug mode
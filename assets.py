@@ -0,0 +1,167 @@
+"""Fingerprinted, precompressed static assets.
+
+'flask build-assets' copies every file under the static folder into
+static/dist with a hash of its contents in the name (css/style.css
+becomes css/style.3f9a1c2b7e4d.css), rewrites /static/ references
+inside CSS and web manifests to the fingerprinted names, writes .gz
+and, when the brotli package is installed, .br variants of compressible
+files, and records the mapping in static/dist/manifest.json.
+
+At runtime url_for('static', filename=...) in templates returns the
+fingerprinted URL for any file in the manifest. Those URLs never change
+content, so they are served with a one year immutable Cache-Control,
+and the .br or .gz variant is sent when Accept-Encoding allows it.
+Without a manifest, url_for falls back to the plain static files.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.webmanifest', '.txt', '.ico', '.map'}
+# Files whose /static/... references are rewritten to fingerprinted names
+REWRITABLE = {'.css', '.webmanifest', '.json'}
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+
+
+def fingerprint(name, content):
+    """Insert a short content hash before the extension of name."""
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{digest}{ext}'
+
+
+def _source_files(static_folder, dist):
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def _rewrite(content, manifest, static_url_path, dist_folder):
+    # Point /static/<name> references at the fingerprinted copies
+    prefix = static_url_path.rstrip('/')
+    pattern = re.compile(re.escape(prefix + '/') + r'([\w./-]+)')
+
+    def replace(match):
+        name = match.group(1)
+        if name in manifest:
+            return f'{prefix}/{dist_folder}/{manifest[name]}'
+        return match.group(0)
+
+    return pattern.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _write_variants(path, content):
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        # Not worth serving a variant that saves almost nothing
+        if len(compressed) < len(content) * 0.9:
+            _write(path + suffix, compressed)
+
+
+def build(static_folder, static_url_path='/static', dist_folder='dist'):
+    """Fingerprint and precompress every static file; return the manifest.
+
+    Earlier builds are left in place so pages rendered against the
+    previous manifest keep working during a deploy.
+    """
+    dist = os.path.join(static_folder, dist_folder)
+    sources = list(_source_files(static_folder, dist))
+    # Plain files first, so rewritten files can refer to their final names
+    sources.sort(key=lambda item: os.path.splitext(item[0])[1] in REWRITABLE)
+
+    manifest = {}
+    for name, path in sources:
+        with open(path, 'rb') as f:
+            content = f.read()
+        ext = os.path.splitext(name)[1]
+        if ext in REWRITABLE:
+            content = _rewrite(content, manifest, static_url_path, dist_folder)
+        hashed = fingerprint(name, content)
+        target = os.path.join(dist, hashed)
+        if not os.path.exists(target):
+            _write(target, content)
+            if ext in COMPRESSIBLE:
+                _write_variants(target, content)
+        manifest[name] = hashed
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+class Assets:
+    """Serves the build output and points url_for('static') at it."""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.dist_folder = app.config.get('ASSETS_DIST_FOLDER', 'dist')
+        self.max_age = app.config.get('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        self.dist = os.path.join(app.static_folder, self.dist_folder)
+        self.load_manifest()
+
+        app.add_url_rule(
+            f'{app.static_url_path}/{self.dist_folder}/<path:filename>', endpoint='assets', view_func=self.serve
+        )
+        app.jinja_env.globals['url_for'] = self.url_for
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.dist, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def url_for(self, endpoint, **values):
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+            endpoint = 'assets'
+        return url_for(endpoint, **values)
+
+    def serve(self, filename):
+        if filename == MANIFEST:
+            raise NotFound()
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.isfile(os.path.join(self.dist, filename + suffix)):
+                response = send_from_directory(self.dist, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.dist, filename, mimetype=mimetype)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.cache_control.immutable = True
+        return response
+
+
+assets = Assets()
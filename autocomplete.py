@@ -0,0 +1,315 @@
+"""In-memory prefix index over ingredient names, for autocomplete.
+
+Every name is kept lower-cased in one sorted sequence, once per word
+start, so "pep" finds "pepper" and "black pepper" alike; the entries
+matching a prefix lie between two bisects. Matches are ranked by how
+many recipes use the ingredient. A one-letter prefix matches a large
+part of the sequence, so it is held in blocks of about BLOCK_SIZE
+entries and a segment tree over the blocks holds the top
+MAX_SUGGESTIONS of every node: a wide range is ranked from the few
+nodes that cover it plus the loose entries at either end, whatever its
+width.
+
+Inserting ingredients bumps the 'ingredients' counter in cache_versions
+and new names are inserted into their blocks; recipe writes bump
+'recipes' and the usage counts are read again. Either way only the
+blocks that changed and the tree nodes above them are reranked. The
+counters are checked at most once every check_interval seconds.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+from extensions import db
+from ingredients import normalize_name
+from models import CacheVersion, Ingredient, RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+Suggestion = namedtuple('Suggestion', ['id', 'name', 'recipes'])
+
+MAX_SUGGESTIONS = 20
+BLOCK_SIZE = 32
+# New names fill their blocks up to this size before the blocks are cut back to BLOCK_SIZE
+MAX_BLOCK_SIZE = 8 * BLOCK_SIZE
+# Above this many new names a full rebuild beats inserting them one by one
+REBUILD_THRESHOLD = 1000
+# Ids may commit out of order, so new names are looked for this far below the highest seen
+ID_OVERLAP = 1000
+
+
+def _word_keys(name):
+    words = name.lower().split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+class PrefixIndex:
+    """Sorted (key, ingredient id) entries in blocks, and the usage counts to rank by.
+
+    with_names and with_usage return an updated copy and leave this index
+    as it is, so readers never see one half-changed. The copy shares every
+    block and tree node that the change doesn't reach.
+    """
+
+    def __init__(self, names, usage):
+        self.names = names    # ingredient id -> name
+        self.usage = usage    # ingredient id -> number of recipes
+        entries = sorted((key, ingredient_id) for ingredient_id, name in names.items() for key in _word_keys(name))
+        self._blocks = [entries[start:start + BLOCK_SIZE] for start in range(0, len(entries), BLOCK_SIZE)] or [[]]
+        self._firsts = [block[0] if block else ('',) for block in self._blocks]
+        # Most used first, then alphabetical so equal counts come back in a stable order
+        self._rank_key = {ingredient_id: (-usage.get(ingredient_id, 0), name) for ingredient_id, name in names.items()}
+        self._levels = self._build_levels([self._rank_block(block) for block in self._blocks])
+
+    @property
+    def size(self):
+        return sum(len(block) for block in self._blocks)
+
+    def _rank_block(self, block):
+        return self._rank([ingredient_id for _, ingredient_id in block], MAX_SUGGESTIONS)
+
+    def _build_levels(self, tops):
+        # levels[0][j] ranks block j; levels[n][j] ranks levels[n - 1][2j] and [2j + 1]
+        levels = [tops]
+        while len(levels[-1]) > 1:
+            below = levels[-1]
+            levels.append([
+                self._rank([i for node in below[j:j + 2] for i in node], MAX_SUGGESTIONS)
+                for j in range(0, len(below), 2)
+            ])
+        return levels
+
+    def _copy(self, names, usage):
+        index = object.__new__(PrefixIndex)
+        index.names = names
+        index.usage = usage
+        index._rank_key = self._rank_key
+        index._blocks = list(self._blocks)
+        index._firsts = list(self._firsts)
+        index._levels = [list(level) for level in self._levels]
+        return index
+
+    def _block_of(self, entry):
+        return max(bisect_right(self._firsts, entry) - 1, 0)
+
+    def _update_paths(self, dirty):
+        # Rerank the changed blocks and every node above them, once each
+        for level in range(len(self._levels)):
+            if level == 0:
+                for j in dirty:
+                    self._levels[0][j] = self._rank_block(self._blocks[j])
+            else:
+                below = self._levels[level - 1]
+                for j in dirty:
+                    self._levels[level][j] = self._rank([i for node in below[2 * j:2 * j + 2] for i in node],
+                                                        MAX_SUGGESTIONS)
+            dirty = {j >> 1 for j in dirty}
+
+    def _position(self, key):
+        # (block, offset) of the first entry at or after key
+        block = self._block_of((key,))
+        offset = bisect_left(self._blocks[block], (key,))
+        if offset == len(self._blocks[block]) and block + 1 < len(self._blocks):
+            return block + 1, 0
+        return block, offset
+
+    def _candidates(self, lo, hi):
+        # Loose entries outside whole blocks, plus the top of the nodes covering the blocks
+        (lo_block, lo_offset), (hi_block, hi_offset) = lo, hi
+        if lo_block == hi_block:
+            return [i for _, i in self._blocks[lo_block][lo_offset:hi_offset]]
+        candidates = [i for _, i in self._blocks[lo_block][lo_offset:]] if lo_offset else []
+        if hi_offset:
+            candidates += [i for _, i in self._blocks[hi_block][:hi_offset]]
+        first, last = lo_block + (lo_offset > 0), hi_block
+        for level in self._levels:
+            if first >= last:
+                break
+            if first & 1:
+                candidates += level[first]
+                first += 1
+            if last & 1:
+                last -= 1
+                candidates += level[last]
+            first, last = first >> 1, last >> 1
+        return candidates
+
+    def with_names(self, new_names):
+        """Return a copy of the index that also holds new_names ({id: name}).
+
+        Each key goes into its block, and only that block and the nodes
+        above it are reranked. A block that grows past MAX_BLOCK_SIZE is
+        cut back into BLOCK_SIZE pieces, which changes the shape of the
+        tree, so the nodes above the blocks are then rebuilt.
+        """
+        names = {**self.names, **new_names}
+        if len(new_names) > REBUILD_THRESHOLD:
+            return PrefixIndex(names, self.usage)
+        index = self._copy(names, self.usage)
+        index._rank_key = {**self._rank_key, **{
+            ingredient_id: (-self.usage.get(ingredient_id, 0), name) for ingredient_id, name in new_names.items()
+        }}
+        dirty = set()
+        for ingredient_id, name in new_names.items():
+            for key in _word_keys(name):
+                j = index._block_of((key, ingredient_id))
+                block = list(index._blocks[j])
+                insort(block, (key, ingredient_id))
+                index._blocks[j] = block
+                index._firsts[j] = block[0]
+                dirty.add(j)
+        if any(len(index._blocks[j]) > MAX_BLOCK_SIZE for j in dirty):
+            index._split_blocks(dirty)
+        else:
+            index._update_paths(dirty)
+        return index
+
+    def _split_blocks(self, dirty):
+        blocks, tops = [], []
+        for j, block in enumerate(self._blocks):
+            if j not in dirty:
+                blocks.append(block)
+                tops.append(self._levels[0][j])
+                continue
+            pieces = [block[start:start + BLOCK_SIZE] for start in range(0, len(block), BLOCK_SIZE)] \
+                if len(block) > MAX_BLOCK_SIZE else [block]
+            blocks.extend(pieces)
+            tops.extend(self._rank_block(piece) for piece in pieces)
+        self._blocks = blocks
+        self._firsts = [block[0] for block in blocks]
+        self._levels = self._build_levels(tops)
+
+    def with_usage(self, changes):
+        """Return a copy of the index ranked by changed usage counts ({id: recipes}).
+
+        Only the blocks holding a changed ingredient, and the nodes above
+        them, are reranked.
+        """
+        index = self._copy(self.names, {**self.usage, **changes})
+        changed = [ingredient_id for ingredient_id in changes if ingredient_id in self.names]
+        index._rank_key = {**self._rank_key, **{
+            ingredient_id: (-changes[ingredient_id], self.names[ingredient_id]) for ingredient_id in changed
+        }}
+        index._update_paths({
+            index._block_of((key, ingredient_id))
+            for ingredient_id in changed for key in _word_keys(self.names[ingredient_id])
+        })
+        return index
+
+    def _rank(self, ids, limit):
+        # Sorting the few hundred candidates at most beats a heap here
+        return sorted(set(ids), key=self._rank_key.__getitem__)[:limit]
+
+    def suggest(self, prefix, limit=10):
+        """Return up to limit Suggestions for names with a word starting with prefix."""
+        prefix = normalize_name(prefix).lower()
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+        ranked = self._rank(self._candidates(self._position(prefix), self._position(prefix + '\U0010ffff')), limit)
+        return [Suggestion(i, self.names[i], self.usage.get(i, 0)) for i in ranked]
+
+
+class IngredientAutocomplete:
+    """The PrefixIndex of the ingredients table, built on first use in each worker.
+
+    New names are read and patched in by the request that notices the
+    'ingredients' version moved. Usage counts need a GROUP BY over every
+    recipe_ingredients row, so a moved 'recipes' version starts a thread
+    that reads them and patches in the counts that changed; requests keep
+    using the current index meanwhile.
+    """
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._app = None
+        self._lock = threading.Lock()
+        self._usage_thread = None
+        self.clear()
+
+    def init_app(self, app):
+        self._app = app
+        self.check_interval = app.config.get('AUTOCOMPLETE_CHECK_INTERVAL', 5)
+
+    def clear(self):
+        self.wait()
+        self._index = None
+        self._names_version = None
+        self._usage_version = None
+        self._max_id = 0
+        self._checked_at = None
+
+    def wait(self, timeout=None):
+        """Block until a running usage refresh has finished."""
+        thread = self._usage_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _fresh(self, now):
+        return self._checked_at is not None and now - self._checked_at < self.check_interval
+
+    def _refresh(self):
+        if self._fresh(time.monotonic()):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._fresh(now):
+                return
+            connection = db.session.connection()
+            # Read the versions first so a write racing the load is seen next time
+            names_version = CacheVersion.current(connection, 'ingredients')
+            usage_version = CacheVersion.current(connection, 'recipes')
+            if self._index is None:
+                self._index = PrefixIndex(self._load_names(connection, 0), self._load_usage(connection))
+                self._usage_version = usage_version
+            elif names_version != self._names_version:
+                new_names = self._load_names(connection, self._max_id - ID_OVERLAP)
+                new_names = {i: name for i, name in new_names.items() if i not in self._index.names}
+                if new_names:
+                    self._index = self._index.with_names(new_names)
+            self._names_version = names_version
+            if usage_version != self._usage_version and self._usage_thread is None:
+                self._usage_thread = threading.Thread(
+                    target=self._refresh_usage, args=(usage_version,), name='autocomplete-usage', daemon=True
+                )
+                self._usage_thread.start()
+            self._checked_at = now
+
+    def _refresh_usage(self, version):
+        try:
+            with self._app.app_context():
+                usage = self._load_usage(db.session.connection())
+                db.session.remove()
+            old = self._index.usage
+            changes = {i: count for i, count in usage.items() if old.get(i) != count}
+            changes.update((i, 0) for i in old.keys() - usage.keys() if old[i])
+            with self._lock:
+                if self._index is not None:
+                    self._index = self._index.with_usage(changes)
+                    self._usage_version = version
+        except Exception:
+            logger.exception('Refreshing ingredient usage counts failed')
+        finally:
+            self._usage_thread = None
+
+    def _load_names(self, connection, after_id):
+        names = dict(connection.execute(
+            db.select(Ingredient.id, Ingredient.name).where(Ingredient.id > after_id)
+        ).all())
+        self._max_id = max([self._max_id, *names])
+        return names
+
+    def _load_usage(self, connection):
+        return dict(connection.execute(
+            db.select(RecipeIngredient.ingredient_id, db.func.count(db.distinct(RecipeIngredient.recipe_id)))
+            .group_by(RecipeIngredient.ingredient_id)
+        ).all())
+
+    def suggest(self, prefix, limit=10):
+        self._refresh()
+        return self._index.suggest(prefix, limit)
+
+
+ingredient_autocomplete = IngredientAutocomplete()
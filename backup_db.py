@@ -1,8 +1,29 @@
 #!/usr/bin/env python3
-import os
-import shutil
-from datetime import datetime
+"""Online, compressed and deduplicated backups of the SQLite database.
+
+    python backup_db.py                      # take a backup and apply retention
+    python backup_db.py verify [FILE]        # check one backup, or all of them
+    python backup_db.py restore FILE         # restore a backup over the database
+    python backup_db.py prune                # only apply retention
+
+Backups are taken with the sqlite3 online backup API a few pages at a
+time, so gunicorn workers can keep writing while a backup runs.
+"""
+import argparse
+import gzip
+import hashlib
+import json
 import logging
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Set up logging
 logging.basicConfig(
@@ -11,36 +32,253 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def backup_database():
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, 'instance', 'recipe_app.db')
+DEFAULT_BACKUP_DIR = os.path.join(os.path.expanduser('~'), 'backups')
+MANIFEST_NAME = 'manifest.json'
+
+# Pages copied per backup step, and the pause between steps that lets
+# writers take the database lock
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005
+CHUNK_SIZE = 1024 * 1024
+
+# Retention defaults
+KEEP_COUNT = 30
+MAX_AGE_DAYS = 90
+MAX_TOTAL_MB = None
+
+EXTENSIONS = {'gzip': '.db.gz', 'zstd': '.db.zst'}
+
+
+def default_compression():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def _open_writer(path, compression):
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstd compression needs the zstandard package')
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, 'wb'), closefd=True)
+    return gzip.open(path, 'wb', compresslevel=6)
+
+
+def _open_reader(path):
+    if path.endswith(EXTENSIONS['zstd']):
+        if zstandard is None:
+            raise RuntimeError('reading zstd backups needs the zstandard package')
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, 'rb')
+
+
+def load_manifest(backup_dir):
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(backup_dir, entries):
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def snapshot(db_path, dest_path, pages=PAGES_PER_STEP, sleep=STEP_SLEEP):
+    """Copy a consistent snapshot of db_path into dest_path without blocking writers."""
+    source = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    dest = sqlite3.connect(dest_path)
     try:
-        # Get the current date for the backup file name
-        date_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        # Define paths
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        db_path = os.path.join(base_dir, 'instance', 'recipe_app.db')
-        backup_dir = os.path.join(os.path.expanduser('~'), 'backups')
-        backup_path = os.path.join(backup_dir, f'recipe_app_{date_str}.db')
-        
-        # Create backup directory if it doesn't exist
+        source.backup(dest, pages=pages, sleep=sleep)
+    finally:
+        dest.close()
+        source.close()
+
+
+def _compress(src_path, dest_path, compression):
+    # Stream the snapshot through the compressor, hashing it on the way
+    digest = hashlib.sha256()
+    size = 0
+    with open(src_path, 'rb') as src, _open_writer(dest_path, compression) as out:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            out.write(chunk)
+    return digest.hexdigest(), size
+
+
+def _decompress(src_path, dest_path):
+    digest = hashlib.sha256()
+    with _open_reader(src_path) as src, open(dest_path, 'wb') as out:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def backup_database(db_path=DEFAULT_DB_PATH, backup_dir=DEFAULT_BACKUP_DIR, compression=None,
+                    keep=KEEP_COUNT, max_age_days=MAX_AGE_DAYS, max_total_mb=MAX_TOTAL_MB):
+    """Take a backup unless the database is unchanged since the last one.
+
+    Returns the path of the new backup, or None if it was skipped.
+    """
+    try:
+        compression = compression or default_compression()
         os.makedirs(backup_dir, exist_ok=True)
-        
-        # Copy the database file
-        shutil.copy2(db_path, backup_path)
-        
-        # Keep only the last 30 backups
-        backups = sorted([f for f in os.listdir(backup_dir) if f.startswith('recipe_app_')])
-        if len(backups) > 30:
-            for old_backup in backups[:-30]:
-                os.remove(os.path.join(backup_dir, old_backup))
-        
-        logger.info(f'Database backup created successfully: {backup_path}')
-        logger.info(f'Total backups: {len(backups)}')
-        
+        date_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_name = f'recipe_app_{date_str}{EXTENSIONS[compression]}'
+        backup_path = os.path.join(backup_dir, backup_name)
+
+        fd, snapshot_path = tempfile.mkstemp(dir=backup_dir, suffix='.snapshot')
+        os.close(fd)
+        try:
+            started = time.monotonic()
+            snapshot(db_path, snapshot_path)
+            tmp_backup_path = backup_path + '.tmp'
+            sha256, size = _compress(snapshot_path, tmp_backup_path, compression)
+        finally:
+            os.remove(snapshot_path)
+
+        entries = load_manifest(backup_dir)
+        if entries and entries[-1]['sha256'] == sha256:
+            os.remove(tmp_backup_path)
+            logger.info(f'Database unchanged since {entries[-1]["file"]}, backup skipped')
+            backup_path = None
+        else:
+            os.replace(tmp_backup_path, backup_path)
+            entries.append({
+                'file': backup_name,
+                'sha256': sha256,
+                'size': size,
+                'compressed_size': os.path.getsize(backup_path),
+                'created': datetime.now().isoformat(timespec='seconds'),
+            })
+            save_manifest(backup_dir, entries)
+            logger.info(
+                f'Database backup created successfully: {backup_path} '
+                f'({size} bytes, {entries[-1]["compressed_size"]} compressed, '
+                f'{time.monotonic() - started:.2f}s)'
+            )
+
+        prune_backups(backup_dir, keep, max_age_days, max_total_mb)
+        return backup_path
+
     except Exception as e:
         logger.error(f'Backup failed: {str(e)}')
         raise
 
 
+def verify_backup(backup_dir, name):
+    """Check a backup's checksum and run SQLite's integrity check on it."""
+    entry = next((e for e in load_manifest(backup_dir) if e['file'] == name), None)
+    if entry is None:
+        raise ValueError(f'{name} is not in the backup manifest')
+    fd, tmp_path = tempfile.mkstemp(dir=backup_dir, suffix='.verify')
+    os.close(fd)
+    try:
+        sha256 = _decompress(os.path.join(backup_dir, name), tmp_path)
+        if sha256 != entry['sha256']:
+            logger.error(f'{name}: checksum mismatch')
+            return False
+        conn = sqlite3.connect(tmp_path)
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            conn.close()
+        if result != 'ok':
+            logger.error(f'{name}: integrity check failed: {result}')
+            return False
+        logger.info(f'{name}: OK')
+        return True
+    finally:
+        os.remove(tmp_path)
+
+
+def restore_backup(backup_dir, name, db_path=DEFAULT_DB_PATH):
+    """Verify a backup and copy it over db_path through the online backup API."""
+    if not verify_backup(backup_dir, name):
+        raise RuntimeError(f'Refusing to restore {name}: verification failed')
+    fd, tmp_path = tempfile.mkstemp(dir=backup_dir, suffix='.restore')
+    os.close(fd)
+    try:
+        _decompress(os.path.join(backup_dir, name), tmp_path)
+        source = sqlite3.connect(tmp_path)
+        dest = sqlite3.connect(db_path, timeout=30)
+        try:
+            source.backup(dest)
+        finally:
+            dest.close()
+            source.close()
+    finally:
+        os.remove(tmp_path)
+    logger.info(f'Restored {name} to {db_path}')
+
+
+def prune_backups(backup_dir, keep=KEEP_COUNT, max_age_days=MAX_AGE_DAYS, max_total_mb=MAX_TOTAL_MB):
+    """Delete backups beyond the retention limits; the newest one is always kept."""
+    entries = load_manifest(backup_dir)
+    cutoff = datetime.now() - timedelta(days=max_age_days) if max_age_days else None
+    budget = max_total_mb * 1024 * 1024 if max_total_mb else None
+
+    kept, removed, total = [], [], 0
+    for index, entry in enumerate(reversed(entries)):
+        total += entry['compressed_size']
+        expired = (
+            (keep and index >= keep) or
+            (cutoff and datetime.fromisoformat(entry['created']) < cutoff) or
+            (budget and total > budget)
+        )
+        if index > 0 and expired:
+            removed.append(entry)
+        else:
+            kept.append(entry)
+
+    for entry in removed:
+        path = os.path.join(backup_dir, entry['file'])
+        if os.path.exists(path):
+            os.remove(path)
+        logger.info(f'Removed old backup {entry["file"]}')
+    if removed:
+        save_manifest(backup_dir, list(reversed(kept)))
+    logger.info(f'Total backups: {len(kept)}')
+    return [entry['file'] for entry in removed]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Back up the recipe app database.')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite database file')
+    parser.add_argument('--backup-dir', default=DEFAULT_BACKUP_DIR)
+    parser.add_argument('--keep', type=int, default=KEEP_COUNT, help='backups to keep')
+    parser.add_argument('--max-age-days', type=int, default=MAX_AGE_DAYS)
+    parser.add_argument('--max-total-mb', type=int, default=MAX_TOTAL_MB)
+    parser.add_argument('--compression', choices=sorted(EXTENSIONS), default=None)
+    parser.add_argument('command', nargs='?', default='backup', choices=['backup', 'verify', 'restore', 'prune'])
+    parser.add_argument('file', nargs='?', help='backup file name for verify/restore')
+    args = parser.parse_args(argv)
+
+    if args.command == 'backup':
+        backup_database(args.db, args.backup_dir, args.compression, args.keep, args.max_age_days, args.max_total_mb)
+    elif args.command == 'verify':
+        names = [args.file] if args.file else [e['file'] for e in load_manifest(args.backup_dir)]
+        results = [verify_backup(args.backup_dir, name) for name in names]
+        return 0 if all(results) else 1
+    elif args.command == 'restore':
+        if not args.file:
+            parser.error('restore needs the backup file name')
+        restore_backup(args.backup_dir, args.file, args.db)
+    elif args.command == 'prune':
+        prune_backups(args.backup_dir, args.keep, args.max_age_days, args.max_total_mb)
+    return 0
+
+
 if __name__ == '__main__':
-    backup_database()
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+"""Measure ingredient autocomplete latency over a large set of names.
+
+    python -m benchmarks.autocomplete --names 100000 --queries 20000
+
+Builds the prefix index in memory from the seed generator's ingredient
+names, with skewed usage counts, then times suggest() for prefixes of
+random names, one to eight characters long, the way they arrive while
+someone types. Reports the build time, p50/p95/p99/max latency in
+microseconds, and how long the refreshes a worker applies take: adding
+--new-names ingredients, and re-ranking --changed usage counts. No
+database is needed.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from autocomplete import PrefixIndex
+from benchmarks.load import percentile
+from benchmarks.seed import ingredient_names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark ingredient autocomplete.')
+    parser.add_argument('--names', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--new-names', type=int, default=100)
+    parser.add_argument('--changed', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    names = dict(enumerate(ingredient_names(args.names), start=1))
+    # A few ingredients are in most recipes, most in a handful
+    usage = {ingredient_id: int(rng.paretovariate(1.2)) for ingredient_id in names}
+
+    started = time.perf_counter()
+    index = PrefixIndex(names, usage)
+    build_seconds = time.perf_counter() - started
+
+    typed = []
+    for _ in range(args.queries):
+        name = names[rng.randint(1, len(names))]
+        typed.append(name[:rng.randint(1, min(8, len(name)))])
+    latencies = []
+    for prefix in typed:
+        started = time.perf_counter()
+        index.suggest(prefix, args.limit)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+
+    new_names = {len(names) + i: f'{name} extra' for i, name in enumerate(rng.sample(list(names.values()), args.new_names), 1)}
+    started = time.perf_counter()
+    index.with_names(new_names)
+    names_seconds = time.perf_counter() - started
+    changes = {ingredient_id: usage[ingredient_id] + 1 for ingredient_id in rng.sample(list(names), args.changed)}
+    started = time.perf_counter()
+    index.with_usage(changes)
+    usage_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        'names': len(names),
+        'keys': index.size,
+        'build_seconds': round(build_seconds, 2),
+        'queries': len(latencies),
+        'p50_us': round(percentile(latencies, 50), 1),
+        'p95_us': round(percentile(latencies, 95), 1),
+        'p99_us': round(percentile(latencies, 99), 1),
+        'max_us': round(latencies[-1], 1),
+        'new_names': len(new_names),
+        'with_names_ms': round(names_seconds * 1000, 1),
+        'changed_usage': len(changes),
+        'with_usage_ms': round(usage_seconds * 1000, 1),
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
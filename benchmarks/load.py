@@ -0,0 +1,170 @@
+"""Drive the real routes at a fixed concurrency and report latency and SQL counts.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.load --concurrency 8 --requests 500 \\
+        --output run.json --baseline previous.json
+
+Requests go through the Flask test client in-process, one client per
+thread, so the full view, ORM and template stack is exercised and every
+SQL statement can be counted. For each route the JSON report has p50,
+p95 and p99 latency in milliseconds, throughput, and queries per
+request. With --baseline, routes whose p95 or query count grew by more
+than --tolerance are listed as regressions and the exit status is 1.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+from app import app
+from benchmarks.seed import BENCH_EMAIL, BENCH_PASSWORD, WORDS, DISHES, BASE_INGREDIENTS, UNITS
+from extensions import db
+from models import Recipe
+
+ROUTES = ['home', 'search', 'recipe', 'new_recipe', 'login']
+
+_local = threading.local()
+
+
+def _count_query(*args):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+class Runner:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        with app.app_context():
+            self.max_recipe_id = db.session.execute(db.select(db.func.max(Recipe.id))).scalar() or 0
+        if not self.max_recipe_id:
+            raise SystemExit('No recipes found; run python -m benchmarks.seed first')
+
+    def client(self):
+        client = getattr(_local, 'client', None)
+        if client is None:
+            client = app.test_client()
+            self.login(client)
+            _local.client = client
+        return client
+
+    @staticmethod
+    def login(client):
+        return client.post('/login', data={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})
+
+    def request(self, route):
+        client = self.client()
+        if route == 'home':
+            return client.get('/home')
+        if route == 'search':
+            return client.get('/recipes', query_string={'q': self.rng.choice(WORDS + DISHES)})
+        if route == 'recipe':
+            return client.get(f'/recipe/{self.rng.randint(1, self.max_recipe_id)}')
+        if route == 'new_recipe':
+            data = {
+                'title': f'Benchmark {self.rng.choice(DISHES)}', 'description': 'Load test',
+                'prep_time_minutes': 10, 'cook_time_minutes': 20, 'servings': 4,
+                'instructions': ' '.join(self.rng.choices(WORDS, k=20)),
+            }
+            for i, name in enumerate(self.rng.sample(BASE_INGREDIENTS, 8)):
+                data[f'ingredients-{i}-ingredient_quantity'] = '1'
+                data[f'ingredients-{i}-ingredient_unit'] = self.rng.choice(UNITS)
+                data[f'ingredients-{i}-ingredient_name'] = name
+            return client.post('/new_recipe', data=data)
+        if route == 'login':
+            return self.login(app.test_client())
+        raise ValueError(route)
+
+    def timed(self, route):
+        # Log in outside the timed section the first time a thread runs
+        self.client()
+        _local.queries = 0
+        started = time.perf_counter()
+        response = self.request(route)
+        elapsed = time.perf_counter() - started
+        return elapsed, _local.queries, response.status_code
+
+
+def run_route(runner, route, requests, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(lambda _: runner.timed(route), range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    errors = sum(1 for _, _, status in samples if status >= 500)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / wall, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for route, result in results['routes'].items():
+        before = baseline.get('routes', {}).get(route)
+        if not before:
+            continue
+        for metric in ('p95_ms', 'queries_max'):
+            if result[metric] > before[metric] * (1 + tolerance):
+                found.append(f'{route}: {metric} {before[metric]} -> {result[metric]}')
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the recipe app routes.')
+    parser.add_argument('--routes', nargs='+', choices=ROUTES, default=ROUTES)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative growth before flagging')
+    args = parser.parse_args(argv)
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _count_query)
+    runner = Runner(args.seed)
+
+    results = {
+        'concurrency': args.concurrency,
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0],
+        'routes': {route: run_route(runner, route, args.requests, args.concurrency) for route in args.routes},
+    }
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    print(report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Measure logins per second under concurrency, pooled hashing vs inline.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.logins --concurrency 1 4 16 --requests 200
+
+Each run posts the login form for BENCH_EMAIL through the Flask test
+client from the given number of threads, once with hashing on the
+password hashing pool and once with PASSWORD_HASH_WORKERS=0 (on the
+request thread). Logins refused with 503 because too many hashes were
+pending are counted separately; they return at once, so they are left
+out of the throughput and latency figures.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+from benchmarks.load import percentile
+from benchmarks.seed import BENCH_EMAIL, BENCH_PASSWORD
+from extensions import password_hasher
+
+_local = threading.local()
+
+
+def login():
+    client = getattr(_local, 'client', None)
+    if client is None:
+        client = _local.client = app.test_client()
+    started = time.perf_counter()
+    response = client.post('/login', data={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})
+    elapsed = time.perf_counter() - started
+    # Log out so the next post signs in again instead of being redirected
+    client.get('/logout')
+    return elapsed, response.status_code
+
+
+def run(requests, concurrency, workers):
+    password_hasher.workers = workers
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        samples = list(pool.map(lambda _: login(), range(requests)))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, status in samples if status != 503)
+    rejected = sum(1 for _, status in samples if status == 503)
+    failed = sum(1 for _, status in samples if status not in (302, 503))
+    return {
+        'logins': len(latencies),
+        'rejected_503': rejected,
+        'failed': failed,
+        'logins_per_second': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark logins per second.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=100, help='logins per run')
+    parser.add_argument('--workers', type=int, default=app.config['PASSWORD_HASH_WORKERS'],
+                        help='hashing threads for the pooled runs')
+    args = parser.parse_args(argv)
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    results = {
+        'method': password_hasher.method,
+        'runs': [
+            {'concurrency': concurrency, 'mode': mode, **run(args.requests, concurrency, workers)}
+            for concurrency in args.concurrency
+            for mode, workers in (('pool', args.workers), ('inline', 0))
+        ],
+    }
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Fill the configured database with a large, repeatable synthetic dataset.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed --recipes 100000
+
+The same --seed always produces the same users, recipes, ingredients and
+tags. Rows are written with bulk inserts in batches, so seeding 100k
+recipes takes seconds rather than minutes. Every user's password is
+BENCH_PASSWORD, and the first one is BENCH_EMAIL.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+import search
+from app import app, create_default_tags
+from extensions import db
+from models import CacheVersion, Ingredient, Recipe, RecipeIngredient, Tag, TagType, User, recipe_tags
+
+BENCH_EMAIL = 'bench1@example.com'
+BENCH_PASSWORD = 'password123'
+BATCH_SIZE = 5000
+
+BASE_INGREDIENTS = [
+    'salt', 'black pepper', 'olive oil', 'butter', 'garlic', 'onion', 'sugar', 'flour', 'eggs',
+    'milk', 'water', 'lemon juice', 'brown sugar', 'baking powder', 'baking soda', 'vanilla extract',
+    'tomatoes', 'carrots', 'celery', 'potatoes', 'rice', 'pasta', 'chicken breast', 'ground beef',
+    'bacon', 'parmesan', 'cheddar', 'mozzarella', 'heavy cream', 'sour cream', 'yogurt', 'honey',
+    'soy sauce', 'ginger', 'cumin', 'paprika', 'oregano', 'basil', 'thyme', 'rosemary', 'cinnamon',
+    'nutmeg', 'chili flakes', 'bell pepper', 'spinach', 'mushrooms', 'zucchini', 'broccoli', 'corn',
+    'black beans', 'chickpeas', 'lentils', 'oats', 'almonds', 'walnuts', 'apples', 'bananas',
+    'blueberries', 'strawberries', 'coconut milk', 'chicken stock', 'vegetable stock', 'red wine',
+    'white wine', 'vinegar', 'mustard', 'mayonnaise', 'ketchup', 'cocoa powder', 'chocolate chips',
+    'shrimp', 'salmon', 'tofu', 'quinoa', 'avocado', 'lime', 'cilantro', 'parsley', 'scallions',
+]
+VARIANTS = ['fresh', 'dried', 'organic', 'smoked', 'roasted', 'chopped', 'ground', 'frozen', 'toasted', 'low-fat']
+ADJECTIVES = ['Easy', 'Classic', 'Spicy', 'Creamy', 'Crispy', 'Grandma\'s', 'Quick', 'Hearty', 'Smoky', 'Zesty']
+DISHES = ['Soup', 'Stew', 'Pie', 'Salad', 'Curry', 'Casserole', 'Tacos', 'Pasta', 'Bread', 'Cake', 'Stir Fry', 'Risotto']
+WORDS = ['simmer', 'whisk', 'fold', 'bake', 'roast', 'season', 'chop', 'stir', 'rest', 'serve', 'garnish', 'saute']
+UNITS = ['cup', 'tbsp', 'tsp', 'oz', 'lb', 'g', 'ml', 'piece', 'pinch', 'whole']
+
+
+def ingredient_names(count):
+    names = list(BASE_INGREDIENTS)
+    for variant in VARIANTS:
+        names.extend(f'{variant} {base}' for base in BASE_INGREDIENTS)
+    index = 0
+    while len(names) < count:
+        names.append(f'{BASE_INGREDIENTS[index % len(BASE_INGREDIENTS)]} no. {index}')
+        index += 1
+    return names[:count]
+
+
+def _next_id(model):
+    return (db.session.execute(db.select(db.func.max(model.id))).scalar() or 0) + 1
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+def generate(users=50, recipes=10000, ingredients=2000, seed=42):
+    """Insert a synthetic dataset and return the number of rows written per table."""
+    rng = random.Random(seed)
+    db.create_all()
+    create_default_tags()
+    tag_ids = {
+        type_name: [tag_id for tag_id, in db.session.execute(
+            db.select(Tag.id).join(TagType).where(TagType.name == type_name)
+        )]
+        for type_name in ('meal', 'diet')
+    }
+
+    # One hash shared by every user; hashing per user would dominate the run
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    first_user = _next_id(User)
+    user_rows = [
+        {'id': first_user + i, 'username': f'bench_user_{first_user + i}',
+         'email': f'bench{first_user + i}@example.com', 'password_hash': password_hash}
+        for i in range(users)
+    ]
+    _insert(User.__table__, user_rows)
+
+    names = ingredient_names(ingredients)
+    resolved = dict(db.session.execute(db.select(Ingredient.name, Ingredient.id).where(Ingredient.name.in_(names))).all())
+    first_ingredient = _next_id(Ingredient)
+    ingredient_rows = [
+        {'id': first_ingredient + i, 'name': name}
+        for i, name in enumerate(name for name in names if name not in resolved)
+    ]
+    _insert(Ingredient.__table__, ingredient_rows)
+    resolved.update((row['name'], row['id']) for row in ingredient_rows)
+    # Draw from every name, including ones an earlier run already inserted
+    ingredient_ids = [resolved[name] for name in names]
+    # Zipf-like popularity: a few ingredients appear in most recipes
+    weights = [1 / (rank + 1) for rank in range(len(ingredient_ids))]
+
+    first_recipe = _next_id(Recipe)
+    start = datetime(2020, 1, 1)
+    counts = {'recipes': 0, 'recipe_ingredients': 0, 'recipe_tags': 0}
+    recipe_rows, ingredient_links, tag_links = [], [], []
+    for i in range(recipes):
+        recipe_id = first_recipe + i
+        created_at = start + timedelta(minutes=30 * i)
+        recipe_rows.append({
+            'id': recipe_id,
+            'user_id': first_user + rng.randrange(users),
+            'title': f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {recipe_id}',
+            'description': ' '.join(rng.choices(WORDS, k=12)).capitalize() + '.',
+            'instructions': '\n'.join(
+                f'{step}. ' + ' '.join(rng.choices(WORDS, k=8)) for step in range(1, rng.randint(3, 8))
+            ),
+            'prep_time_minutes': rng.randint(5, 60),
+            'cook_time_minutes': rng.randint(0, 180),
+            'servings': rng.randint(1, 12),
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+        for ingredient_id in set(rng.choices(ingredient_ids, weights, k=rng.randint(3, 15))):
+            ingredient_links.append({
+                'recipe_id': recipe_id, 'ingredient_id': ingredient_id,
+                'quantity': rng.choice([0.25, 0.5, 1, 1.5, 2, 3, 4, 8]), 'unit': rng.choice(UNITS),
+            })
+        tags = [rng.choice(tag_ids['meal'])] + rng.sample(tag_ids['diet'], rng.randint(0, 2))
+        tag_links.extend({'recipe_id': recipe_id, 'tag_id': tag_id} for tag_id in tags)
+
+        # Write each batch as soon as it is full so memory stays flat
+        if len(recipe_rows) >= BATCH_SIZE or i == recipes - 1:
+            _insert(Recipe.__table__, recipe_rows)
+            _insert(RecipeIngredient.__table__, ingredient_links)
+            _insert(recipe_tags, tag_links)
+            counts['recipes'] += len(recipe_rows)
+            counts['recipe_ingredients'] += len(ingredient_links)
+            counts['recipe_tags'] += len(tag_links)
+            recipe_rows, ingredient_links, tag_links = [], [], []
+
+    connection = db.session.connection()
+    search.rebuild_index(connection)
+    CacheVersion.bump(connection, 'taxonomy')
+    CacheVersion.bump(connection, 'recipes')
+    CacheVersion.bump(connection, 'ingredients')
+    db.session.commit()
+    return {'users': len(user_rows), 'ingredients': len(ingredient_rows), **counts}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the database with synthetic recipes.')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--recipes', type=int, default=10000)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        started = time.monotonic()
+        counts = generate(args.users, args.recipes, args.ingredients, args.seed)
+    elapsed = time.monotonic() - started
+    for table, count in counts.items():
+        print(f'{table:<20}{count:>10}')
+    print(f'Seeded in {elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
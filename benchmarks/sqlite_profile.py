@@ -0,0 +1,127 @@
+"""Compare concurrent SQLite throughput with and without the SQLITE_PRAGMAS profile.
+
+    python -m benchmarks.sqlite_profile --readers 4 --writers 2 --seconds 10
+
+Each profile gets its own fresh database file. Reader and writer
+processes hammer it for the given time, and the script reports reads and
+writes per second and how many operations failed with "database is
+locked". Pass --json to get the results as JSON.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from config import Config
+from sqlite_tuning import apply_pragmas
+
+SEED_ROWS = 10000
+
+
+def connect(path, tuned):
+    if tuned:
+        # busy_timeout comes from the profile instead of the driver default
+        conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+        apply_pragmas(conn, Config.SQLITE_PRAGMAS)
+    else:
+        conn = sqlite3.connect(path, isolation_level=None)
+    return conn
+
+
+def seed(path, tuned):
+    conn = connect(path, tuned)
+    conn.execute('CREATE TABLE recipes (id INTEGER PRIMARY KEY, title TEXT, instructions TEXT, updated_at REAL)')
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO recipes (title, instructions, updated_at) VALUES (?, ?, ?)',
+        ((f'Recipe {i}', 'Mix, then bake. ' * 20, time.time()) for i in range(SEED_ROWS))
+    )
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def worker(path, tuned, role, seconds, results):
+    conn = connect(path, tuned)
+    rng = random.Random(os.getpid())
+    ops = locked = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if role == 'writer':
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('UPDATE recipes SET updated_at = ? WHERE id = ?', (time.time(), rng.randint(1, SEED_ROWS)))
+                conn.execute(
+                    'INSERT INTO recipes (title, instructions, updated_at) VALUES (?, ?, ?)',
+                    ('New recipe', 'Stir. ' * 20, time.time())
+                )
+                conn.execute('COMMIT')
+            else:
+                start = rng.randint(1, SEED_ROWS)
+                conn.execute('SELECT id, title FROM recipes WHERE id BETWEEN ? AND ?', (start, start + 20)).fetchall()
+            ops += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    conn.close()
+    results.put((role, ops, locked))
+
+
+def run_profile(tuned, readers, writers, seconds):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.remove(path)
+    try:
+        seed(path, tuned)
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(path, tuned, role, seconds, results))
+            for role in ['reader'] * readers + ['writer'] * writers
+        ]
+        for proc in procs:
+            proc.start()
+        totals = {'reads': 0, 'writes': 0, 'locked_errors': 0}
+        for _ in procs:
+            role, ops, locked = results.get()
+            totals['reads' if role == 'reader' else 'writes'] += ops
+            totals['locked_errors'] += locked
+        for proc in procs:
+            proc.join()
+    finally:
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return {
+        'profile': 'tuned' if tuned else 'default',
+        'reads_per_sec': round(totals['reads'] / seconds, 1),
+        'writes_per_sec': round(totals['writes'] / seconds, 1),
+        'locked_errors': totals['locked_errors'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    results = [run_profile(tuned, args.readers, args.writers, args.seconds) for tuned in (False, True)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile')
+    print(f'{"profile":<10}{"reads/s":>12}{"writes/s":>12}{"locked":>10}')
+    for result in results:
+        print(f'{result["profile"]:<10}{result["reads_per_sec"]:>12}{result["writes_per_sec"]:>12}{result["locked_errors"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
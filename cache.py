@@ -0,0 +1,252 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import make_transient_to_detached
+
+
+class MemoryBackend:
+    """In-process LRU cache with a per-entry time to live."""
+
+    def __init__(self, max_entries=1024, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """LRU/TTL cache in a local SQLite file, shared by every worker on the host."""
+
+    # Recording every hit would turn reads into writes, so the LRU
+    # timestamp is only refreshed once it is this many seconds old.
+    TOUCH_INTERVAL = 30
+
+    def __init__(self, path, max_entries=1024, ttl=300, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not cross a fork, so each worker opens its own
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = self._clock()
+        row = conn.execute(
+            'SELECT value, expires_at, accessed_at FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at, accessed_at = row
+        if expires_at <= now:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return None
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = self._clock()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value), now + self.ttl, now)
+        )
+        count = conn.execute('SELECT count(*) FROM cache').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY expires_at <= ? DESC, accessed_at LIMIT ?)',
+                (now, count - self.max_entries)
+            )
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache')
+
+    def __len__(self):
+        return self._connect().execute('SELECT count(*) FROM cache').fetchone()[0]
+
+
+class FragmentCache:
+    """Cache of rendered HTML fragments, each stored with a version.
+
+    A fragment is only returned when its stored version matches the one
+    the caller asks for, so a stale entry is never served even before it
+    is invalidated.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('FRAGMENT_CACHE_BACKEND', 'memory')
+        max_entries = app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 1024)
+        ttl = app.config.get('FRAGMENT_CACHE_TTL', 3600)
+        if backend == 'sqlite':
+            self.backend = SQLiteBackend(app.config['FRAGMENT_CACHE_PATH'], max_entries, ttl)
+        elif backend == 'memory':
+            self.backend = MemoryBackend(max_entries, ttl)
+        elif backend == 'null':
+            self.backend = None
+        else:
+            raise ValueError(f'Unknown FRAGMENT_CACHE_BACKEND: {backend}')
+
+    def get(self, key, version):
+        entry = self.backend.get(key) if self.backend is not None else None
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, key, version, fragment):
+        if self.backend is not None:
+            self.backend.set(key, (version, str(fragment)))
+
+    def delete(self, key):
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def recipe_fragment_key(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+class UserCache:
+    """Short-lived, process-local cache for the Flask-Login user loader.
+
+    Entries are detached snapshots of the users row that are merged into
+    the current session without a query. An entry is dropped as soon as
+    this process flushes a change to the user. Every such change, in any
+    worker, also bumps the 'users' counter in cache_versions; the counter
+    is checked at most once every check_interval seconds and the whole
+    cache is dropped when it has moved.
+    """
+
+    def __init__(self, app=None):
+        self.backend = MemoryBackend()
+        self.check_interval = 1
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = MemoryBackend(
+            app.config.get('USER_CACHE_MAX_ENTRIES', 1000),
+            app.config.get('USER_CACHE_TTL', 30)
+        )
+        self.check_interval = app.config.get('USER_CACHE_CHECK_INTERVAL', 1)
+
+    def _check_version(self, current_version):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            version = current_version()
+            if version != self._version:
+                self.backend.clear()
+                self._version = version
+            self._checked_at = now
+
+    def load(self, session, model, user_id, current_version):
+        """Return the user with user_id, merged into session.
+
+        current_version is called with no arguments and returns the
+        'users' counter.
+        """
+        self._check_version(current_version)
+        snapshot = self.backend.get(user_id)
+        if snapshot is not None:
+            self.hits += 1
+            return session.merge(snapshot, load=False)
+        self.misses += 1
+        user = session.get(model, user_id)
+        if user is not None:
+            self.backend.set(user_id, self._snapshot(user))
+        return user
+
+    @staticmethod
+    def _snapshot(user):
+        columns = {column.key: getattr(user, column.key) for column in user.__mapper__.column_attrs}
+        snapshot = type(user)(**columns)
+        make_transient_to_detached(snapshot)
+        return snapshot
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def clear(self):
+        self.backend.clear()
+        self._version = None
+        self._checked_at = None
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.backend)}
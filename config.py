@@ -9,6 +9,19 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'recipe_app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite Performance Profile (applied to every new connection)
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', 'true').lower() == 'true'
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',        # readers don't block the writer
+        'synchronous': 'NORMAL',      # safe with WAL, fsyncs only at checkpoints
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative means KiB
+        'temp_store': 'MEMORY',
+    }
+    # Seconds between PRAGMA optimize / WAL checkpoint runs per worker (0 disables)
+    SQLITE_MAINTENANCE_INTERVAL = int(os.environ.get('SQLITE_MAINTENANCE_INTERVAL', 3600))
     
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=60)
@@ -18,10 +31,87 @@ class Config:
     # Security Configuration
     DEBUG = os.environ.get('FLASK_DEBUG', 'false').lower() == 'true'
     
+    # Instrumentation Configuration (Server-Timing header, slow query and N+1 logging)
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+    # Timings reveal server internals, so the header is only sent in debug mode unless enabled
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', str(DEBUG)).lower() == 'true'
+
+    # Pagination Configuration
+    RECIPES_PER_PAGE = int(os.environ.get('RECIPES_PER_PAGE', 24))
+    SEARCH_RESULTS_PER_PAGE = int(os.environ.get('SEARCH_RESULTS_PER_PAGE', 20))
+
+    # Fragment Cache Configuration ('memory', 'sqlite' to share between workers, or 'null')
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+    FRAGMENT_CACHE_PATH = os.environ.get('FRAGMENT_CACHE_PATH') or \
+        os.path.join(basedir, 'instance', 'fragment_cache.db')
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 1024))
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 3600))
+
+    # User Cache Configuration (logged-in users kept per worker between requests)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 1000))
+    # Seconds between checks for user changes made by other workers
+    USER_CACHE_CHECK_INTERVAL = float(os.environ.get('USER_CACHE_CHECK_INTERVAL', 1))
+
+    # Seconds between checks of the tag taxonomy version
+    TAXONOMY_CHECK_INTERVAL = float(os.environ.get('TAXONOMY_CHECK_INTERVAL', 5))
+
+    # Seconds between checks for recipe changes by the in-memory recipe indexes
+    RECIPE_INDEX_CHECK_INTERVAL = float(os.environ.get('RECIPE_INDEX_CHECK_INTERVAL', 5))
+
+    # Seconds between checks for new ingredients and usage counts by the autocomplete index
+    AUTOCOMPLETE_CHECK_INTERVAL = float(os.environ.get('AUTOCOMPLETE_CHECK_INTERVAL', 5))
+
+    # Records written per transaction by 'flask import-recipes'
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+
+    # Recipes read per batch by 'flask export-recipes' and /export
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+
+    # JSON API page sizes, and the smallest body worth compressing
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 20))
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 100))
+    API_COMPRESS_MIN_SIZE = int(os.environ.get('API_COMPRESS_MIN_SIZE', 500))
+
+    # Password hashing (werkzeug method string; stored hashes are upgraded on login).
+    # scrypt:32768:8:1 needs 32MB per hash in progress, so keep WORKERS modest.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_SALT_LENGTH = 16
+    # Hashing threads per worker process (0 hashes on the request thread)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    # Hashes running or queued per process before logins get a 503
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 8))
+    PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1))
+
+    # Most recipes a meal plan may hold
+    MEAL_PLAN_MAX_RECIPES = int(os.environ.get('MEAL_PLAN_MAX_RECIPES', 50))
+
+    # Similar recipes stored per recipe by 'flask compute-neighbors' and shown on its page
+    RECIPE_NEIGHBORS = int(os.environ.get('RECIPE_NEIGHBORS', 6))
+
+    # HTTP Cache Configuration (seconds a shared cache may keep anonymous pages)
+    HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 60))
+
     # File Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+
+    # Recipe images, stored by content hash, and the widths of their resized copies
+    IMAGE_FOLDER = os.environ.get('IMAGE_FOLDER') or os.path.join(basedir, 'uploads')
+    IMAGE_WIDTHS = (320, 640, 1024)
+    # Processes making resized copies (0 makes them inside the request)
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+    # Variant listings kept per worker, and how long one that isn't written yet is taken as missing
+    IMAGE_VARIANTS_CACHE_SIZE = int(os.environ.get('IMAGE_VARIANTS_CACHE_SIZE', 1024))
+    IMAGE_VARIANTS_MISS_TTL = int(os.environ.get('IMAGE_VARIANTS_MISS_TTL', 5))
     
     # Static File Configuration
     STATIC_FOLDER = 'static'
     STATIC_URL_PATH = '/static'
+
+    # Fingerprinted assets written by 'flask build-assets', under the static folder
+    ASSETS_DIST_FOLDER = 'dist'
+    ASSETS_MAX_AGE = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))
+
     TEMPLATES_AUTO_RELOAD = True
@@ -1,6 +1,7 @@
 from flask import Flask
 from models import db, User, Recipe, Ingredient, RecipeIngredient
 from config import Config
+from ingredients import parse_ingredient_line, resolve_ingredient_ids
 import os
 
 # Create the Flask application
@@ -11,27 +12,17 @@ app.config.from_object(Config)
 db.init_app(app)
 
 def create_ingredients_for_recipe(recipe, ingredients_text):
-    # Split ingredients text into lines
-    ingredient_lines = ingredients_text.split('\n')
-    for line in ingredient_lines:
-        # Create ingredient if it doesn't exist
-        ingredient_name = line.split(' ', 1)[1] if ' ' in line else line
-        ingredient = Ingredient.query.filter_by(name=ingredient_name).first()
-        if not ingredient:
-            ingredient = Ingredient(name=ingredient_name)
-            db.session.add(ingredient)
-            db.session.commit()
-        
-        # Create recipe ingredient relationship
-        quantity = line.split(' ')[0] if ' ' in line else "1"
-        unit = "unit"  # Default unit
-        recipe_ingredient = RecipeIngredient(
-            recipe_id=recipe.recipe_id,
-            ingredient_id=ingredient.ingredient_id,
-            quantity=float(quantity),
-            unit=unit
-        )
-        db.session.add(recipe_ingredient)
+    # Parse every line, then resolve all the names in one go
+    parsed = [parse_ingredient_line(line) for line in ingredients_text.split('\n')]
+    parsed = [ingredient for ingredient in parsed if ingredient.name]
+    ingredient_ids = resolve_ingredient_ids(ingredient.name for ingredient in parsed)
+    for ingredient in parsed:
+        db.session.add(RecipeIngredient(
+            recipe_id=recipe.id,
+            ingredient_id=ingredient_ids[ingredient.name],
+            quantity=ingredient.quantity,
+            unit=ingredient.unit
+        ))
 
 def create_test_data():
     with app.app_context():
@@ -85,7 +76,7 @@ def create_test_data():
                             prep_time_minutes=30,
                             cook_time_minutes=45,
                             servings=recipe_data['servings'],
-                            user_id=user.user_id
+                            user_id=user.id
                         )
                         db.session.add(recipe)
                         db.session.commit()
@@ -0,0 +1,132 @@
+"""Stream recipes out of the database as JSONL or a zipped bundle.
+
+Recipes are read with yield_per, which uses a server-side cursor where
+the driver has one, and handled one partition at a time: the
+ingredients and tags of a partition are fetched with one query each, so
+memory stays flat however many recipes there are. Each record is in the
+format 'flask import-recipes' reads, with ingredients as text lines, so
+an export can be imported into another database.
+"""
+import json
+import zipfile
+from datetime import datetime
+
+from extensions import db
+from models import Ingredient, Recipe, RecipeIngredient, Tag, User, recipe_tags
+
+FORMATS = {
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'zip': ('application/zip', 'zip'),
+}
+
+RECIPE_COLUMNS = [
+    Recipe.id, Recipe.title, Recipe.description, Recipe.instructions, Recipe.prep_time_minutes,
+    Recipe.cook_time_minutes, Recipe.servings, Recipe.created_at, Recipe.updated_at,
+]
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _children(recipe_ids):
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = db.session.execute(
+        db.select(RecipeIngredient.recipe_id, RecipeIngredient.quantity, RecipeIngredient.unit, Ingredient.name)
+        .join(Ingredient).where(RecipeIngredient.recipe_id.in_(recipe_ids)).order_by(RecipeIngredient.id)
+    )
+    for recipe_id, quantity, unit, name in rows:
+        ingredients[recipe_id].append(f'{float(quantity):g} {unit} {name}')
+
+    tags = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = db.session.execute(
+        db.select(recipe_tags.c.recipe_id, Tag.name).join(Tag, Tag.id == recipe_tags.c.tag_id)
+        .where(recipe_tags.c.recipe_id.in_(recipe_ids)).order_by(Tag.id)
+    )
+    for recipe_id, name in rows:
+        tags[recipe_id].append(name)
+    return ingredients, tags
+
+
+def iter_records(user_id=None, batch_size=500):
+    """Yield lists of export records, one list per batch of recipes, oldest first."""
+    query = db.select(*RECIPE_COLUMNS, User.username).join(User).order_by(Recipe.id)
+    if user_id is not None:
+        query = query.where(Recipe.user_id == user_id)
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        ingredients, tags = _children([row.id for row in partition])
+        yield [
+            {
+                'id': row.id,
+                'title': row.title,
+                'description': row.description,
+                'instructions': row.instructions,
+                'prep_time_minutes': row.prep_time_minutes,
+                'cook_time_minutes': row.cook_time_minutes,
+                'servings': row.servings,
+                'author': row.username,
+                'created_at': _isoformat(row.created_at),
+                'updated_at': _isoformat(row.updated_at),
+                'ingredients': ingredients[row.id],
+                'tags': tags[row.id],
+            }
+            for row in partition
+        ]
+
+
+def _encode(records):
+    return ''.join(json.dumps(record) + '\n' for record in records).encode()
+
+
+def jsonl_chunks(batches):
+    """Encode batches of records as JSONL, one chunk of bytes per batch."""
+    for records in batches:
+        yield _encode(records)
+
+
+class _Chunks:
+    # A write-only file for ZipFile that hands out what was written so far.
+    # Having no tell() makes ZipFile write in its streaming mode.
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b''.join(chunks)
+
+
+def zip_chunks(batches):
+    """Stream a zip holding recipes.jsonl and a manifest.json with the record count."""
+    out = _Chunks()
+    count = 0
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        with bundle.open('recipes.jsonl', 'w', force_zip64=True) as f:
+            for records in batches:
+                count += len(records)
+                f.write(_encode(records))
+                yield from out.drain()
+        manifest = {'format': 'recipes-jsonl', 'recipes': count, 'exported_at': _isoformat(datetime.utcnow())}
+        bundle.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield from out.drain()
+
+
+def export_chunks(fmt, user_id=None, batch_size=500):
+    """Return an iterator of bytes for the whole export in the given format."""
+    batches = iter_records(user_id, batch_size)
+    if fmt == 'zip':
+        return zip_chunks(batches)
+    return jsonl_chunks(batches)
+
+
+def export_filename(fmt, scope):
+    return f"recipes-{scope}-{datetime.utcnow():%Y%m%d-%H%M%S}.{FORMATS[fmt][1]}"
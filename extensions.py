@@ -2,6 +2,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
+from cache import FragmentCache, UserCache
+from passwords import PasswordHasher
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -9,3 +11,6 @@ migrate = Migrate()
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 login_manager.login_view = 'login'
+fragment_cache = FragmentCache()
+user_cache = UserCache()
+password_hasher = PasswordHasher()
@@ -0,0 +1,115 @@
+from collections import namedtuple
+
+import search
+from extensions import db
+from models import Recipe, recipe_tags
+from recipe_index import bitmap, tag_index, to_ids
+from search import SearchPage
+from taxonomy import taxonomy
+
+# Tag types offered as facets on the recipes page, in display order
+FACET_TYPES = ('meal', 'diet')
+
+FacetValue = namedtuple('FacetValue', ['tag', 'count', 'selected'])
+
+
+def selected_tags(args):
+    """Map each facet type to the tags named for it in the request args."""
+    selected = {}
+    for type_name in FACET_TYPES:
+        names = {name.lower() for name in args.getlist(type_name)}
+        selected[type_name] = [tag for tag in taxonomy.tags(type_name) if tag.name.lower() in names]
+    return selected
+
+
+def facet_args(selected, toggle=None):
+    """Build url_for arguments for a selection, optionally with one tag toggled."""
+    args = {}
+    for type_name, tags in selected.items():
+        names = [tag.name for tag in tags]
+        if toggle is not None and toggle.type_name == type_name:
+            names = [name for name in names if name != toggle.name] if toggle in tags else names + [toggle.name]
+        if names:
+            args[type_name] = names
+    return args
+
+
+def _union(tags):
+    bits = 0
+    for tag in tags:
+        bits |= tag_index.recipes_with(tag.id)
+    return bits
+
+
+def _filters(search_query, selected):
+    ranked = search.matching_ids(search_query) if search_query else None
+    base = bitmap(ranked) if ranked is not None else tag_index.all_recipes()
+    filters = {type_name: _union(tags) for type_name, tags in selected.items() if tags}
+    return ranked, base, filters
+
+
+def _counts(base, filters, selected):
+    facets = {}
+    for type_name in FACET_TYPES:
+        scope = base
+        for other, bits in filters.items():
+            if other != type_name:
+                scope &= bits
+        chosen = selected.get(type_name, [])
+        facets[type_name] = [
+            FacetValue(tag, (scope & tag_index.recipes_with(tag.id)).bit_count(), tag in chosen)
+            for tag in taxonomy.tags(type_name)
+        ]
+    return facets
+
+
+def facet_counts(search_query, selected):
+    """Return a dict of FacetValue lists by tag type for a text query and selection."""
+    _, base, filters = _filters(search_query, selected)
+    return _counts(base, filters, selected)
+
+
+def _newest(selected, offset, limit):
+    # Each selected type is one IN over recipe_tags, so the page comes
+    # straight off the (created_at, id) index
+    query = db.select(Recipe.id)
+    for tags in selected.values():
+        if tags:
+            query = query.where(Recipe.id.in_(
+                db.select(recipe_tags.c.recipe_id).where(recipe_tags.c.tag_id.in_([tag.id for tag in tags]))
+            ))
+    query = query.order_by(Recipe.created_at.desc(), Recipe.id.desc()).limit(limit).offset(offset)
+    return db.session.execute(query).scalars().all()
+
+
+def browse(search_query, selected, page=1, per_page=20):
+    """Filter recipes by text and tags and count the recipes behind every facet value.
+
+    Tags of one type are ORed and the types are ANDed. The counts of each
+    type apply the text query and the other types' selections but not its
+    own, so they show what picking another value of that type would
+    return. Everything is computed from the tag bitmaps, which are kept
+    current on recipe writes, so no COUNT query runs per tag. Counting
+    under a text query needs the ids of every match; the recipes of the
+    page itself are only read for that page.
+
+    Returns a SearchPage of recipes (best text match first, otherwise
+    newest first) and a dict of FacetValue lists by tag type.
+    """
+    ranked, base, filters = _filters(search_query, selected)
+    facets = _counts(base, filters, selected)
+
+    page = max(page, 1)
+    if search_query and not filters:
+        return search.search_recipes(search_query, page, per_page), facets
+    offset = (page - 1) * per_page
+    if ranked is not None:
+        selection = base
+        for bits in filters.values():
+            selection &= bits
+        members = set(to_ids(selection))
+        ids = [recipe_id for recipe_id in ranked if recipe_id in members][offset:offset + per_page + 1]
+    else:
+        ids = _newest(selected, offset, per_page + 1)
+    has_next = len(ids) > per_page
+    return SearchPage(search.load_recipes(ids[:per_page]), page, per_page, has_next), facets
@@ -1,10 +1,13 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField
 from wtforms import (
     StringField, PasswordField, BooleanField, TextAreaField, IntegerField,
     SubmitField, FieldList, FormField, DecimalField, SelectField, SelectMultipleField
 )
 from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange, ValidationError
-from models import User, Tag, TagType
+from images import InvalidImage, recipe_images
+from models import User
+from taxonomy import taxonomy
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -29,20 +32,27 @@ class RegistrationForm(FlaskForm):
         if user is not None:
             raise ValidationError('Please use a different email address.')
 
+class DeleteAccountForm(FlaskForm):
+    password = PasswordField('Password', validators=[DataRequired()])
+    submit = SubmitField('Delete My Account')
+
+
+UNIT_CHOICES = [
+    ('cup', 'Cup(s)'),
+    ('tbsp', 'Tablespoon(s)'),
+    ('tsp', 'Teaspoon(s)'),
+    ('oz', 'Ounce(s)'),
+    ('lb', 'Pound(s)'),
+    ('g', 'Gram(s)'),
+    ('ml', 'Milliliter(s)'),
+    ('piece', 'Piece(s)'),
+    ('pinch', 'Pinch'),
+    ('whole', 'Whole')
+]
+
 class IngredientForm(FlaskForm):
     ingredient_quantity = DecimalField('Quantity', validators=[DataRequired(), NumberRange(min=0)], places=2)
-    ingredient_unit = SelectField('Unit', choices=[
-        ('cup', 'Cup(s)'),
-        ('tbsp', 'Tablespoon(s)'),
-        ('tsp', 'Teaspoon(s)'),
-        ('oz', 'Ounce(s)'),
-        ('lb', 'Pound(s)'),
-        ('g', 'Gram(s)'),
-        ('ml', 'Milliliter(s)'),
-        ('piece', 'Piece(s)'),
-        ('pinch', 'Pinch'),
-        ('whole', 'Whole')
-    ])
+    ingredient_unit = SelectField('Unit', choices=UNIT_CHOICES)
     ingredient_name = StringField('Ingredient', validators=[DataRequired(), Length(max=100)])
 
 class RecipeForm(FlaskForm):
@@ -55,12 +65,23 @@ class RecipeForm(FlaskForm):
     instructions = TextAreaField('Instructions', validators=[DataRequired()])
     meal_tags = SelectMultipleField('Meal Type', coerce=int)
     diet_tags = SelectMultipleField('Diet Type', coerce=int)
+    image = FileField('Photo', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'webp', 'gif'], 'Images only.')])
     submit = SubmitField('Save Recipe')
 
     def __init__(self, *args, **kwargs):
         super(RecipeForm, self).__init__(*args, **kwargs)
-        # Populate the tag choices
-        meal_tags = Tag.query.join(TagType).filter(TagType.name == 'meal').all()
-        diet_tags = Tag.query.join(TagType).filter(TagType.name == 'diet').all()
-        self.meal_tags.choices = [(tag.id, tag.name) for tag in meal_tags]
-        self.diet_tags.choices = [(tag.id, tag.name) for tag in diet_tags]
+        # Populate the tag choices from the per-worker taxonomy cache
+        self.meal_tags.choices = taxonomy.choices('meal')
+        self.diet_tags.choices = taxonomy.choices('diet')
+
+    def validate_image(self, image):
+        # Only checked here; save_image stores it once every field is valid
+        if image.data:
+            try:
+                recipe_images.check(image.data)
+            except InvalidImage as e:
+                raise ValidationError(str(e))
+
+    def save_image(self):
+        """Store the uploaded photo and return its filename, or None if there is none."""
+        return recipe_images.save(self.image.data) if self.image.data else None
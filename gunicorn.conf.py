@@ -1,3 +1,5 @@
 workers = 4
+# Threaded workers keep serving while a login waits on the password hashing pool
+threads = 4
 bind = "0.0.0.0:10000"
 timeout = 120
@@ -0,0 +1,84 @@
+import hashlib
+from datetime import timezone
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from images import recipe_images
+
+
+def viewer_key():
+    """Identify who a page is rendered for, since the navbar differs per user."""
+    return current_user.id if current_user.is_authenticated else 'anonymous'
+
+
+def make_etag(*parts):
+    """Build a strong ETag value from the parts that determine a page."""
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def recipes_etag(recipes, *parts):
+    """Build an ETag for a listing from the id, updated_at and image of each recipe.
+
+    Listings are sent without Last-Modified: a deleted recipe or one moving
+    in from the next page changes the page without moving the newest
+    updated_at on it, so If-Modified-Since alone would get a stale 304.
+    """
+    # Cards switch to the resized images once they have been made
+    keys = [
+        f'{recipe.id}:{recipe.updated_at.isoformat()}:{recipe_images.cache_key(recipe.image_filename)}'
+        for recipe in recipes
+    ]
+    return make_etag(*parts, viewer_key(), *keys)
+
+
+def _as_http_date(value):
+    # Columns hold naive UTC; HTTP dates have one second resolution
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the client already has this version, else None.
+
+    Call this before rendering so a matching request skips the template
+    entirely. If-None-Match takes precedence over If-Modified-Since.
+    """
+    if session.get('_flashes'):
+        # Pending flash messages are only shown by a full render
+        return None
+    last_modified = _as_http_date(last_modified)
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif last_modified is not None and request.if_modified_since is not None:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    return cache_headers(make_response('', 304), etag, last_modified)
+
+
+def cache_headers(response, etag, last_modified=None):
+    """Set ETag, Last-Modified and Cache-Control on a page response.
+
+    Anonymous pages may be stored by a shared cache for HTTP_CACHE_MAX_AGE
+    seconds; pages rendered for a logged-in user must be revalidated and
+    are only cacheable by the browser.
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_http_date(last_modified)
+    response.vary.add('Cookie')
+    if session.modified:
+        # The render consumed flash messages, so this body is one-off
+        response.cache_control.no_store = True
+    elif current_user.is_authenticated:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+    return response
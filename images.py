@@ -0,0 +1,240 @@
+"""Content-addressed recipe images with resized and WebP variants.
+
+An upload is copied to disk in chunks while it is hashed, and stored as
+<sha256>.<ext> under IMAGE_FOLDER, so the same photo uploaded twice is
+kept once. Resized JPEG/PNG and WebP copies at IMAGE_WIDTHS are made in
+a process pool after the request has been answered; until they exist
+the original is shown. Stored files never change, so they are served
+with a one year immutable Cache-Control.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import send_from_directory, url_for
+from PIL import Image, UnidentifiedImageError
+
+from cache import MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _subdir(filename):
+    return filename[:2]
+
+
+def _log_failure(future, filename):
+    # The original keeps being shown, so a failure only costs bandwidth
+    if future.exception() is not None:
+        logger.error(f'Making variants of {filename} failed: {future.exception()}')
+
+
+def make_variants(source, out_dir, stem, widths):
+    """Write resized copies of source and return their descriptions.
+
+    Runs in a worker process. Each width narrower than the original gets
+    a copy in the original's format (JPEG for anything but PNG) and one
+    in WebP; an image narrower than every width gets both at its own
+    size. A <stem>.json listing the variants is written last, so its
+    presence means they are all in place.
+    """
+    with Image.open(source) as image:
+        image.load()
+        fallback = 'PNG' if image.format == 'PNG' else 'JPEG'
+        sizes = [width for width in widths if width < image.width] or [image.width]
+        if fallback == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        variants = []
+        for width in sizes:
+            height = max(round(image.height * width / image.width), 1)
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+            for fmt in (fallback, 'WEBP'):
+                name = f'{stem}-{width}.{FORMATS[fmt]}'
+                options = {'optimize': True}
+                if fmt != 'PNG':
+                    options['quality'] = 80
+                resized.save(os.path.join(out_dir, name), fmt, **options)
+                variants.append({'width': width, 'type': Image.MIME[fmt], 'name': name})
+
+    listing = os.path.join(out_dir, f'{stem}.json')
+    with open(listing + '.tmp', 'w') as f:
+        json.dump(variants, f)
+    os.replace(listing + '.tmp', listing)
+    return variants
+
+
+def _pool_context():
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def _image_format(source):
+    try:
+        with Image.open(source) as image:
+            fmt = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise InvalidImage('The file is not a readable image.') from e
+    if fmt not in FORMATS:
+        raise InvalidImage(f'{fmt} images are not supported.')
+    return fmt
+
+
+class ImageStore:
+    """Stores uploads by content hash and serves them and their variants."""
+
+    def __init__(self, app=None):
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        # Listings never change once written, so they only leave by LRU;
+        # a missing one is remembered briefly so cards don't retry the open
+        self._variants = MemoryBackend(1024, ttl=float('inf'))
+        self._missing = MemoryBackend(1024, ttl=5)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.config['IMAGE_FOLDER']
+        self.widths = tuple(app.config.get('IMAGE_WIDTHS', (320, 640, 1024)))
+        self.workers = app.config.get('IMAGE_WORKERS', 2)
+        self.max_age = app.config.get('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        cache_size = app.config.get('IMAGE_VARIANTS_CACHE_SIZE', 1024)
+        self._variants = MemoryBackend(cache_size, ttl=float('inf'))
+        self._missing = MemoryBackend(cache_size, ttl=app.config.get('IMAGE_VARIANTS_MISS_TTL', 5))
+        app.add_url_rule('/images/<path:filename>', endpoint='image', view_func=self.serve)
+        app.jinja_env.globals['recipe_images'] = self
+
+    def path(self, filename):
+        return os.path.join(self.folder, _subdir(filename), filename)
+
+    def check(self, file_storage):
+        """Raise InvalidImage unless an upload is a JPEG, PNG, WebP or GIF; nothing is written."""
+        try:
+            _image_format(file_storage.stream)
+        finally:
+            file_storage.stream.seek(0)
+
+    def save(self, file_storage):
+        """Store an uploaded file and return its content-addressed filename.
+
+        Raises InvalidImage if the file is not a JPEG, PNG, WebP or GIF.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.folder, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = file_storage.stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+            fmt = _image_format(tmp)
+            filename = f'{digest.hexdigest()}.{FORMATS[fmt]}'
+            target = self.path(filename)
+            if os.path.exists(target):
+                # Same content already stored; keep the existing file
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp, target)
+            return filename
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _executor(self):
+        # Pools don't survive a fork, so each worker process makes its own.
+        # Threaded workers can get here from several requests at once, and
+        # forking a process that runs other threads can deadlock the child,
+        # so the pool's processes come from a fork server (or are spawned).
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def process(self, filename):
+        """Make the variants of a stored image, in the background when workers are configured."""
+        if os.path.exists(self._listing(filename)):
+            return
+        args = (self.path(filename), os.path.dirname(self.path(filename)), filename.rsplit('.', 1)[0], self.widths)
+        if not self.workers:
+            make_variants(*args)
+            self._missing.delete(filename)
+            return
+        future = self._executor().submit(make_variants, *args)
+        future.add_done_callback(lambda done: self._made(done, filename))
+
+    def _made(self, future, filename):
+        _log_failure(future, filename)
+        self._missing.delete(filename)
+
+    def _listing(self, filename):
+        return os.path.join(self.folder, _subdir(filename), f'{filename.rsplit(".", 1)[0]}.json')
+
+    def variants(self, filename):
+        """Return the variant descriptions of an image, or [] while they are being made."""
+        variants = self._variants.get(filename)
+        if variants is not None:
+            return variants
+        if self._missing.get(filename):
+            return []
+        try:
+            with open(self._listing(filename)) as f:
+                variants = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._missing.set(filename, True)
+            return []
+        self._variants.set(filename, variants)
+        return variants
+
+    def clear(self):
+        self._variants.clear()
+        self._missing.clear()
+
+    def cache_key(self, filename):
+        """Part of a page ETag that changes when an image's variants become available."""
+        if not filename:
+            return ''
+        return f'{filename}:{len(self.variants(filename))}'
+
+    def srcsets(self, filename):
+        """Return {mime type: srcset} for the variants of an image."""
+        srcsets = {}
+        for variant in self.variants(filename):
+            url = url_for('image', filename=variant['name'])
+            srcsets.setdefault(variant['type'], []).append(f'{url} {variant["width"]}w')
+        return {mime: ', '.join(entries) for mime, entries in srcsets.items()}
+
+    def fallback_url(self, filename):
+        """URL of the smallest non-WebP variant, or of the original while there is none."""
+        candidates = [variant for variant in self.variants(filename) if variant['type'] != 'image/webp']
+        if candidates:
+            return url_for('image', filename=min(candidates, key=lambda variant: variant['width'])['name'])
+        return url_for('image', filename=filename)
+
+    def serve(self, filename):
+        response = send_from_directory(os.path.join(self.folder, _subdir(filename)), filename)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.cache_control.immutable = True
+        return response
+
+
+recipe_images = ImageStore()
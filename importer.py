@@ -0,0 +1,195 @@
+"""Stream recipes from JSONL or CSV files into the database in batches.
+
+Each record needs a title and instructions; description,
+prep_time_minutes, cook_time_minutes, servings, ingredients and tags
+are optional. ingredients is a list of free-text lines (or one string
+with a line per ingredient) and tags a list or comma-separated string
+of existing tag names. Files ending in .gz are decompressed on the fly.
+
+Records are read one at a time and written in batches, so memory stays
+flat however large the file is. After every committed batch the number
+of records consumed is saved to <file>.progress; a later run of the
+same file skips that many records and carries on. A batch that fails is
+rolled back as a whole, so rerunning after a crash repeats no rows
+unless the process died between a commit and the progress write.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from collections import namedtuple
+from itertools import islice
+
+import search
+from extensions import db
+from ingredients import parse_ingredient_line, resolve_ingredient_ids
+from models import CacheVersion, Recipe, RecipeIngredient, recipe_tags
+from taxonomy import taxonomy
+
+ImportStats = namedtuple('ImportStats', ['imported', 'skipped', 'resumed_from', 'seconds'])
+
+
+def detect_format(path):
+    """Guess 'csv' or 'jsonl' from the file name."""
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_records(path, fmt):
+    """Yield one dict per record, or None for a JSONL line that isn't valid JSON."""
+    with _open(path) as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def progress_path(path):
+    return f'{path}.progress'
+
+
+def load_progress(path):
+    """Return how many records an earlier run of path already committed."""
+    try:
+        with open(progress_path(path)) as f:
+            return json.load(f)['records']
+    except FileNotFoundError:
+        return 0
+
+
+def save_progress(path, records):
+    # Write then rename so a crash never leaves a half-written file
+    tmp = progress_path(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'records': records}, f)
+    os.replace(tmp, progress_path(path))
+
+
+def _lines(value):
+    if isinstance(value, list):
+        return [str(line) for line in value]
+    return str(value or '').splitlines()
+
+
+def _tag_names(value):
+    if isinstance(value, list):
+        return [str(name).strip() for name in value]
+    return [name.strip() for name in str(value or '').split(',')]
+
+
+def _int(value):
+    return int(value) if value not in (None, '') else None
+
+
+def _prepare(record, user_id):
+    """Turn a record into recipe columns, parsed ingredients and tag names, or None if unusable."""
+    if not isinstance(record, dict):
+        return None
+    title = str(record.get('title') or '').strip()
+    instructions = str(record.get('instructions') or '').strip()
+    if not title or not instructions:
+        return None
+    try:
+        columns = {
+            'user_id': user_id,
+            'title': title[:100],
+            'description': record.get('description') or '',
+            'instructions': instructions,
+            'prep_time_minutes': _int(record.get('prep_time_minutes')),
+            'cook_time_minutes': _int(record.get('cook_time_minutes')) or 0,
+            'servings': _int(record.get('servings')),
+        }
+    except (TypeError, ValueError):
+        return None
+    ingredients = [parse_ingredient_line(line) for line in _lines(record.get('ingredients'))]
+    ingredients = [ingredient for ingredient in ingredients if ingredient.name]
+    return columns, ingredients, _tag_names(record.get('tags'))
+
+
+def _write_batch(batch, tag_ids):
+    """Insert one batch of prepared records and return the new recipe ids."""
+    table = Recipe.__table__
+    recipe_ids = db.session.execute(
+        table.insert().returning(table.c.id, sort_by_parameter_order=True),
+        [columns for columns, _, _ in batch]
+    ).scalars().all()
+
+    ingredient_ids = resolve_ingredient_ids(
+        ingredient.name for _, ingredients, _ in batch for ingredient in ingredients
+    )
+    ingredient_rows, tag_rows = [], []
+    for recipe_id, (_, ingredients, tag_names) in zip(recipe_ids, batch):
+        ingredient_rows.extend(
+            {'recipe_id': recipe_id, 'ingredient_id': ingredient_ids[ingredient.name],
+             'quantity': ingredient.quantity, 'unit': ingredient.unit}
+            for ingredient in ingredients
+        )
+        tags = {tag_ids[name.lower()] for name in tag_names if name.lower() in tag_ids}
+        tag_rows.extend({'recipe_id': recipe_id, 'tag_id': tag_id} for tag_id in tags)
+    if ingredient_rows:
+        db.session.execute(RecipeIngredient.__table__.insert(), ingredient_rows)
+    if tag_rows:
+        db.session.execute(recipe_tags.insert(), tag_rows)
+
+    # Core inserts skip the ORM events that keep these in step
+    connection = db.session.connection()
+    search.index_recipes(connection, recipe_ids)
+    CacheVersion.bump(connection, 'recipes')
+    return recipe_ids
+
+
+def import_recipes(path, user_id, fmt=None, batch_size=500, restart=False, report=None):
+    """Import every record of path for user_id and return ImportStats.
+
+    report, if given, is called after each batch with the records
+    consumed so far, the recipes imported so far and the rows per second.
+    Unusable records are skipped and counted. The progress file is
+    removed once the whole file has been imported.
+    """
+    fmt = fmt or detect_format(path)
+    resumed_from = 0 if restart else load_progress(path)
+    tag_ids = {
+        tag.name.lower(): tag.id
+        for type_name in taxonomy.type_names() for tag in taxonomy.tags(type_name)
+    }
+
+    started = time.monotonic()
+    consumed, imported, skipped = resumed_from, 0, 0
+    records = islice(read_records(path, fmt), resumed_from, None)
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+        batch = [prepared for prepared in (_prepare(record, user_id) for record in chunk) if prepared]
+        skipped += len(chunk) - len(batch)
+        try:
+            if batch:
+                _write_batch(batch, tag_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        consumed += len(chunk)
+        imported += len(batch)
+        save_progress(path, consumed)
+        if report is not None:
+            elapsed = time.monotonic() - started
+            report(consumed, imported, imported / elapsed if elapsed else 0.0)
+
+    if os.path.exists(progress_path(path)):
+        os.remove(progress_path(path))
+    return ImportStats(imported, skipped, resumed_from, time.monotonic() - started)
@@ -0,0 +1,161 @@
+import re
+from collections import namedtuple
+from decimal import Decimal
+from fractions import Fraction
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import CacheVersion, Ingredient, RecipeIngredient
+
+ParsedIngredient = namedtuple('ParsedIngredient', ['quantity', 'unit', 'name'])
+
+# Spellings of each IngredientForm unit choice, and units converted to one of them with a factor
+UNIT_ALIASES = {
+    'cup': ['c', 'cup', 'cups'],
+    'tbsp': ['T', 'tbsp', 'tbs', 'tbl', 'tablespoon', 'tablespoons'],
+    'tsp': ['t', 'tsp', 'teaspoon', 'teaspoons'],
+    'oz': ['oz', 'ounce', 'ounces'],
+    'lb': ['lb', 'lbs', 'pound', 'pounds'],
+    'g': ['g', 'gr', 'gram', 'grams'],
+    'ml': ['ml', 'milliliter', 'milliliters', 'millilitre', 'millilitres'],
+    'piece': ['piece', 'pieces', 'slice', 'slices', 'clove', 'cloves', 'can', 'cans'],
+    'pinch': ['pinch', 'pinches', 'dash', 'dashes'],
+    'whole': ['whole'],
+}
+UNIT_CONVERSIONS = {
+    'kg': ('g', 1000), 'kilogram': ('g', 1000), 'kilograms': ('g', 1000),
+    'l': ('ml', 1000), 'liter': ('ml', 1000), 'liters': ('ml', 1000), 'litre': ('ml', 1000), 'litres': ('ml', 1000),
+    'pint': ('cup', 2), 'pints': ('cup', 2), 'quart': ('cup', 4), 'quarts': ('cup', 4),
+}
+UNICODE_FRACTIONS = {'½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8'}
+
+_UNITS = {alias: (unit, 1) for unit, aliases in UNIT_ALIASES.items() for alias in aliases}
+_NUMBER = r'(?:\d+/\d+|\d+(?:\.\d+)?(?:\s+\d+/\d+)?)'
+# A number, a mixed number or a fraction, optionally followed by the top of a range
+_QUANTITY = re.compile(rf'({_NUMBER})(?:\s*(?:-|to)\s*{_NUMBER})?\s*')
+
+
+def normalize_name(name):
+    """Collapse the whitespace in an ingredient name."""
+    return ' '.join((name or '').split())
+
+
+def parse_ingredient_line(line):
+    """Split a free-text line like "1 1/2 cups flour" into quantity, unit and name.
+
+    Fractions, mixed numbers and unicode fractions are understood; a range
+    like "2-3" keeps its lower bound. Units are mapped onto the form's unit
+    choices, converting metric and volume units where needed. A line
+    without a quantity counts as 1, and one without a known unit as whole.
+    """
+    text = normalize_name(line)
+    for char, fraction in UNICODE_FRACTIONS.items():
+        text = text.replace(char, f' {fraction} ')
+    text = normalize_name(text)
+
+    quantity = Fraction(1)
+    match = _QUANTITY.match(text)
+    if match:
+        quantity = sum(Fraction(part) for part in match.group(1).split())
+        text = text[match.end():]
+
+    unit, factor = 'whole', 1
+    word, _, rest = text.partition(' ')
+    token = word.rstrip('.')
+    known = _UNITS.get(token) or _UNITS.get(token.lower()) or UNIT_CONVERSIONS.get(token.lower())
+    if known and rest:
+        unit, factor = known
+        text = rest
+    if text.lower().startswith('of '):
+        text = text[3:]
+    return ParsedIngredient(round(float(quantity * factor), 2), unit, normalize_name(text))
+
+
+def _insert_missing(names):
+    # ON CONFLICT DO NOTHING lets two workers insert the same new name at
+    # once without one of them failing on the unique constraint.
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(Ingredient).on_conflict_do_nothing(index_elements=['name'])
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(Ingredient).on_conflict_do_nothing(index_elements=['name'])
+    else:
+        statement = db.insert(Ingredient)
+    db.session.execute(statement, [{'name': name} for name in names])
+    # Tells the autocomplete indexes of every worker to pick up the new names
+    CacheVersion.bump(db.session.connection(), 'ingredients')
+
+
+def resolve_ingredient_ids(names):
+    """Map each ingredient name to its id, creating the missing ones.
+
+    Existing names are resolved with one IN query and the missing ones are
+    bulk-inserted, all inside the caller's transaction. Nothing is committed.
+    """
+    names = {normalize_name(name) for name in names} - {''}
+    if not names:
+        return {}
+
+    ids = dict(db.session.execute(
+        db.select(Ingredient.name, Ingredient.id).where(Ingredient.name.in_(names))
+    ).all())
+    missing = names - ids.keys()
+    if missing:
+        _insert_missing(sorted(missing))
+        ids.update(db.session.execute(
+            db.select(Ingredient.name, Ingredient.id).where(Ingredient.name.in_(missing))
+        ).all())
+    return ids
+
+
+def _quantity(value):
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def update_recipe_ingredients(recipe_id, entries):
+    """Make a recipe's ingredient rows match entries of (name, quantity, unit).
+
+    Rows already matching an entry are left alone, a row whose ingredient
+    is still listed has its quantity and unit updated, and only what is
+    left over is deleted or inserted; at most one statement of each kind.
+    Returns True if anything was written. Nothing is committed.
+    """
+    entries = [(normalize_name(name), _quantity(quantity), unit) for name, quantity, unit in entries]
+    entries = [entry for entry in entries if entry[0]]
+    ingredient_ids = resolve_ingredient_ids([name for name, _, _ in entries])
+    wanted = [(ingredient_ids[name], quantity, unit) for name, quantity, unit in entries]
+
+    stored = {}
+    for row_id, ingredient_id, quantity, unit in db.session.execute(
+        db.select(RecipeIngredient.id, RecipeIngredient.ingredient_id, RecipeIngredient.quantity, RecipeIngredient.unit)
+        .where(RecipeIngredient.recipe_id == recipe_id)
+        .order_by(RecipeIngredient.id)
+    ):
+        stored.setdefault(ingredient_id, []).append((row_id, _quantity(quantity), unit))
+
+    # Unchanged rows first, so a repeated ingredient doesn't swap values between its rows
+    unmatched = []
+    for ingredient_id, quantity, unit in wanted:
+        rows = stored.get(ingredient_id, [])
+        same = next((row for row in rows if row[1:] == (quantity, unit)), None)
+        if same:
+            rows.remove(same)
+        else:
+            unmatched.append((ingredient_id, quantity, unit))
+    updates, inserts = [], []
+    for ingredient_id, quantity, unit in unmatched:
+        rows = stored.get(ingredient_id)
+        if rows:
+            updates.append({'id': rows.pop(0)[0], 'quantity': float(quantity), 'unit': unit})
+        else:
+            inserts.append({'recipe_id': recipe_id, 'ingredient_id': ingredient_id, 'quantity': float(quantity), 'unit': unit})
+    deletes = [row_id for rows in stored.values() for row_id, _, _ in rows]
+
+    if deletes:
+        db.session.execute(db.delete(RecipeIngredient).where(RecipeIngredient.id.in_(deletes)))
+    if updates:
+        db.session.execute(db.update(RecipeIngredient), updates)
+    if inserts:
+        db.session.execute(db.insert(RecipeIngredient), inserts)
+    return bool(deletes or updates or inserts)
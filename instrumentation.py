@@ -0,0 +1,125 @@
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,?)+\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """Reduce a SQL statement to its shape, ignoring literal values and IN-list lengths."""
+    shape = _LITERALS.sub('?', statement)
+    shape = _PLACEHOLDER_LISTS.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class RequestStats:
+    """SQL and template timings collected for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.shapes = Counter()
+        self._template_started = []
+
+
+class Instrumentation:
+    """Per-request SQL and timing instrumentation.
+
+    Counts the queries and database time of each request, times template
+    rendering separately, and reports both in a Server-Timing header when
+    SERVER_TIMING is on (by default only in debug mode).
+    Statements slower than SLOW_QUERY_THRESHOLD_MS are logged with the
+    route that ran them, and a request that runs the same statement shape
+    more than N_PLUS_ONE_THRESHOLD times is logged as a likely N+1.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('INSTRUMENTATION_ENABLED', True):
+            return
+        self.slow_query_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS', 100)
+        self.n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 10)
+        self.server_timing = app.config.get('SERVER_TIMING', app.debug)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    @staticmethod
+    def current():
+        if not has_request_context():
+            return None
+        return g.get('_request_stats')
+
+    def _start_request(self):
+        g._request_stats = RequestStats()
+
+    # The start time lives on the execution context, which is discarded
+    # whether or not the statement succeeds, so failed statements leave
+    # nothing behind on the connection
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._instrumentation_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._instrumentation_started
+        stats = self.current()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.shapes[statement_shape(statement)] += 1
+        if elapsed * 1000 >= self.slow_query_ms:
+            logger.warning(f'Slow query ({elapsed * 1000:.1f} ms) in {request.endpoint}: {statement}')
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = self.current()
+        if stats is not None:
+            stats._template_started.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = self.current()
+        if stats is not None and stats._template_started:
+            started = stats._template_started.pop()
+            # Only count the outermost render so nested templates aren't counted twice
+            if not stats._template_started:
+                stats.template_time += time.perf_counter() - started
+
+    def _finish_request(self, response):
+        stats = self.current()
+        if stats is None:
+            return response
+        if self.server_timing:
+            total = time.perf_counter() - stats.started
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'tpl;dur={stats.template_time * 1000:.1f}, '
+                f'app;dur={total * 1000:.1f}'
+            )
+        for shape, count in stats.shapes.items():
+            if count > self.n_plus_one_threshold:
+                logger.warning(f'Possible N+1 in {request.endpoint}: {count} x {shape}')
+        return response
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,33 @@
+"""Add recipe_neighbors table
+
+Revision ID: 5e9c03b7d1f4
+Revises: 8d2e41a7c5b0
+Create Date: 2026-10-17 20:05:12.604413
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e9c03b7d1f4'
+down_revision = '8d2e41a7c5b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recipe_neighbors',
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('neighbor_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['recipes.id'], ),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ),
+    sa.PrimaryKeyConstraint('recipe_id', 'rank')
+    )
+
+
+def downgrade():
+    op.drop_table('recipe_neighbors')
@@ -0,0 +1,47 @@
+"""Add indexes for hot queries
+
+Revision ID: 8d2e41a7c5b0
+Revises: 3b1f6c2d9a47
+Create Date: 2026-10-17 11:40:03.518227
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e41a7c5b0'
+down_revision = '3b1f6c2d9a47'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_recipes_created_at_id', 'recipes', ['created_at', 'id']),
+    ('ix_recipes_user_id', 'recipes', ['user_id']),
+    ('ix_recipe_ingredients_recipe_id', 'recipe_ingredients', ['recipe_id']),
+    ('ix_recipe_ingredients_ingredient_id', 'recipe_ingredients', ['ingredient_id']),
+    ('ix_recipe_tags_tag_id', 'recipe_tags', ['tag_id']),
+    ('ix_tags_tag_type_id_name', 'tags', ['tag_type_id', 'name']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY keeps the tables writable while the indexes build,
+        # but can't run inside a transaction
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
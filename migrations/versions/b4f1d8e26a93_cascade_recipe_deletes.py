@@ -0,0 +1,89 @@
+"""Cascade recipe and user deletes to dependent rows
+
+Revision ID: b4f1d8e26a93
+Revises: 5e9c03b7d1f4
+Create Date: 2026-10-17 22:48:36.170254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4f1d8e26a93'
+down_revision = '5e9c03b7d1f4'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table); every one references the referred table's id
+FOREIGN_KEYS = [
+    ('recipes', 'user_id', 'users'),
+    ('recipe_ingredients', 'recipe_id', 'recipes'),
+    ('recipe_tags', 'recipe_id', 'recipes'),
+    ('recipe_tags', 'tag_id', 'tags'),
+    ('recipe_categories', 'recipe_id', 'recipes'),
+    ('recipe_categories', 'category_id', 'categories'),
+    ('recipe_neighbors', 'recipe_id', 'recipes'),
+    ('recipe_neighbors', 'neighbor_id', 'recipes'),
+]
+# The cascade from recipes looks recipe_neighbors up by neighbor_id, which had no index
+NEIGHBOR_INDEX = ('ix_recipe_neighbors_neighbor_id', 'recipe_neighbors', ['neighbor_id'])
+# Lets batch mode find SQLite's unnamed foreign keys by name
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _postgresql(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        action = f' ON DELETE {ondelete}' if ondelete else ''
+        # NOT VALID skips the full-table check under the ALTER's exclusive
+        # lock; VALIDATE then scans while reads and writes carry on
+        op.execute(
+            f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}, '
+            f'ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {referred} (id){action} NOT VALID'
+        )
+        op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}')
+
+
+def _sqlite(ondelete):
+    # SQLite can't alter a constraint, so each table is copied into a new
+    # one. With foreign keys on, dropping the old recipes table would run
+    # the very cascades being added, and the pragma is a no-op inside a
+    # transaction.
+    with op.get_context().autocommit_block():
+        op.execute('PRAGMA foreign_keys=OFF')
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    for table in dict.fromkeys(table for table, _, _ in FOREIGN_KEYS):
+        if table not in tables:
+            continue
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for fk_table, column, referred in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                name = f'fk_{table}_{column}_{referred}'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+    with op.get_context().autocommit_block():
+        op.execute('PRAGMA foreign_keys=ON')
+
+
+def upgrade():
+    name, table, columns = NEIGHBOR_INDEX
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        _postgresql('CASCADE')
+    else:
+        op.create_index(name, table, columns, if_not_exists=True)
+        _sqlite('CASCADE')
+
+
+def downgrade():
+    name, table, _ = NEIGHBOR_INDEX
+    if op.get_bind().dialect.name == 'postgresql':
+        _postgresql(None)
+        with op.get_context().autocommit_block():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        _sqlite(None)
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,46 @@
+"""Add the PostgreSQL full-text search column and index
+
+Revision ID: d93a6e0f4c18
+Revises: b4f1d8e26a93
+Create Date: 2026-10-17 23:41:09.482317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93a6e0f4c18'
+down_revision = 'b4f1d8e26a93'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(instructions, '')), 'C')) STORED"
+)
+SEARCH_INDEX = ('ix_recipes_search_vector', 'recipes', ['search_vector'])
+
+
+def upgrade():
+    # SQLite's FTS5 table is created and backfilled by the app on first
+    # search; it lives outside the recipes table and needs no migration
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # Computing the stored column rewrites the table once
+    op.execute(SEARCH_VECTOR)
+    name, table, columns = SEARCH_INDEX
+    with op.get_context().autocommit_block():
+        op.create_index(name, table, columns, postgresql_using='gin', postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    name, table, _ = SEARCH_INDEX
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    op.drop_column('recipes', 'search_vector')
@@ -0,0 +1,35 @@
+"""Add recipe_neighbor_lists table
+
+Revision ID: e5b27c9f1a63
+Revises: d93a6e0f4c18
+Create Date: 2026-10-18 00:12:47.905116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b27c9f1a63'
+down_revision = 'd93a6e0f4c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recipe_neighbor_lists',
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('recipe_id')
+    )
+    # Lists already stored count as computed; recipes without one are
+    # recomputed once by the next incremental run
+    op.execute(
+        'INSERT INTO recipe_neighbor_lists (recipe_id, computed_at) '
+        'SELECT recipe_id, max(computed_at) FROM recipe_neighbors GROUP BY recipe_id'
+    )
+
+
+def downgrade():
+    op.drop_table('recipe_neighbor_lists')
@@ -1,7 +1,9 @@
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from extensions import db
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import object_session
+from extensions import db, password_hasher, user_cache
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -11,25 +13,46 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    recipes = db.relationship('Recipe', backref='author', lazy=True)
+    recipes = db.relationship('Recipe', backref='author', lazy=True, passive_deletes=True)
 
     def get_id(self):
         return str(self.id)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
 
 
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
+
+
+# Other workers drop their cached copies once they see the new 'users' version
+@event.listens_for(User, 'after_delete')
+def _bump_users_version(mapper, connection, target):
+    CacheVersion.bump(connection, 'users')
+
+
+@event.listens_for(User, 'after_update')
+def _bump_users_version_on_change(mapper, connection, target):
+    if has_column_changes(target):
+        CacheVersion.bump(connection, 'users')
+
+
 class Recipe(db.Model):
     __tablename__ = 'recipes'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     image_filename = db.Column(db.String(255))
@@ -39,13 +62,56 @@ class Recipe(db.Model):
     instructions = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    ingredients = db.relationship('RecipeIngredient', backref='recipe', lazy=True)
-    tags = db.relationship('Tag', secondary='recipe_tags', backref=db.backref('recipes', lazy='dynamic'))
+    # The database deletes the child rows (ON DELETE CASCADE); the ORM doesn't load them to do it
+    ingredients = db.relationship('RecipeIngredient', backref='recipe', lazy=True,
+                                  cascade='all', passive_deletes=True)
+    tags = db.relationship('Tag', secondary='recipe_tags', passive_deletes=True,
+                           backref=db.backref('recipes', lazy='dynamic', passive_deletes=True))
+
+    __table_args__ = (
+        # Newest-first listings and their keyset cursors
+        db.Index('ix_recipes_created_at_id', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<Recipe {self.title}>'
 
 
+def has_column_changes(target):
+    """Whether a flushed object's columns changed; after_update also fires for objects only marked dirty."""
+    return object_session(target).is_modified(target, include_collections=False)
+
+
+@event.listens_for(Recipe, 'after_insert')
+@event.listens_for(Recipe, 'after_delete')
+def _bump_recipes_version(mapper, connection, target):
+    CacheVersion.bump(connection, 'recipes')
+
+
+@event.listens_for(Recipe, 'after_update')
+def _bump_recipes_version_on_change(mapper, connection, target):
+    if has_column_changes(target):
+        CacheVersion.bump(connection, 'recipes')
+
+
+class RecipeNeighbor(db.Model):
+    """Precomputed most similar recipes, written by 'flask compute-neighbors'."""
+    __tablename__ = 'recipe_neighbors'
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    # Indexed for the cascade from recipes, which looks rows up by it
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('recipes.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+
+class RecipeNeighborList(db.Model):
+    """When each recipe's neighbor list was last computed, also if it came out empty."""
+    __tablename__ = 'recipe_neighbor_lists'
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id', ondelete='CASCADE'), primary_key=True)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+
 class Ingredient(db.Model):
     __tablename__ = 'ingredients'
     id = db.Column(db.Integer, primary_key=True)
@@ -58,8 +124,8 @@ class Ingredient(db.Model):
 class RecipeIngredient(db.Model):
     __tablename__ = 'recipe_ingredients'
     id = db.Column(db.Integer, primary_key=True)
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False)
-    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id', ondelete='CASCADE'), nullable=False, index=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False, index=True)
     quantity = db.Column(db.Numeric(8, 2), nullable=False)
     unit = db.Column(db.String(20), nullable=False)
     ingredient = db.relationship('Ingredient')
@@ -81,6 +147,54 @@ class Tag(db.Model):
     name = db.Column(db.String(50), nullable=False)
     tag_type_id = db.Column(db.Integer, db.ForeignKey('tag_types.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_tags_tag_type_id_name', 'tag_type_id', 'name'),
+    )
+
+
+@event.listens_for(Tag, 'after_insert')
+@event.listens_for(Tag, 'after_update')
+@event.listens_for(Tag, 'after_delete')
+@event.listens_for(TagType, 'after_insert')
+@event.listens_for(TagType, 'after_update')
+@event.listens_for(TagType, 'after_delete')
+def _bump_taxonomy_version(mapper, connection, target):
+    CacheVersion.bump(connection, 'taxonomy')
+
+
+class CacheVersion(db.Model):
+    """Counters that tell every worker when a cached dataset has changed."""
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def bump(cls, connection, name):
+        """Increment the named counter inside the caller's transaction."""
+        table = cls.__table__
+        dialect = connection.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            statement = insert(table).values(name=name, version=1).on_conflict_do_update(
+                index_elements=['name'], set_={'version': table.c.version + 1}
+            )
+            connection.execute(statement)
+            return
+        updated = connection.execute(
+            table.update().where(table.c.name == name).values(version=table.c.version + 1)
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(name=name, version=1))
+
+    @classmethod
+    def current(cls, connection, name):
+        """Return the named counter, or 0 if it has never been bumped."""
+        table = cls.__table__
+        version = connection.execute(
+            db.select(table.c.version).where(table.c.name == name)
+        ).scalar()
+        return version or 0
+
 
 class Category(db.Model):
     __tablename__ = 'categories'
@@ -90,13 +204,15 @@ class Category(db.Model):
 
 recipe_categories = db.Table(
     'recipe_categories',
-    db.Column('recipe_id', db.Integer, db.ForeignKey('recipes.id'), primary_key=True),
-    db.Column('category_id', db.Integer, db.ForeignKey('categories.id'), primary_key=True)
+    db.Column('recipe_id', db.Integer, db.ForeignKey('recipes.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('category_id', db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True)
 )
 
 
 recipe_tags = db.Table(
     'recipe_tags',
-    db.Column('recipe_id', db.Integer, db.ForeignKey('recipes.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+    db.Column('recipe_id', db.Integer, db.ForeignKey('recipes.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key only serves lookups by recipe; this one serves tag -> recipes
+    db.Index('ix_recipe_tags_tag_id', 'tag_id')
 )
@@ -0,0 +1,61 @@
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from models import Recipe
+
+
+def encode_cursor(created_at, recipe_id):
+    """Encode a (created_at, id) position as an opaque URL-safe token."""
+    raw = f'{created_at.isoformat()}|{recipe_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a token from encode_cursor, returning None if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, recipe_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(recipe_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    """One page of rows ordered newest first by (created_at, id)."""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def paginate_recipes(query, cursor=None, per_page=20):
+    """Return a KeysetPage of recipes from query, starting after cursor.
+
+    The query is ordered by (created_at, id) descending and only fetches
+    per_page + 1 rows, so the cost of a page does not depend on how many
+    recipes precede it.
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, recipe_id = position
+        query = query.filter(or_(
+            Recipe.created_at < created_at,
+            and_(Recipe.created_at == created_at, Recipe.id < recipe_id)
+        ))
+
+    rows = query.order_by(Recipe.created_at.desc(), Recipe.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return KeysetPage(rows, next_cursor)
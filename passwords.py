@@ -0,0 +1,80 @@
+"""Password hashing off the request thread, with a bound on waiting work.
+
+Hashes are made and checked by a small thread pool per worker process;
+hashlib's scrypt and PBKDF2 release the GIL, so with threaded gunicorn
+workers other requests keep being served while a login hashes. At most
+PASSWORD_HASH_MAX_PENDING hashes may be running or queued in a process.
+Beyond that the request fails at once with 503 and a Retry-After header
+instead of piling up behind a burst of logins.
+
+Hashes carry their parameters (werkzeug's method$salt$hash format), so
+needs_rehash() can tell when a stored hash was made with older settings
+than PASSWORD_HASH_METHOD; the login view then stores a fresh one.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(ServiceUnavailable):
+    description = 'Too many sign-ins at once. Please try again in a moment.'
+
+
+class PasswordHasher:
+    """Makes and checks password hashes with the configured parameters."""
+
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.salt_length = 16
+        self.workers = 2
+        self.retry_after = 1
+        self._slots = threading.BoundedSemaphore(8)
+        self._prefix = self.method
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = app.config.get('PASSWORD_HASH_SALT_LENGTH', self.salt_length)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.retry_after = app.config.get('PASSWORD_HASH_RETRY_AFTER', self.retry_after)
+        self._slots = threading.BoundedSemaphore(app.config.get('PASSWORD_HASH_MAX_PENDING', 8))
+        # Shorthands like 'pbkdf2' get their defaults filled in; compare against the full form
+        self._prefix = generate_password_hash('', self.method, salt_length=1).split('$', 1)[0]
+
+    def _executor(self):
+        # Threads don't survive a fork, so each worker process makes its own
+        # pool; the lock keeps logins arriving together from making one each
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy(retry_after=self.retry_after)
+        try:
+            if not self.workers:
+                return fn(*args)
+            return self._executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Return a new hash of password made with the current parameters."""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        """Return whether password matches password_hash, whatever parameters made it."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Return whether password_hash was made with other parameters than the current ones."""
+        return password_hash.split('$', 1)[0] != self._prefix
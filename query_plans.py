@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from sqlalchemy import and_, or_, text
+
+from extensions import db
+from models import Recipe, RecipeIngredient, Tag, recipe_tags
+
+
+def main_route_queries():
+    """Return (description, select) pairs for the queries behind the main routes."""
+    newest_first = (Recipe.created_at.desc(), Recipe.id.desc())
+    cursor = datetime(2024, 1, 1)
+    return [
+        ('home feed, first page', db.select(Recipe).order_by(*newest_first).limit(25)),
+        ('home feed, after a cursor', db.select(Recipe).where(or_(
+            Recipe.created_at < cursor,
+            and_(Recipe.created_at == cursor, Recipe.id < 1000)
+        )).order_by(*newest_first).limit(25)),
+        ('recipes of a user', db.select(Recipe).where(Recipe.user_id == 1)),
+        ('ingredients of a recipe', db.select(RecipeIngredient).where(RecipeIngredient.recipe_id == 1)),
+        ('recipes using an ingredient', db.select(RecipeIngredient.recipe_id).where(RecipeIngredient.ingredient_id == 1)),
+        ('recipes with a tag', db.select(recipe_tags.c.recipe_id).where(recipe_tags.c.tag_id == 1)),
+        ('tag by type and name', db.select(Tag).where(Tag.tag_type_id == 1, Tag.name == 'Dinner')),
+    ]
+
+
+def explain(connection, query):
+    """Return the database's plan for query as a list of lines."""
+    sql = str(query.compile(connection, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        return [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+    return [row[0] for row in connection.execute(text(f'EXPLAIN {sql}'))]
+
+
+def uses_index(dialect, plan):
+    """Tell whether a plan reads its tables through indexes rather than full scans."""
+    if dialect == 'sqlite':
+        # "SCAN t USING INDEX ix" walks an index in order; a bare "SCAN t" reads every row
+        return not any(line.startswith('SCAN') and 'INDEX' not in line for line in plan)
+    return not any('Seq Scan' in line for line in plan)
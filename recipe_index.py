@@ -0,0 +1,281 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from ingredients import normalize_name
+from models import CacheVersion, Ingredient, Recipe, RecipeIngredient, recipe_tags
+from search import SearchPage
+
+# Recipe writes can commit a little after their updated_at was stamped, so
+# each incremental update looks this far back past the newest row it saw.
+WATERMARK_OVERLAP = timedelta(minutes=1)
+
+CoverageMatch = namedtuple('CoverageMatch', ['recipe', 'matched', 'total'])
+
+
+def bitmap(ids):
+    """Build an int with bit n set for every n in ids."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for n in ids:
+        bits[n >> 3] |= 1 << (n & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def to_ids(bits):
+    """Return every position set in a bitmap, lowest first."""
+    digits = bin(bits)[:1:-1]
+    return [n for n, digit in enumerate(digits) if digit == '1']
+
+
+def iter_ids(bits):
+    """Yield the positions set in a bitmap, highest first."""
+    while bits:
+        n = bits.bit_length() - 1
+        yield n
+        bits ^= 1 << n
+
+
+def bit_sliced_count(bitmaps):
+    """Add up bitmaps position by position.
+
+    Returns the counter as a list of bitmaps, where bit n of counter[i] is
+    bit i of the number of bitmaps with bit n set, and the union of them.
+    """
+    counter = []
+    union = 0
+    for carry in bitmaps:
+        union |= carry
+        for i in range(len(counter)):
+            if not carry:
+                break
+            counter[i], carry = counter[i] ^ carry, counter[i] & carry
+        if carry:
+            counter.append(carry)
+    return counter, union
+
+
+def coverage_groups(counter, candidates, sizes, max_matched):
+    """Split candidates by (matched, size) and return them best coverage first.
+
+    Each group is (matched / size, matched, size, bitmap); sizes maps a
+    recipe's number of keys to the bitmap of recipes with that many.
+    """
+    groups = []
+    for matched in range(1, max_matched + 1):
+        if matched.bit_length() > len(counter):
+            break
+        exact = candidates
+        for i, bits in enumerate(counter):
+            exact &= bits if matched >> i & 1 else ~bits
+        if not exact:
+            continue
+        for size, members in sizes.items():
+            group = exact & members if size >= matched else 0
+            if group:
+                groups.append((matched / size, matched, size, group))
+    groups.sort(key=lambda group: group[:2], reverse=True)
+    return groups
+
+
+def _page_of_groups(groups, offset, limit):
+    # Whole groups before the offset are skipped by their popcount alone
+    results = []
+    for _, matched, size, group in groups:
+        count = group.bit_count()
+        if offset >= count:
+            offset -= count
+            continue
+        for recipe_id in iter_ids(group):
+            if offset:
+                offset -= 1
+                continue
+            results.append((recipe_id, matched, size))
+            if len(results) == limit:
+                return results
+    return results
+
+
+class RecipeIndex:
+    """In-memory inverted index from a recipe link column to recipe-id bitmaps.
+
+    Each key (an ingredient id, say) maps to a Python int with bit n set
+    when recipe n is linked to it, so set queries are a handful of big-int
+    AND/OR operations instead of a GROUP BY over the link table. The index
+    is built on first use in each worker. Every recipe write bumps the
+    'recipes' counter in cache_versions; when it has moved, recipes whose
+    updated_at is past the last one seen are reloaded and recipes that no
+    longer exist are dropped. The counter is checked at most once every
+    check_interval seconds.
+    """
+
+    def __init__(self, key_column, check_interval=5):
+        self.key_column = key_column
+        self.recipe_column = key_column.table.c.recipe_id
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self.clear()
+
+    def init_app(self, app):
+        self.check_interval = app.config.get('RECIPE_INDEX_CHECK_INTERVAL', 5)
+
+    def clear(self):
+        self._version = None
+        self._checked_at = None
+        self._watermark = None
+        self._keys = {}      # recipe id -> tuple of keys
+        self._bitmaps = {}   # key -> bitmap of recipe ids
+        self._sizes = {}     # number of keys -> bitmap of recipe ids
+
+    def _refresh(self):
+        if self._fresh(time.monotonic()):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._fresh(now):
+                return
+            connection = db.session.connection()
+            # Read the version first so a write racing the load is seen next time
+            version = CacheVersion.current(connection, 'recipes')
+            if self._version is None:
+                self._build(connection)
+            elif version != self._version:
+                self._update(connection)
+            self._version = version
+            self._checked_at = now
+
+    def _fresh(self, now):
+        return self._checked_at is not None and now - self._checked_at < self.check_interval
+
+    def _links(self, connection, recipe_ids=None):
+        query = db.select(self.recipe_column, self.key_column).join(Recipe, Recipe.id == self.recipe_column)
+        if recipe_ids is None:
+            return connection.execute(query)
+        rows = []
+        for start in range(0, len(recipe_ids), 500):
+            rows.extend(connection.execute(query.where(self.recipe_column.in_(recipe_ids[start:start + 500]))))
+        return rows
+
+    def _build(self, connection):
+        recipes = connection.execute(db.select(Recipe.id, Recipe.updated_at)).all()
+        keys = {recipe_id: [] for recipe_id, _ in recipes}
+        for recipe_id, key in self._links(connection):
+            keys[recipe_id].append(key)
+
+        members, sizes = {}, {}
+        for recipe_id, recipe_keys in keys.items():
+            for key in recipe_keys:
+                members.setdefault(key, []).append(recipe_id)
+            sizes.setdefault(len(recipe_keys), []).append(recipe_id)
+        self._keys = {recipe_id: tuple(recipe_keys) for recipe_id, recipe_keys in keys.items()}
+        self._bitmaps = {key: bitmap(ids) for key, ids in members.items()}
+        self._sizes = {size: bitmap(ids) for size, ids in sizes.items()}
+        self._watermark = max((updated_at for _, updated_at in recipes if updated_at), default=None)
+
+    def _update(self, connection):
+        query = db.select(Recipe.id, Recipe.updated_at)
+        if self._watermark is not None:
+            query = query.where(Recipe.updated_at >= self._watermark - WATERMARK_OVERLAP)
+        changed = connection.execute(query).all()
+        self._load(connection, [recipe_id for recipe_id, _ in changed])
+        seen = [updated_at for _, updated_at in changed if updated_at]
+        self._watermark = max(seen + [self._watermark] if self._watermark else seen, default=None)
+
+        # Deleted recipes leave no row to find by updated_at, and bulk loads
+        # may carry old timestamps, so reconcile the ids when the count is off
+        total = connection.execute(db.select(db.func.count()).select_from(Recipe)).scalar()
+        if total != len(self._keys):
+            existing = set(connection.execute(db.select(Recipe.id)).scalars())
+            for recipe_id in self._keys.keys() - existing:
+                self._set(recipe_id, None)
+            self._load(connection, list(existing - self._keys.keys()))
+
+    def _load(self, connection, recipe_ids):
+        keys = {recipe_id: [] for recipe_id in recipe_ids}
+        for recipe_id, key in self._links(connection, recipe_ids):
+            keys[recipe_id].append(key)
+        for recipe_id, recipe_keys in keys.items():
+            self._set(recipe_id, tuple(recipe_keys))
+
+    def _set(self, recipe_id, keys):
+        """Replace the keys of one recipe; None removes it from the index."""
+        bit = 1 << recipe_id
+        old = self._keys.pop(recipe_id, None)
+        if old is not None:
+            for key in old:
+                self._bitmaps[key] &= ~bit
+            self._sizes[len(old)] &= ~bit
+        if keys is not None:
+            for key in keys:
+                self._bitmaps[key] = self._bitmaps.get(key, 0) | bit
+            self._sizes[len(keys)] = self._sizes.get(len(keys), 0) | bit
+            self._keys[recipe_id] = keys
+
+    @property
+    def version(self):
+        """The 'recipes' counter the index was last brought up to date with."""
+        self._refresh()
+        return self._version
+
+    def all_recipes(self):
+        """Return the bitmap of every indexed recipe."""
+        self._refresh()
+        bits = 0
+        for members in list(self._sizes.values()):
+            bits |= members
+        return bits
+
+    def recipes_with(self, key):
+        """Return the bitmap of recipes linked to key."""
+        self._refresh()
+        return self._bitmaps.get(key, 0)
+
+    def coverage(self, keys, offset=0, limit=20):
+        """Rank recipes by the fraction of their own keys found in keys.
+
+        Returns the number of recipes sharing at least one key and a slice
+        of (recipe_id, matched, total) tuples, best coverage first. Ties
+        go to recipes with more matches, then to the newest.
+        """
+        self._refresh()
+        keys = set(keys)
+        with self._lock:
+            counter, candidates = bit_sliced_count(self._bitmaps.get(key, 0) for key in keys)
+            groups = coverage_groups(counter, candidates, self._sizes, len(keys))
+        return candidates.bit_count(), _page_of_groups(groups, offset, limit)
+
+
+ingredient_index = RecipeIndex(RecipeIngredient.__table__.c.ingredient_id)
+tag_index = RecipeIndex(recipe_tags.c.tag_id)
+
+
+def cook_with(names, page=1, per_page=20):
+    """Rank recipes by how much of their ingredient list is among names.
+
+    Returns a SearchPage of CoverageMatch tuples and the sorted list of
+    names that don't match any known ingredient.
+    """
+    wanted = {normalize_name(name).lower() for name in names} - {''}
+    ingredient_ids = dict(db.session.execute(
+        db.select(db.func.lower(Ingredient.name), Ingredient.id).where(db.func.lower(Ingredient.name).in_(wanted))
+    ).all())
+    unknown = sorted(wanted - ingredient_ids.keys())
+    if not ingredient_ids:
+        return SearchPage([], page, per_page, False), unknown
+
+    total, ranked = ingredient_index.coverage(ingredient_ids.values(), (page - 1) * per_page, per_page)
+    loaded = Recipe.query.options(joinedload(Recipe.author)).filter(
+        Recipe.id.in_([recipe_id for recipe_id, _, _ in ranked])
+    ).all()
+    recipes = {recipe.id: recipe for recipe in loaded}
+    items = [
+        CoverageMatch(recipes[recipe_id], matched, size)
+        for recipe_id, matched, size in ranked if recipe_id in recipes
+    ]
+    return SearchPage(items, page, per_page, page * per_page < total), unknown
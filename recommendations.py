@@ -0,0 +1,204 @@
+"""'More like this': recipes that share ingredients and tags.
+
+Each recipe is a row of a sparse matrix with a column per ingredient and
+per tag. An entry is the inverse document frequency of its column, so
+salt counts for little and saffron for a lot, and tags are scaled down
+by TAG_WEIGHT. Rows are L2-normalised, so the product of two rows is
+their cosine similarity. 'flask compute-neighbors' multiplies blocks of
+rows by the transposed matrix, keeps the top K of each row and stores
+them in recipe_neighbors, which the recipe page reads with one primary
+key range lookup.
+
+An incremental run recomputes only the recipes changed since the last
+run, the recipes whose lists mention them, and the recipes they now
+belong in. recipe_neighbor_lists records every list computed, so a
+recipe with no neighbors above MIN_SCORE isn't taken for a new one.
+Document frequencies drift as recipes are added, so a run with --full
+now and then brings every list back in line.
+"""
+import time
+from collections import namedtuple
+from datetime import datetime
+from itertools import chain
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import load_only
+
+from extensions import db
+from models import Recipe, RecipeIngredient, RecipeNeighbor, RecipeNeighborList, recipe_tags
+from recipe_index import WATERMARK_OVERLAP
+
+TAG_WEIGHT = 0.5
+# Similarities at or below this are not worth showing
+MIN_SCORE = 0.05
+BLOCK_SIZE = 256
+DELETE_CHUNK = 500
+
+NeighborStats = namedtuple('NeighborStats', ['recipes', 'recomputed', 'rows', 'full', 'seconds'])
+
+
+def _positions(recipe_ids, ids):
+    """Map recipe ids onto matrix rows; returns (rows, mask of ids that were found)."""
+    positions = np.searchsorted(recipe_ids, ids)
+    positions = np.minimum(positions, max(len(recipe_ids) - 1, 0))
+    found = recipe_ids[positions] == ids if len(recipe_ids) else np.zeros(len(ids), dtype=bool)
+    return positions, found
+
+
+def _pairs(query):
+    rows = db.session.execute(query).all()
+    # fromiter over plain ints; np.array would probe every Row for array attributes
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=2 * len(rows)).reshape(-1, 2)
+
+
+def build_matrix():
+    """Return the sorted recipe ids and the TF-IDF matrix with one row per recipe."""
+    recipe_ids = np.array(db.session.execute(db.select(Recipe.id).order_by(Recipe.id)).scalars().all(), dtype=np.int64)
+    ingredients = _pairs(db.select(RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id).distinct())
+    tags = _pairs(db.select(recipe_tags.c.recipe_id, recipe_tags.c.tag_id))
+
+    ingredient_columns, ingredient_index = np.unique(ingredients[:, 1], return_inverse=True)
+    tag_columns, tag_index = np.unique(tags[:, 1], return_inverse=True)
+    columns = np.concatenate([ingredient_index, tag_index + len(ingredient_columns)])
+    rows, found = _positions(recipe_ids, np.concatenate([ingredients[:, 0], tags[:, 0]]))
+    shape = (len(recipe_ids), len(ingredient_columns) + len(tag_columns))
+    matrix = sparse.csr_matrix((np.ones(found.sum()), (rows[found], columns[found])), shape=shape)
+
+    document_frequency = np.diff(matrix.tocsc().indptr)
+    # An ingredient in every recipe (salt, say) gets no weight at all
+    weights = np.log((1 + shape[0]) / (1 + document_frequency))
+    weights[len(ingredient_columns):] *= TAG_WEIGHT
+    matrix = sparse.csr_matrix(matrix @ sparse.diags(weights))
+    # Zero-weight entries would only make the products denser
+    matrix.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return recipe_ids, sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def _similarities(matrix, rows):
+    # One block of rows against every recipe, as (row, columns, scores)
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        scores = (matrix[block] @ transposed).tocsr()
+        for offset, row in enumerate(block):
+            lo, hi = scores.indptr[offset], scores.indptr[offset + 1]
+            columns, values = scores.indices[lo:hi], scores.data[lo:hi]
+            keep = (columns != row) & (values > MIN_SCORE)
+            yield row, columns[keep], values[keep]
+
+
+def top_neighbors(matrix, rows, k):
+    """Yield (row, neighbor rows, scores) with the k most similar recipes of each row, best first."""
+    for row, columns, values in _similarities(matrix, rows):
+        if len(values) > k:
+            top = np.argpartition(-values, k)[:k]
+            columns, values = columns[top], values[top]
+        # Ties go to the older recipe so reruns give the same order
+        order = np.lexsort((columns, -values))
+        yield row, columns[order], values[order]
+
+
+def _affected_rows(recipe_ids, matrix, changed_ids, k):
+    """Rows whose stored lists may differ because the changed recipes did."""
+    changed_rows, found = _positions(recipe_ids, np.array(changed_ids, dtype=np.int64))
+    changed_rows = changed_rows[found]
+    affected = set(changed_rows.tolist())
+    if not len(changed_ids):
+        return affected
+
+    # Lists that mention a changed recipe may lose it
+    mentioning = []
+    for start in range(0, len(changed_ids), DELETE_CHUNK):
+        chunk = changed_ids[start:start + DELETE_CHUNK]
+        mentioning.extend(db.session.execute(
+            db.select(RecipeNeighbor.recipe_id).where(RecipeNeighbor.neighbor_id.in_(chunk)).distinct()
+        ).scalars())
+    rows, found = _positions(recipe_ids, np.array(mentioning, dtype=np.int64))
+    affected.update(rows[found].tolist())
+
+    # Lists a changed recipe now outscores: above their k-th score, or not yet full
+    threshold = np.zeros(len(recipe_ids))
+    kth = db.session.execute(
+        db.select(RecipeNeighbor.recipe_id, db.func.min(RecipeNeighbor.score))
+        .group_by(RecipeNeighbor.recipe_id).having(db.func.count() >= k)
+    ).all()
+    if kth:
+        ids, scores = zip(*kth)
+        rows, found = _positions(recipe_ids, np.array(ids, dtype=np.int64))
+        threshold[rows[found]] = np.array(scores)[found]
+    for _, columns, values in _similarities(matrix, changed_rows):
+        affected.update(columns[values > threshold[columns]].tolist())
+    return affected
+
+
+def _delete_lists(recipe_ids):
+    for start in range(0, len(recipe_ids), DELETE_CHUNK):
+        chunk = recipe_ids[start:start + DELETE_CHUNK]
+        db.session.execute(db.delete(RecipeNeighbor).where(RecipeNeighbor.recipe_id.in_(chunk)))
+        db.session.execute(db.delete(RecipeNeighborList).where(RecipeNeighborList.recipe_id.in_(chunk)))
+
+
+def compute_neighbors(k=6, full=False):
+    """Refresh recipe_neighbors and return NeighborStats.
+
+    Without full, only the lists that recipes changed since the last run
+    can affect are recomputed; with no earlier run everything is.
+    """
+    started = time.monotonic()
+    computed_at = datetime.utcnow()
+    watermark = db.session.execute(db.select(db.func.max(RecipeNeighborList.computed_at))).scalar()
+    full = full or watermark is None
+    recipe_ids, matrix = build_matrix()
+
+    # Lists of deleted recipes, or pointing at them, are dropped either way
+    existing = db.select(Recipe.id)
+    db.session.execute(db.delete(RecipeNeighbor).where(
+        RecipeNeighbor.recipe_id.not_in(existing) | RecipeNeighbor.neighbor_id.not_in(existing)
+    ))
+    db.session.execute(db.delete(RecipeNeighborList).where(RecipeNeighborList.recipe_id.not_in(existing)))
+    if full:
+        rows = np.arange(len(recipe_ids))
+        db.session.execute(db.delete(RecipeNeighbor))
+        db.session.execute(db.delete(RecipeNeighborList))
+    else:
+        computed = db.select(RecipeNeighborList.recipe_id)
+        # An edit stamped before the last run's matrix read may have committed after it
+        since = watermark - WATERMARK_OVERLAP
+        changed_ids = db.session.execute(
+            db.select(Recipe.id).where((Recipe.updated_at >= since) | Recipe.id.not_in(computed))
+        ).scalars().all()
+        rows = np.array(sorted(_affected_rows(recipe_ids, matrix, changed_ids, k)), dtype=np.int64)
+        _delete_lists(recipe_ids[rows].tolist())
+
+    written = []
+    for row, columns, values in top_neighbors(matrix, rows, k):
+        recipe_id = int(recipe_ids[row])
+        written.extend(
+            {'recipe_id': recipe_id, 'rank': rank, 'neighbor_id': int(recipe_ids[column]),
+             'score': round(float(score), 4), 'computed_at': computed_at}
+            for rank, (column, score) in enumerate(zip(columns, values), start=1)
+        )
+    if written:
+        db.session.execute(db.insert(RecipeNeighbor), written)
+    if len(rows):
+        db.session.execute(db.insert(RecipeNeighborList), [
+            {'recipe_id': int(recipe_id), 'computed_at': computed_at} for recipe_id in recipe_ids[rows]
+        ])
+    db.session.commit()
+    return NeighborStats(len(recipe_ids), len(rows), len(written), full, time.monotonic() - started)
+
+
+def related_recipes(recipe_id, limit=6):
+    """Return [(recipe, computed_at)] for the stored neighbors of a recipe, best first."""
+    return db.session.execute(
+        db.select(Recipe, RecipeNeighbor.computed_at)
+        .options(load_only(Recipe.id, Recipe.title, Recipe.description, Recipe.updated_at))
+        .join(RecipeNeighbor, RecipeNeighbor.neighbor_id == Recipe.id)
+        .where(RecipeNeighbor.recipe_id == recipe_id)
+        .order_by(RecipeNeighbor.rank)
+        .limit(limit)
+    ).all()
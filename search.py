@@ -0,0 +1,216 @@
+import re
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import joinedload, selectinload
+
+from extensions import db
+from models import Recipe, has_column_changes
+
+FTS_TABLE = 'recipes_fts'
+
+# Column weights used for ranking: a hit in the title counts more than one
+# buried in the instructions.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 4.0
+INSTRUCTIONS_WEIGHT = 1.0
+
+SQLITE_CREATE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(title, description, instructions, tokenize='porter unicode61')"
+)
+SQLITE_BACKFILL = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, description, instructions) "
+    "SELECT id, title, coalesce(description, ''), instructions FROM recipes"
+)
+# Only run by create_all, on a new and empty recipes table; existing
+# databases get the column from the d93a6e0f4c18 migration
+POSTGRES_CREATE = [
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(instructions, '')), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_search_vector ON recipes USING GIN (search_vector)",
+]
+
+# Engines (by URL) whose full-text index is known to exist
+_ready = set()
+
+
+class SearchPage:
+    """One page of ranked search results."""
+
+    def __init__(self, items, page, per_page, has_next):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+
+def _engine_key(connection):
+    return str(connection.engine.url)
+
+
+def ensure_index(connection):
+    """Create the SQLite full-text index if it doesn't exist yet.
+
+    A missing FTS5 table is created and backfilled from the recipes table.
+    PostgreSQL's generated tsvector column and its GIN index come from a
+    migration, and other databases fall back to ILIKE and need nothing.
+    """
+    key = _engine_key(connection)
+    if key in _ready:
+        return
+    if connection.dialect.name == 'sqlite':
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first()
+        if not exists:
+            connection.execute(text(SQLITE_CREATE))
+            connection.execute(text(SQLITE_BACKFILL))
+    _ready.add(key)
+
+
+def rebuild_index(connection):
+    """Drop and rebuild the full-text index from the recipes table."""
+    _ready.discard(_engine_key(connection))
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+    ensure_index(connection)
+
+
+def index_recipes(connection, recipe_ids):
+    """Refresh the index entries for the given recipe ids.
+
+    Only needed on SQLite, where the FTS5 table is maintained by hand;
+    PostgreSQL keeps the generated tsvector column up to date itself.
+    """
+    if connection.dialect.name != 'sqlite' or not recipe_ids:
+        return
+    ensure_index(connection)
+    params = [{'id': recipe_id} for recipe_id in recipe_ids]
+    connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), params)
+    connection.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, description, instructions) "
+        "SELECT id, title, coalesce(description, ''), instructions FROM recipes WHERE id = :id"
+    ), params)
+
+
+def unindex_recipes(connection, recipe_ids):
+    """Remove the index entries for the given recipe ids."""
+    if connection.dialect.name != 'sqlite' or not recipe_ids:
+        return
+    ensure_index(connection)
+    connection.execute(
+        text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'),
+        [{'id': recipe_id} for recipe_id in recipe_ids]
+    )
+
+
+def _fts5_query(search_query):
+    # Quote every word so user input can't inject FTS5 syntax, and let the
+    # last word match as a prefix so partially typed words still hit.
+    words = re.findall(r'\w+', search_query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _matching_ids(connection, search_query, limit, offset):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        match = _fts5_query(search_query)
+        if match is None:
+            return []
+        rows = connection.execute(text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+            f"ORDER BY bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}, {INSTRUCTIONS_WEIGHT}) "
+            "LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'limit': -1 if limit is None else limit, 'offset': offset})
+    elif dialect == 'postgresql':
+        rows = connection.execute(text(
+            "SELECT id FROM recipes, websearch_to_tsquery('english', :q) AS query "
+            "WHERE search_vector @@ query "
+            "ORDER BY ts_rank_cd(search_vector, query) DESC, id DESC "
+            "LIMIT :limit OFFSET :offset"
+        ), {'q': search_query, 'limit': limit, 'offset': offset})
+    else:
+        search = f'%{search_query}%'
+        rows = connection.execute(
+            db.select(Recipe.id).where(
+                Recipe.title.ilike(search) |
+                Recipe.description.ilike(search) |
+                Recipe.instructions.ilike(search)
+            ).order_by(Recipe.created_at.desc()).limit(limit).offset(offset)
+        )
+    return [row[0] for row in rows]
+
+
+def matching_ids(search_query, limit=None, offset=0):
+    """Return the ids of up to limit recipes matching search_query, best match first.
+
+    With no limit every match is returned; that is what facet counts need,
+    and only ids are read, but pages of results should use search_recipes.
+    """
+    connection = db.session.connection()
+    ensure_index(connection)
+    return _matching_ids(connection, search_query, limit, offset)
+
+
+def search_recipes(search_query, page=1, per_page=20):
+    """Return a SearchPage of recipes matching search_query, best match first."""
+    page = max(page, 1)
+    connection = db.session.connection()
+    ensure_index(connection)
+    ids = _matching_ids(connection, search_query, per_page + 1, (page - 1) * per_page)
+    has_next = len(ids) > per_page
+    return SearchPage(load_recipes(ids[:per_page]), page, per_page, has_next)
+
+
+def load_recipes(ids):
+    """Load the recipes with the given ids, with their authors and tags, in the order of ids."""
+    if not ids:
+        return []
+    loaded = Recipe.query.options(
+        joinedload(Recipe.author), selectinload(Recipe.tags)
+    ).filter(Recipe.id.in_(ids)).all()
+    by_id = {recipe.id: recipe for recipe in loaded}
+    return [by_id[recipe_id] for recipe_id in ids if recipe_id in by_id]
+
+
+@event.listens_for(Recipe.__table__, 'after_create')
+def _create_index(target, connection, **kw):
+    _ready.discard(_engine_key(connection))
+    if connection.dialect.name == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            connection.execute(text(statement))
+    ensure_index(connection)
+
+
+@event.listens_for(Recipe.__table__, 'before_drop')
+def _drop_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+    _ready.discard(_engine_key(connection))
+
+
+@event.listens_for(Recipe, 'after_insert')
+def _index_recipe(mapper, connection, target):
+    index_recipes(connection, [target.id])
+
+
+@event.listens_for(Recipe, 'after_update')
+def _reindex_recipe(mapper, connection, target):
+    if has_column_changes(target):
+        index_recipes(connection, [target.id])
+
+
+@event.listens_for(Recipe, 'after_delete')
+def _unindex_recipe(mapper, connection, target):
+    unindex_recipes(connection, [target.id])
@@ -0,0 +1,100 @@
+"""Meal plans and the shopping lists they add up to.
+
+A meal plan is kept in the session as {recipe id: servings wanted}. Its
+shopping list is worked out by a single GROUP BY query: each recipe's
+quantities are scaled by wanted / recipe servings, converted to a base
+unit through UNIT_BASES (a CASE lookup, so the conversion happens in the
+database), and summed per ingredient and base unit. Units with no base,
+such as pinch, are summed as they are.
+"""
+from collections import namedtuple
+
+from flask import session
+
+from extensions import db
+from models import Ingredient, Recipe, RecipeIngredient
+
+SESSION_KEY = 'meal_plan'
+
+# Form unit -> (base unit, amount of the base unit in one of it)
+UNIT_BASES = {
+    'cup': ('ml', 236.588),
+    'tbsp': ('ml', 14.787),
+    'tsp': ('ml', 4.929),
+    'ml': ('ml', 1),
+    'oz': ('g', 28.3495),
+    'lb': ('g', 453.592),
+    'g': ('g', 1),
+    'piece': ('piece', 1),
+    'whole': ('piece', 1),
+}
+# Base unit -> larger unit shown once a total reaches 1 of it
+DISPLAY_UNITS = {'ml': ('l', 1000), 'g': ('kg', 1000)}
+
+ShoppingItem = namedtuple('ShoppingItem', ['name', 'quantity', 'unit', 'recipes'])
+
+
+def get_plan():
+    """Return the meal plan in the session as {recipe id: servings}."""
+    return {int(recipe_id): servings for recipe_id, servings in session.get(SESSION_KEY, {}).items()}
+
+
+def set_servings(recipe_id, servings, max_recipes=50):
+    """Plan servings of a recipe, or drop it from the plan when servings is 0.
+
+    Returns False if the plan already holds max_recipes other recipes.
+    """
+    plan = session.get(SESSION_KEY, {})
+    key = str(recipe_id)
+    if servings <= 0:
+        plan.pop(key, None)
+    elif key not in plan and len(plan) >= max_recipes:
+        return False
+    else:
+        plan[key] = servings
+    session[SESSION_KEY] = plan
+    return True
+
+
+def clear_plan():
+    session.pop(SESSION_KEY, None)
+
+
+def shopping_list_query(plan):
+    """The one query behind shopping_list: rows of name, base unit, total and recipe count."""
+    item = RecipeIngredient
+    unit_base = db.case({unit: base for unit, (base, _) in UNIT_BASES.items()}, value=item.unit, else_=item.unit)
+    unit_factor = db.case({unit: factor for unit, (_, factor) in UNIT_BASES.items()}, value=item.unit, else_=1.0)
+    wanted = db.case({recipe_id: float(servings) for recipe_id, servings in plan.items()}, value=Recipe.id)
+    # Recipes without a servings count are taken at face value
+    scale = wanted / db.func.coalesce(db.func.nullif(Recipe.servings, 0), wanted)
+    total = db.func.sum(db.cast(item.quantity, db.Float) * unit_factor * scale)
+    return (
+        db.select(Ingredient.name, unit_base.label('unit'), total.label('total'),
+                  db.func.count(db.distinct(item.recipe_id)).label('recipes'))
+        .select_from(item)
+        .join(Recipe, Recipe.id == item.recipe_id)
+        .join(Ingredient, Ingredient.id == item.ingredient_id)
+        .where(item.recipe_id.in_(list(plan)))
+        .group_by(Ingredient.name, unit_base)
+        .order_by(Ingredient.name, unit_base)
+    )
+
+
+def _display(total, unit):
+    if unit in DISPLAY_UNITS:
+        larger, size = DISPLAY_UNITS[unit]
+        if total >= size:
+            return total / size, larger
+    return total, unit
+
+
+def shopping_list(plan):
+    """Return the ShoppingItems needed to cook every recipe in plan at its planned servings."""
+    if not plan:
+        return []
+    items = []
+    for name, unit, total, recipes in db.session.execute(shopping_list_query(plan)):
+        quantity, unit = _display(total, unit)
+        items.append(ShoppingItem(name, round(quantity, 2), unit, recipes))
+    return items
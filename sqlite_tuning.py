@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# journal_mode has to be set before the other pragmas take effect on a new file
+PRAGMA_ORDER = ['journal_mode']
+# Not tuning: SQLite ignores foreign keys, ON DELETE CASCADE included, unless asked per connection
+REQUIRED_PRAGMAS = {'foreign_keys': 'ON'}
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Run the configured PRAGMA statements on a raw SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name in sorted(pragmas, key=lambda name: name not in PRAGMA_ORDER):
+            cursor.execute(f'PRAGMA {name}={pragmas[name]}')
+    finally:
+        cursor.close()
+
+
+def run_maintenance(engine):
+    """Refresh query planner statistics and checkpoint the WAL into the database."""
+    with engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA optimize')
+        busy, log_frames, checkpointed = connection.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)').one()
+    logger.info(f'SQLite maintenance: checkpointed {checkpointed}/{log_frames} WAL frames')
+
+
+class SQLiteTuning:
+    """Applies the SQLITE_PRAGMAS profile to every new SQLite connection.
+
+    Also runs PRAGMA optimize and a passive WAL checkpoint from a request
+    teardown at most once every SQLITE_MAINTENANCE_INTERVAL seconds per
+    worker. With SQLITE_TUNING off only REQUIRED_PRAGMAS are applied.
+    Does nothing for other databases.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._last_maintenance = time.monotonic()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            return
+
+        tuning = app.config.get('SQLITE_TUNING', True)
+        pragmas = dict(REQUIRED_PRAGMAS, **(app.config.get('SQLITE_PRAGMAS', {}) if tuning else {}))
+        event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, pragmas))
+        if not tuning:
+            return
+
+        interval = app.config.get('SQLITE_MAINTENANCE_INTERVAL', 3600)
+        if interval:
+            @app.teardown_appcontext
+            def maintain(exception):
+                self.maybe_run_maintenance(engine, interval)
+
+    def maybe_run_maintenance(self, engine, interval):
+        if time.monotonic() - self._last_maintenance < interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_maintenance = time.monotonic()
+            run_maintenance(engine)
+        except Exception as e:
+            logger.warning(f'SQLite maintenance failed: {e}')
+        finally:
+            self._lock.release()
+
+
+sqlite_tuning = SQLiteTuning()
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import namedtuple
+
+from extensions import db
+from models import CacheVersion, Tag, TagType, recipe_tags
+
+TagInfo = namedtuple('TagInfo', ['id', 'name', 'type_name'])
+
+
+class Taxonomy:
+    """All tag types and tags, loaded once per worker and shared by forms and templates.
+
+    Tags only change when 'flask init-tags' (or another tag write) runs,
+    and every such write bumps the 'taxonomy' counter in cache_versions.
+    The counter is checked at most once every check_interval seconds and
+    the tags are reloaded when it has moved.
+    """
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self.clear()
+
+    def init_app(self, app):
+        self.check_interval = app.config.get('TAXONOMY_CHECK_INTERVAL', 5)
+        app.context_processor(lambda: {'taxonomy': self})
+
+    def clear(self):
+        self._version = None
+        self._checked_at = None
+        self._by_type = {}
+        self._by_id = {}
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            connection = db.session.connection()
+            version = CacheVersion.current(connection, 'taxonomy')
+            if version != self._version:
+                rows = connection.execute(
+                    db.select(Tag.id, Tag.name, TagType.name).join(TagType).order_by(Tag.id)
+                ).all()
+                by_type = {}
+                for tag_id, name, type_name in rows:
+                    by_type.setdefault(type_name, []).append(TagInfo(tag_id, name, type_name))
+                self._by_type = by_type
+                self._by_id = {tag.id: tag for tags in by_type.values() for tag in tags}
+                self._version = version
+            self._checked_at = now
+
+    def type_names(self):
+        self._refresh()
+        return list(self._by_type)
+
+    def tags(self, type_name):
+        """Return the TagInfo tuples of one tag type, in creation order."""
+        self._refresh()
+        return self._by_type.get(type_name, [])
+
+    def choices(self, type_name):
+        """Return (id, name) pairs for a select field."""
+        return [(tag.id, tag.name) for tag in self.tags(type_name)]
+
+    def get(self, tag_id):
+        self._refresh()
+        return self._by_id.get(tag_id)
+
+
+taxonomy = Taxonomy()
+
+
+def update_recipe_tags(recipe_id, tag_ids, type_names=('meal', 'diet')):
+    """Make a recipe's tags of type_names exactly tag_ids, writing only the difference.
+
+    Tags of other types are left alone. Returns True if anything was
+    written. Nothing is committed.
+    """
+    editable = {tag.id for type_name in type_names for tag in taxonomy.tags(type_name)}
+    tag_ids = set(tag_ids) & editable
+    stored = set(db.session.execute(
+        db.select(recipe_tags.c.tag_id).where(recipe_tags.c.recipe_id == recipe_id)
+    ).scalars()) & editable
+    removed, added = stored - tag_ids, tag_ids - stored
+    if removed:
+        db.session.execute(recipe_tags.delete().where(
+            (recipe_tags.c.recipe_id == recipe_id) & recipe_tags.c.tag_id.in_(removed)
+        ))
+    if added:
+        db.session.execute(recipe_tags.insert(), [{'recipe_id': recipe_id, 'tag_id': tag_id} for tag_id in sorted(added)])
+    return bool(removed or added)
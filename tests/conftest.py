@@ -1,7 +1,14 @@
 import os
 import tempfile
 import pytest
-from app import app, db
+from app import app, db, create_default_tags
+from extensions import fragment_cache, user_cache
+from ingredients import resolve_ingredient_ids
+from models import User, Recipe, RecipeIngredient, Tag
+from taxonomy import taxonomy
+from recipe_index import ingredient_index, tag_index
+from autocomplete import ingredient_autocomplete
+from images import recipe_images
 
 @pytest.fixture(scope='session')
 def test_app():
@@ -28,11 +35,81 @@ def test_app():
     ctx.pop()
 
 @pytest.fixture
-def client(test_app):
-    """Create a test client."""
-    return test_app.test_client()
+def client():
+    """Create a test client, with tables created for the test and dropped after it."""
+    app.config.update({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SECRET_KEY': 'test-key'
+    })
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+@pytest.fixture
+def default_tags(client):
+    """Create the meal and diet tags."""
+    create_default_tags()
+
+@pytest.fixture
+def add_user(client):
+    """Return a function that creates a user named name, with the password password123."""
+    def add_user(name='cook'):
+        user = User(username=name, email=f'{name}@test.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return add_user
+
+@pytest.fixture
+def user(add_user):
+    """A user who logs in as cook@test.com with password123."""
+    return add_user('cook')
+
+@pytest.fixture
+def add_recipe(client):
+    """Return a function that creates a recipe with its ingredient rows and tags.
+
+    ingredients holds names, which get 1 cup each, or (quantity, unit, name)
+    tuples; tags holds tag names. Other keyword arguments set recipe columns.
+    """
+    def add_recipe(user, title, ingredients=(), tags=(), **columns):
+        columns = {'description': '', 'instructions': 'Cook it', 'prep_time_minutes': 5,
+                   'cook_time_minutes': 5, 'servings': 2, **columns}
+        recipe = Recipe(title=title, user_id=user.id, **columns)
+        if tags:
+            recipe.tags = Tag.query.filter(Tag.name.in_(tags)).all()
+        db.session.add(recipe)
+        db.session.flush()
+        items = [(1, 'cup', item) if isinstance(item, str) else item for item in ingredients]
+        if items:
+            ids = resolve_ingredient_ids([name for _, _, name in items])
+            db.session.execute(db.insert(RecipeIngredient), [
+                {'recipe_id': recipe.id, 'ingredient_id': ids[name], 'quantity': quantity, 'unit': unit}
+                for quantity, unit, name in items
+            ])
+        db.session.commit()
+        return recipe
+    return add_recipe
 
 @pytest.fixture
 def runner(test_app):
     """Create a test CLI runner."""
     return test_app.test_cli_runner()
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Start every test with empty process-wide caches."""
+    fragment_cache.clear()
+    user_cache.clear()
+    taxonomy.clear()
+    ingredient_index.clear()
+    tag_index.clear()
+    ingredient_autocomplete.clear()
+    recipe_images.clear()
+    yield
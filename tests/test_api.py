@@ -0,0 +1,76 @@
+import gzip
+import pytest
+from sqlalchemy import event
+from app import db
+
+@pytest.fixture
+def recipes(default_tags, user, add_recipe):
+    return [add_recipe(user, f'Stew {i}', [(1, 'lb', 'beef'), (1, 'lb', 'carrots')], ['Dinner'],
+                       description='Hearty ' * 40, instructions='Simmer', cook_time_minutes=60, servings=4)
+            for i in range(5)]
+
+def count_queries(fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        return fn(), statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+def test_list_is_cursor_paginated(client, recipes):
+    """Test that following next_cursor walks every recipe once"""
+    titles, url = [], '/api/v1/recipes?limit=2&fields=title'
+    while url:
+        body = client.get(url).get_json()
+        titles.extend(item['title'] for item in body['data'])
+        url = body['next']
+    assert titles == [f'Stew {i}' for i in reversed(range(5))]
+    assert client.get('/api/v1/recipes?cursor=garbage').status_code == 400
+
+def test_sparse_fields_load_only_those_columns(client, recipes):
+    """Test that fields limits both the payload and the selected columns"""
+    db.session.expire_all()
+    response, statements = count_queries(lambda: client.get('/api/v1/recipes?fields=title,servings'))
+    item = response.get_json()['data'][0]
+    assert set(item) == {'id', 'title', 'servings'}
+    assert 'instructions' not in statements[-1] and 'description' not in statements[-1]
+    assert client.get('/api/v1/recipes?fields=password_hash').status_code == 400
+
+def test_include_is_batch_loaded(client, recipes):
+    """Test that included relations cost one query each for the whole page"""
+    db.session.expire_all()
+    client.get('/api/v1/tags')
+    response, statements = count_queries(lambda: client.get('/api/v1/recipes?include=ingredients,tags'))
+    data = response.get_json()['data']
+    assert len(data) == 5
+    assert data[0]['tags'] == [{'id': data[0]['tags'][0]['id'], 'name': 'Dinner', 'type': 'meal'}]
+    assert sorted(item['name'] for item in data[0]['ingredients']) == ['beef', 'carrots']
+    recipe_selects = [s for s in statements if s.lstrip().startswith('SELECT')]
+    assert len(recipe_selects) == 3
+
+def test_detail_and_search(client, recipes):
+    """Test the detail and search endpoints"""
+    body = client.get(f'/api/v1/recipes/{recipes[0].id}?fields=title,author').get_json()
+    assert body['data'] == {'id': recipes[0].id, 'title': 'Stew 0', 'author': 'cook'}
+    assert client.get('/api/v1/recipes/999').status_code == 404
+
+    first = client.get('/api/v1/search?q=stew&limit=3&fields=title').get_json()
+    second = client.get(first['next']).get_json()
+    assert len(first['data']) == 3 and len(second['data']) == 2
+    assert second['next_cursor'] is None
+
+def test_etag_and_compression(client, recipes):
+    """Test conditional requests and gzip encoding"""
+    response = client.get('/api/v1/recipes', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'Stew' in gzip.decompress(response.data)
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    again = client.get('/api/v1/recipes', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+    recipes[0].title = 'Chili'
+    db.session.commit()
+    changed = client.get('/api/v1/recipes', headers={'If-None-Match': response.headers['ETag']})
+    assert changed.status_code == 200
@@ -0,0 +1,60 @@
+import gzip
+import json
+import pytest
+from app import app
+from assets import assets, build, fingerprint
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / 'img').mkdir()
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'img' / 'icon.png').write_bytes(b'\x89PNG fake image')
+    (tmp_path / 'img' / 'site.webmanifest').write_text(json.dumps({'icons': [{'src': '/static/img/icon.png'}]}))
+    (tmp_path / 'css' / 'style.css').write_text('body { color: #333; }\n' * 50)
+    return tmp_path
+
+@pytest.fixture
+def built(static_dir):
+    manifest = build(str(static_dir))
+    saved = assets.dist, assets.manifest
+    assets.dist, assets.manifest = str(static_dir / 'dist'), manifest
+    yield manifest
+    assets.dist, assets.manifest = saved
+
+def test_build_fingerprints_and_rewrites(static_dir):
+    """Test that names carry a content hash and references are rewritten"""
+    manifest = build(str(static_dir))
+    assert manifest['css/style.css'] == fingerprint('css/style.css', (static_dir / 'css' / 'style.css').read_bytes())
+    webmanifest = (static_dir / 'dist' / manifest['img/site.webmanifest']).read_text()
+    assert f'/static/dist/{manifest["img/icon.png"]}' in webmanifest
+    assert (static_dir / 'dist' / (manifest['css/style.css'] + '.gz')).exists()
+    assert not (static_dir / 'dist' / (manifest['img/icon.png'] + '.gz')).exists()
+    assert json.loads((static_dir / 'dist' / 'manifest.json').read_text()) == manifest
+    # Rebuilding unchanged files gives the same names
+    assert build(str(static_dir)) == manifest
+
+def test_url_for_uses_manifest(built):
+    """Test that templates get the fingerprinted URL"""
+    with app.test_request_context():
+        url = app.jinja_env.globals['url_for']('static', filename='css/style.css')
+        assert url == f'/static/dist/{built["css/style.css"]}'
+        assert app.jinja_env.globals['url_for']('static', filename='missing.js') == '/static/missing.js'
+
+def test_serves_immutable_precompressed_variant(built):
+    """Test that fingerprinted files are cached for a year and sent gzipped when accepted"""
+    client = app.test_client()
+    url = f'/static/dist/{built["css/style.css"]}'
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert gzip.decompress(response.data).startswith(b'body')
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data.startswith(b'body')
+    plain.close()
+    response.close()
+    assert client.get('/static/dist/manifest.json').status_code == 404
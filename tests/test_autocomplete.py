@@ -0,0 +1,94 @@
+import random
+import pytest
+from app import db
+from models import Recipe
+from autocomplete import PrefixIndex, ingredient_autocomplete
+
+@pytest.fixture
+def autocomplete(client, monkeypatch):
+    monkeypatch.setattr(ingredient_autocomplete, 'check_interval', 0)
+    yield ingredient_autocomplete
+    ingredient_autocomplete.wait()
+
+def names(suggestions):
+    return [suggestion.name for suggestion in suggestions]
+
+def test_matches_the_start_of_any_word():
+    """Test that a prefix finds names where any word starts with it"""
+    index = PrefixIndex({1: 'black pepper', 2: 'pepperoni', 3: 'green peas', 4: 'salt'}, {})
+    assert names(index.suggest('pep')) == ['black pepper', 'pepperoni']
+    assert names(index.suggest('  PE ')) == ['black pepper', 'green peas', 'pepperoni']
+    assert index.suggest('epper') == []
+    assert index.suggest('') == []
+
+def test_most_used_first():
+    """Test that more used ingredients come first and ties are alphabetical"""
+    index = PrefixIndex({1: 'basil', 2: 'bay leaf', 3: 'butter', 4: 'bacon'}, {3: 9, 2: 4, 4: 4})
+    assert names(index.suggest('b')) == ['butter', 'bacon', 'bay leaf', 'basil']
+    assert names(index.suggest('b', limit=2)) == ['butter', 'bacon']
+    assert index.suggest('but')[0].recipes == 9
+
+def test_wide_prefixes_match_a_full_scan():
+    """Test that the block tree ranks wide prefixes exactly like ranking every match"""
+    rng = random.Random(7)
+    words = ['salt', 'sage', 'saffron', 'sesame', 'soy', 'stock', 'sugar', 'sumac', 'spinach', 'squash']
+    all_names = {i: f'{rng.choice(words)} {rng.choice(words)} {i}' for i in range(1, 3001)}
+    usage = {i: rng.randrange(50) for i in all_names}
+    index = PrefixIndex(all_names, usage)
+    for prefix in ['s', 'sa', 'sal', 'salt s', 'su', 'spinach 1', '2']:
+        matching = [i for i, name in all_names.items()
+                    if any(word.startswith(prefix) for word in [' '.join(name.split()[k:]) for k in range(3)])]
+        expected = sorted(matching, key=lambda i: (-usage[i], all_names[i]))[:10]
+        assert [suggestion.id for suggestion in index.suggest(prefix)] == expected
+
+def test_incremental_updates_match_a_rebuild():
+    """Test that names and usage patched in, with blocks splitting, rank like a fresh index"""
+    rng = random.Random(11)
+    words = ['salt', 'sage', 'saffron', 'sesame', 'soy', 'stock', 'sugar', 'sumac']
+    all_names = {i: f'{rng.choice(words)} {rng.choice(words)} {i}' for i in range(1, 2001)}
+    usage = {i: rng.randrange(30) for i in all_names}
+    index = PrefixIndex({i: all_names[i] for i in range(1, 1001)}, usage)
+    for start in range(1001, 2001, 250):
+        index = index.with_names({i: all_names[i] for i in range(start, start + 250)})
+    changes = {i: rng.randrange(100) for i in rng.sample(sorted(all_names), 300)}
+    index = index.with_usage(changes)
+    expected = PrefixIndex(all_names, {**usage, **changes})
+    for prefix in ['s', 'sa', 'salt', 'sugar s', 'soy 1', '19']:
+        assert index.suggest(prefix, 20) == expected.suggest(prefix, 20)
+
+def test_with_names_adds_to_a_copy():
+    """Test that new names are searchable in the copy only"""
+    index = PrefixIndex({1: 'cumin'}, {})
+    bigger = index.with_names({2: 'cucumber', 3: 'sour cream'})
+    assert names(bigger.suggest('c')) == ['cucumber', 'cumin', 'sour cream']
+    assert names(index.suggest('c')) == ['cumin']
+
+def test_picks_up_new_ingredients_and_usage(user, add_recipe, autocomplete):
+    """Test that new names and recipe counts reach the index after the check interval"""
+    add_recipe(user, 'Toast', ['butter', 'bread'])
+    assert names(ingredient_autocomplete.suggest('b')) == ['bread', 'butter']
+
+    add_recipe(user, 'Buttered Basil', ['butter', 'basil'])
+    # The new name is in at once; the counts are read in the background
+    assert 'basil' in names(ingredient_autocomplete.suggest('b'))
+    ingredient_autocomplete.wait()
+    suggestions = ingredient_autocomplete.suggest('b')
+    assert names(suggestions) == ['butter', 'basil', 'bread']
+    assert suggestions[0].recipes == 2
+
+    db.session.delete(Recipe.query.filter_by(title='Toast').one())
+    db.session.commit()
+    ingredient_autocomplete.suggest('b')
+    ingredient_autocomplete.wait()
+    assert [suggestion.recipes for suggestion in ingredient_autocomplete.suggest('b')] == [1, 1, 0]
+
+def test_api_endpoint(client, user, add_recipe, autocomplete):
+    """Test the JSON shape, the limit and caching of the ingredients endpoint"""
+    add_recipe(user, 'Toast', ['butter', 'bread', 'brown sugar'])
+    response = client.get('/api/v1/ingredients?q=br&limit=1')
+    assert response.status_code == 200
+    [suggestion] = response.get_json()['data']
+    assert suggestion['name'] == 'bread' and suggestion['recipes'] == 1
+    assert response.cache_control.public
+    assert client.get('/api/v1/ingredients?q=').get_json() == {'data': []}
+    assert len(client.get('/api/v1/ingredients?q=b&limit=500').get_json()['data']) == 3
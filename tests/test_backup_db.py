@@ -0,0 +1,67 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+import backup_db
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / 'recipe_app.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE recipes (id INTEGER PRIMARY KEY, title TEXT)')
+    conn.execute("INSERT INTO recipes (title) VALUES ('Apple Pie')")
+    conn.commit()
+    conn.close()
+    return path
+
+def add_recipe(path, title):
+    conn = sqlite3.connect(path)
+    conn.execute('INSERT INTO recipes (title) VALUES (?)', (title,))
+    conn.commit()
+    conn.close()
+
+def test_backup_skips_unchanged_database(database, tmp_path):
+    """Test that a second backup of the same data is deduplicated"""
+    backup_dir = str(tmp_path / 'backups')
+    first = backup_db.backup_database(database, backup_dir, 'gzip')
+    assert first.endswith('.db.gz')
+    assert backup_db.backup_database(database, backup_dir, 'gzip') is None
+    assert len(backup_db.load_manifest(backup_dir)) == 1
+
+def test_verify_and_restore(database, tmp_path):
+    """Test that a backup verifies and restores the data it captured"""
+    backup_dir = str(tmp_path / 'backups')
+    name = os.path.basename(backup_db.backup_database(database, backup_dir, 'gzip'))
+    add_recipe(database, 'Banana Bread')
+    assert backup_db.verify_backup(backup_dir, name)
+    backup_db.restore_backup(backup_dir, name, database)
+    conn = sqlite3.connect(database)
+    assert conn.execute('SELECT title FROM recipes').fetchall() == [('Apple Pie',)]
+    conn.close()
+
+def test_verify_detects_corruption(database, tmp_path):
+    """Test that a damaged backup fails verification"""
+    backup_dir = str(tmp_path / 'backups')
+    path = backup_db.backup_database(database, backup_dir, 'gzip')
+    entries = backup_db.load_manifest(backup_dir)
+    entries[0]['sha256'] = '0' * 64
+    backup_db.save_manifest(backup_dir, entries)
+    assert not backup_db.verify_backup(backup_dir, os.path.basename(path))
+
+def test_prune_by_count_and_age(tmp_path):
+    """Test retention by count and age, always keeping the newest backup"""
+    backup_dir = str(tmp_path)
+    now = datetime.now()
+    entries = []
+    for days in (100, 10, 5, 1):
+        name = f'recipe_app_{days}.db.gz'
+        (tmp_path / name).write_bytes(b'x')
+        entries.append({'file': name, 'sha256': name, 'size': 1, 'compressed_size': 1,
+                        'created': (now - timedelta(days=days)).isoformat()})
+    backup_db.save_manifest(backup_dir, entries)
+    removed = backup_db.prune_backups(backup_dir, keep=3, max_age_days=30)
+    assert sorted(removed) == ['recipe_app_100.db.gz']
+    removed = backup_db.prune_backups(backup_dir, keep=1, max_age_days=None)
+    assert [e['file'] for e in backup_db.load_manifest(backup_dir)] == ['recipe_app_1.db.gz']
+    assert not (tmp_path / 'recipe_app_10.db.gz').exists()
@@ -0,0 +1,27 @@
+from models import Recipe, RecipeIngredient, User
+from benchmarks.load import percentile
+from benchmarks.seed import generate
+import search
+
+def test_generate_seeds_a_searchable_dataset(client):
+    """Test that the generator writes every table and indexes the recipes"""
+    counts = generate(users=3, recipes=40, ingredients=120, seed=7)
+    assert counts['recipes'] == Recipe.query.count() == 40
+    assert User.query.count() == 3
+    assert RecipeIngredient.query.count() == counts['recipe_ingredients'] > 0
+    title = Recipe.query.first().title.split()[-1]
+    assert search.search_recipes(title).items
+
+def test_generate_on_a_seeded_database(client):
+    """Test that a second run reuses the existing ingredients instead of failing"""
+    generate(users=2, recipes=20, ingredients=120, seed=7)
+    counts = generate(users=2, recipes=20, ingredients=120, seed=8)
+    assert counts['recipes'] == 20 and Recipe.query.count() == 40
+    assert counts['recipe_ingredients'] > 0
+
+def test_percentile():
+    """Test the nearest-rank percentile used in reports"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
@@ -0,0 +1,140 @@
+from sqlalchemy import event
+from app import app, db, load_user
+from extensions import fragment_cache, user_cache
+from models import CacheVersion, User
+from cache import FragmentCache, MemoryBackend, SQLiteBackend, recipe_fragment_key
+import accounts
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_memory_backend_evicts_least_recently_used():
+    """Test that the oldest unused entry is evicted first"""
+    backend = MemoryBackend(max_entries=2, ttl=60)
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get('a')
+    backend.set('c', 3)
+    assert backend.get('a') == 1
+    assert backend.get('b') is None
+    assert backend.get('c') == 3
+
+def test_memory_backend_expires_entries():
+    """Test that entries disappear after their TTL"""
+    clock = FakeClock()
+    backend = MemoryBackend(max_entries=10, ttl=60, clock=clock)
+    backend.set('a', 1)
+    clock.now += 59
+    assert backend.get('a') == 1
+    clock.now += 2
+    assert backend.get('a') is None
+
+def test_sqlite_backend_is_shared(tmp_path):
+    """Test that two backends on the same file see each other's entries"""
+    path = str(tmp_path / 'cache.db')
+    first = SQLiteBackend(path, max_entries=2, ttl=60)
+    second = SQLiteBackend(path, max_entries=2, ttl=60)
+    first.set('a', ('v1', '<p>a</p>'))
+    assert second.get('a') == ('v1', '<p>a</p>')
+    second.delete('a')
+    assert first.get('a') is None
+
+def test_sqlite_backend_evicts_and_expires(tmp_path):
+    """Test LRU eviction and TTL expiry in the SQLite backend"""
+    clock = FakeClock()
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'), max_entries=2, ttl=60, clock=clock)
+    backend.set('a', 1)
+    clock.now += 1
+    backend.set('b', 2)
+    clock.now += 1
+    backend.set('c', 3)
+    assert backend.get('a') is None
+    assert len(backend) == 2
+    clock.now += 60
+    assert backend.get('c') is None
+
+def test_fragment_cache_checks_version():
+    """Test that a fragment stored for one version isn't served for another"""
+    cache = FragmentCache()
+    cache.backend = MemoryBackend()
+    cache.set('recipe:1', 'v1', '<p>old</p>')
+    assert cache.get('recipe:1', 'v1') == '<p>old</p>'
+    assert cache.get('recipe:1', 'v2') is None
+
+def test_recipe_page_is_cached_and_invalidated(client, user, add_recipe):
+    """Test that the recipe fragment is reused and dropped on edit"""
+    recipe = add_recipe(user, 'Pancakes', description='Fluffy', instructions='Flip', cook_time_minutes=10, servings=4)
+    key = recipe_fragment_key(recipe.id)
+
+    assert b'Pancakes' in client.get(f'/recipe/{recipe.id}').data
+    assert fragment_cache.backend.get(key) is not None
+    hits = fragment_cache.hits
+    assert b'Pancakes' in client.get(f'/recipe/{recipe.id}').data
+    assert fragment_cache.hits == hits + 1
+
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    client.post(f'/recipe/{recipe.id}/edit', data={
+        'title': 'Waffles', 'description': 'Crisp', 'prep_time_minutes': 5,
+        'cook_time_minutes': 10, 'servings': 4, 'instructions': 'Press',
+        'ingredients-0-ingredient_quantity': '1', 'ingredients-0-ingredient_unit': 'cup',
+        'ingredients-0-ingredient_name': 'flour'
+    })
+    assert fragment_cache.backend.get(key) is None
+    assert b'Waffles' in client.get(f'/recipe/{recipe.id}').data
+
+def test_user_loader_uses_cache(user):
+    """Test that repeated loads are served from the cache without a query"""
+    user_id = user.id
+    db.session.expunge_all()
+    assert load_user(str(user_id)).username == 'cook'
+    db.session.expunge_all()
+    before = user_cache.stats()
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        user = load_user(str(user_id))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert user.username == 'cook'
+    assert user in db.session
+    assert statements == []
+    assert user_cache.stats()['hits'] == before['hits'] + 1
+    assert user_cache.stats()['misses'] == before['misses']
+
+def test_user_cache_invalidated_on_update(user):
+    """Test that changing the user drops the cached copy"""
+    load_user(str(user.id))
+    user.username = 'chef'
+    db.session.commit()
+    assert user_cache.backend.get(user.id) is None
+    db.session.expunge_all()
+    assert load_user(str(user.id)).username == 'chef'
+
+def test_user_cache_sees_changes_from_other_workers(user):
+    """Test that a bumped 'users' version drops users cached before another worker's change"""
+    user_id = user.id
+    db.session.expunge_all()
+    load_user(str(user_id))
+    # What another worker's commit leaves behind: a changed row and a new version
+    db.session.execute(db.update(User).where(User.id == user_id).values(username='chef'))
+    CacheVersion.bump(db.session.connection(), 'users')
+    db.session.commit()
+    db.session.expunge_all()
+    user_cache.check_interval = 0
+    try:
+        assert load_user(str(user_id)).username == 'chef'
+    finally:
+        user_cache.check_interval = app.config['USER_CACHE_CHECK_INTERVAL']
+
+def test_deleted_user_bumps_users_version(user):
+    """Test that deleting an account moves the 'users' version"""
+    user_id = user.id
+    before = CacheVersion.current(db.session.connection(), 'users')
+    accounts.delete_account(user_id)
+    assert CacheVersion.current(db.session.connection(), 'users') == before + 1
+    assert load_user(str(user_id)) is None
@@ -0,0 +1,92 @@
+from sqlalchemy import event
+from app import db
+from models import User, Recipe, RecipeIngredient, RecipeNeighbor, recipe_tags
+import accounts
+import search
+
+INGREDIENTS, TAGS = ['flour', 'eggs'], ['Dinner', 'Vegan']
+
+def link_neighbors(first, second):
+    db.session.execute(db.insert(RecipeNeighbor), [
+        {'recipe_id': first.id, 'rank': 1, 'neighbor_id': second.id, 'score': 0.5, 'computed_at': first.created_at},
+        {'recipe_id': second.id, 'rank': 1, 'neighbor_id': first.id, 'score': 0.5, 'computed_at': first.created_at},
+    ])
+    db.session.commit()
+
+def count(table, column, value):
+    return db.session.execute(db.select(db.func.count()).select_from(table).where(column == value)).scalar()
+
+def children(recipe_id):
+    return (count(RecipeIngredient.__table__, RecipeIngredient.recipe_id, recipe_id),
+            count(recipe_tags, recipe_tags.c.recipe_id, recipe_id),
+            count(RecipeNeighbor.__table__, RecipeNeighbor.recipe_id, recipe_id),
+            count(RecipeNeighbor.__table__, RecipeNeighbor.neighbor_id, recipe_id))
+
+def capture_statements(action):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = action()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, statements
+
+def test_database_cascades_recipe_delete(default_tags, add_user, add_recipe):
+    """Test that deleting a recipe row outside the ORM removes its dependent rows"""
+    user = add_user('cook')
+    first, second = add_recipe(user, 'Pancakes', INGREDIENTS, TAGS), add_recipe(user, 'Crepes', INGREDIENTS, TAGS)
+    link_neighbors(first, second)
+    first_id, second_id = first.id, second.id
+    assert children(first_id) == (2, 2, 1, 1)
+    db.session.execute(db.text('DELETE FROM recipes WHERE id = :id'), {'id': first_id})
+    db.session.commit()
+    assert children(first_id) == (0, 0, 0, 0)
+    assert count(RecipeNeighbor.__table__, RecipeNeighbor.recipe_id, second_id) == 0
+
+def test_delete_recipe_route_doesnt_load_children(client, default_tags, add_user, add_recipe):
+    """Test that the recipe delete leaves its dependent rows to the database"""
+    user = add_user('cook')
+    first, second = add_recipe(user, 'Pancakes', INGREDIENTS, TAGS), add_recipe(user, 'Crepes', INGREDIENTS, TAGS)
+    link_neighbors(first, second)
+    first_id, second_id = first.id, second.id
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    response, statements = capture_statements(lambda: client.post(f'/recipe/{first_id}/delete'))
+    assert response.status_code == 302
+    assert not any('FROM recipe_ingredients' in statement or 'FROM recipe_tags' in statement
+                   for statement in statements if statement.startswith('SELECT'))
+    assert children(first_id) == (0, 0, 0, 0)
+    assert db.session.get(Recipe, second_id) is not None
+
+def test_delete_account_is_set_based(default_tags, add_user, add_recipe):
+    """Test that an account's recipes go in a fixed number of statements, whatever their count"""
+    cook, other = add_user('cook'), add_user('other')
+    recipes = [add_recipe(cook, f'Soup {i}', INGREDIENTS, TAGS) for i in range(25)]
+    kept = add_recipe(other, 'Stew', ['flour', 'beef'], TAGS)
+    link_neighbors(recipes[0], kept)
+    cook_id, recipe_ids = cook.id, [recipe.id for recipe in recipes]
+
+    deleted, statements = capture_statements(lambda: accounts.delete_account(cook_id))
+    assert deleted == 25
+    assert len([statement for statement in statements if statement.startswith('DELETE')]) <= 8
+    assert db.session.get(User, cook_id) is None
+    assert Recipe.query.filter(Recipe.id.in_(recipe_ids)).count() == 0
+    assert RecipeIngredient.query.filter(RecipeIngredient.recipe_id.in_(recipe_ids)).count() == 0
+    assert children(kept.id) == (2, 2, 0, 0)
+    assert search.search_recipes('soup').items == []
+
+def test_delete_account_route(client, default_tags, add_user, add_recipe):
+    """Test that the account is only deleted with the right password, and the user is logged out"""
+    user = add_user('cook')
+    add_recipe(user, 'Pancakes', INGREDIENTS, TAGS)
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    assert client.get('/account/delete').status_code == 200
+
+    client.post('/account/delete', data={'password': 'wrong'})
+    assert User.query.filter_by(username='cook').count() == 1
+
+    response = client.post('/account/delete', data={'password': 'password123'})
+    assert response.status_code == 302
+    assert User.query.filter_by(username='cook').count() == 0
+    assert Recipe.query.count() == 0
+    assert client.get('/account/delete').status_code == 302
@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy import event
+from app import db
+from models import Recipe, RecipeIngredient, Tag, TagType, recipe_tags
+
+@pytest.fixture(autouse=True)
+def logged_in(client, default_tags, user):
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+
+def tag_id(name):
+    return Tag.query.filter_by(name=name).one().id
+
+@pytest.fixture
+def recipe(user, add_recipe):
+    return add_recipe(user, 'Pancakes', [(2, 'cup', 'flour'), (1.5, 'cup', 'milk'), (2, 'whole', 'eggs')],
+                      ['Breakfast', 'Vegetarian'], description='Fluffy', instructions='Flip',
+                      cook_time_minutes=10, servings=4)
+
+def edit_form(ingredients, tags=('Breakfast', 'Vegetarian')):
+    data = {
+        'title': 'Pancakes', 'description': 'Fluffy', 'prep_time_minutes': 5,
+        'cook_time_minutes': 10, 'servings': 4, 'instructions': 'Flip',
+        'meal_tags': [tag_id(name) for name in tags if name in ('Breakfast', 'Lunch', 'Dinner', 'Snack', 'Dessert')],
+        'diet_tags': [tag_id(name) for name in tags if name not in ('Breakfast', 'Lunch', 'Dinner', 'Snack', 'Dessert')],
+    }
+    for i, (quantity, unit, name) in enumerate(ingredients):
+        data.update({f'ingredients-{i}-ingredient_quantity': quantity, f'ingredients-{i}-ingredient_unit': unit,
+                     f'ingredients-{i}-ingredient_name': name})
+    return data
+
+ORIGINAL = [('2', 'cup', 'flour'), ('1.5', 'cup', 'milk'), ('2', 'whole', 'eggs')]
+
+def post_counting_writes(client, recipe, data):
+    """Post the edit form and return the INSERT/UPDATE/DELETE statements it ran."""
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.post(f'/recipe/{recipe.id}/edit', data=data)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 302
+    return [statement for statement in statements if statement.split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+
+def stored_rows(recipe):
+    return {
+        (row.id, row.ingredient.name, float(row.quantity), row.unit)
+        for row in RecipeIngredient.query.filter_by(recipe_id=recipe.id)
+    }
+
+def stored_tags(recipe):
+    return {name for name, in db.session.execute(
+        db.select(Tag.name).join(recipe_tags).where(recipe_tags.c.recipe_id == recipe.id)
+    )}
+
+def test_form_is_prefilled(client, recipe):
+    """Test that the edit page shows the stored ingredients and tags"""
+    response = client.get(f'/recipe/{recipe.id}/edit')
+    assert b'value="flour"' in response.data and b'value="eggs"' in response.data
+    assert f'<option selected value="{tag_id("Breakfast")}">'.encode() in response.data
+
+def test_unchanged_form_writes_nothing(client, recipe):
+    """Test that saving without changes touches no rows and keeps updated_at"""
+    updated_at = recipe.updated_at
+    rows = stored_rows(recipe)
+    assert post_counting_writes(client, recipe, edit_form(ORIGINAL)) == []
+    assert db.session.get(Recipe, recipe.id).updated_at == updated_at
+    assert stored_rows(recipe) == rows
+
+def test_changed_quantity_is_one_update(client, recipe):
+    """Test that a changed quantity updates its row in place and bumps updated_at"""
+    updated_at = recipe.updated_at
+    before = {name: row_id for row_id, name, _, _ in stored_rows(recipe)}
+    writes = post_counting_writes(client, recipe, edit_form([('3', 'cup', 'flour'), *ORIGINAL[1:]]))
+    assert [statement for statement in writes if 'recipe_ingredients' in statement] == [
+        'UPDATE recipe_ingredients SET quantity=?, unit=? WHERE recipe_ingredients.id = ?'
+    ]
+    assert (before['flour'], 'flour', 3.0, 'cup') in stored_rows(recipe)
+    assert db.session.get(Recipe, recipe.id).updated_at > updated_at
+
+def test_added_and_removed_rows(client, recipe):
+    """Test that only removed rows are deleted and only new ones inserted"""
+    before = {name: row_id for row_id, name, _, _ in stored_rows(recipe)}
+    post_counting_writes(client, recipe, edit_form([ORIGINAL[0], ORIGINAL[2], ('1', 'tbsp', 'sugar')],
+                                                   tags=('Breakfast', 'Vegan')))
+    after = {name: row_id for row_id, name, _, _ in stored_rows(recipe)}
+    assert set(after) == {'flour', 'eggs', 'sugar'}
+    assert after['flour'] == before['flour'] and after['eggs'] == before['eggs']
+    assert stored_tags(recipe) == {'Breakfast', 'Vegan'}
+
+def test_other_tag_types_are_kept(client, recipe):
+    """Test that tags the form has no field for survive an edit"""
+    cuisine = TagType(name='cuisine')
+    db.session.add(Tag(name='French', tag_type=cuisine))
+    db.session.commit()
+    db.session.execute(recipe_tags.insert().values(recipe_id=recipe.id, tag_id=tag_id('French')))
+    db.session.commit()
+    post_counting_writes(client, recipe, edit_form(ORIGINAL, tags=('Lunch',)))
+    assert stored_tags(recipe) == {'Lunch', 'French'}
+
+def test_ingredient_edit_changes_etag(client, recipe):
+    """Test that an ingredient-only edit gives the recipe page a new ETag"""
+    etag = client.get(f'/recipe/{recipe.id}').headers['ETag']
+    post_counting_writes(client, recipe, edit_form([('2', 'cup', 'oat flour'), *ORIGINAL[1:]]))
+    response = client.get(f'/recipe/{recipe.id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'oat flour' in response.data
@@ -0,0 +1,72 @@
+import io
+import json
+import zipfile
+from sqlalchemy import event
+from app import db
+from models import Recipe
+import exporter
+import importer
+
+INGREDIENTS = [(1.5, 'cup', 'flour'), (2, 'whole', 'eggs')]
+
+def test_export_batches_children(default_tags, user, add_recipe):
+    """Test that children are loaded once per batch, not once per recipe"""
+    for i in range(7):
+        add_recipe(user, f'Bread {i}', INGREDIENTS, ['Dinner'])
+    db.session.expire_all()
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        batches = list(exporter.iter_records(batch_size=3))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    # one recipe query plus an ingredient and a tag query per batch
+    assert len(statements) == 1 + 2 * 3
+    assert batches[0][0]['ingredients'] == ['1.5 cup flour', '2 whole eggs']
+    assert batches[0][0]['tags'] == ['Dinner']
+
+def test_export_round_trips_through_import(default_tags, user, add_recipe, tmp_path):
+    """Test that an export can be imported again"""
+    add_recipe(user, 'Pancakes', INGREDIENTS, ['Dinner'])
+    path = tmp_path / 'export.jsonl'
+    path.write_bytes(b''.join(exporter.export_chunks('jsonl')))
+    importer.import_recipes(str(path), user.id)
+    copies = Recipe.query.filter_by(title='Pancakes').all()
+    assert len(copies) == 2
+    for copy in copies:
+        assert sorted((row.ingredient.name, float(row.quantity), row.unit) for row in copy.ingredients) == [
+            ('eggs', 2.0, 'whole'), ('flour', 1.5, 'cup')
+        ]
+        assert [tag.name for tag in copy.tags] == ['Dinner']
+
+def test_export_endpoint(client, default_tags, add_user, add_recipe):
+    """Test that /export streams only the user's recipes unless asked for all"""
+    cook, other = add_user('cook'), add_user('other')
+    add_recipe(cook, 'Mine', INGREDIENTS, ['Dinner'])
+    add_recipe(other, 'Theirs', INGREDIENTS, ['Dinner'])
+    assert client.get('/export').status_code == 302
+
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    response = client.get('/export')
+    assert response.is_streamed
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert [json.loads(line)['title'] for line in response.data.splitlines()] == ['Mine']
+
+    response = client.get('/export?format=zip&scope=all')
+    assert response.mimetype == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(response.data)) as bundle:
+        titles = [json.loads(line)['title'] for line in bundle.read('recipes.jsonl').splitlines()]
+        assert json.loads(bundle.read('manifest.json'))['recipes'] == 2
+    assert titles == ['Mine', 'Theirs']
+    assert client.get('/export?format=xml').status_code == 400
+
+def test_export_recipes_command(runner, default_tags, add_user, add_recipe, tmp_path):
+    """Test the flask export-recipes command"""
+    add_recipe(add_user('cook'), 'Pancakes', INGREDIENTS, ['Dinner'])
+    path = tmp_path / 'out.zip'
+    result = runner.invoke(args=['export-recipes', '--format', 'zip', '--output', str(path)])
+    assert result.exit_code == 0, result.output
+    with zipfile.ZipFile(path) as bundle:
+        assert b'Pancakes' in bundle.read('recipes.jsonl')
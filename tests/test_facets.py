@@ -0,0 +1,97 @@
+import pytest
+from datetime import datetime
+from werkzeug.datastructures import MultiDict
+from app import db
+from models import Recipe, Tag
+from recipe_index import tag_index
+from taxonomy import taxonomy
+import facets
+
+@pytest.fixture(autouse=True)
+def check_every_time(default_tags, monkeypatch):
+    monkeypatch.setattr(tag_index, 'check_interval', 0)
+    monkeypatch.setattr(taxonomy, 'check_interval', 0)
+
+def counts(facet_values, type_name):
+    return {value.tag.name: value.count for value in facet_values[type_name] if value.count}
+
+def selection(**args):
+    return facets.selected_tags(MultiDict([(key, value) for key, values in args.items() for value in values]))
+
+def test_browse_filters_and_counts(user, add_recipe):
+    """Test that tag filters combine and counts exclude their own type"""
+    add_recipe(user, 'Lentil Soup', tags=['Dinner', 'Vegan'])
+    add_recipe(user, 'Steak', tags=['Dinner'])
+    add_recipe(user, 'Smoothie', tags=['Breakfast', 'Vegan'])
+
+    page, facet_values = facets.browse('', selection(meal=['dinner']))
+    assert [recipe.title for recipe in page.items] == ['Steak', 'Lentil Soup']
+    assert counts(facet_values, 'meal') == {'Breakfast': 1, 'Dinner': 2}
+    assert counts(facet_values, 'diet') == {'Vegan': 1}
+
+    page, facet_values = facets.browse('', selection(meal=['Dinner'], diet=['Vegan']))
+    assert [recipe.title for recipe in page.items] == ['Lentil Soup']
+    assert counts(facet_values, 'meal') == {'Breakfast': 1, 'Dinner': 1}
+
+def test_browse_combines_text_query(user, add_recipe):
+    """Test that facets apply on top of the full-text matches"""
+    add_recipe(user, 'Lentil Soup', tags=['Dinner', 'Vegan'])
+    add_recipe(user, 'Chicken Soup', tags=['Dinner'])
+    add_recipe(user, 'Smoothie', tags=['Breakfast', 'Vegan'])
+    page, facet_values = facets.browse('soup', selection(diet=['Vegan']))
+    assert [recipe.title for recipe in page.items] == ['Lentil Soup']
+    assert counts(facet_values, 'meal') == {'Dinner': 1}
+
+def test_browse_orders_by_created_at(user, add_recipe):
+    """Test that tag-only browsing lists the most recently created recipes first, whatever their ids"""
+    add_recipe(user, 'Stew', tags=['Dinner'])
+    imported = add_recipe(user, 'Old Steak', tags=['Dinner'])
+    imported.created_at = datetime(2001, 1, 1)
+    db.session.commit()
+    page, _ = facets.browse('', selection(meal=['Dinner']))
+    assert [recipe.title for recipe in page.items] == ['Stew', 'Old Steak']
+
+def test_text_query_pages_past_the_first(user, add_recipe):
+    """Test that a text query without tags pages through every match and counts all of them"""
+    for i in range(5):
+        add_recipe(user, f'Soup {i}', tags=['Dinner'])
+    first, facet_values = facets.browse('soup', selection(), page=1, per_page=2)
+    last, _ = facets.browse('soup', selection(), page=3, per_page=2)
+    assert len(first.items) == 2 and first.has_next
+    assert len(last.items) == 1 and not last.has_next
+    assert counts(facet_values, 'meal') == {'Dinner': 5}
+
+def test_counts_follow_writes(user, add_recipe):
+    """Test that counts change when recipes are added and deleted"""
+    recipe = add_recipe(user, 'Steak', tags=['Dinner'])
+    assert counts(facets.facet_counts('', selection()), 'meal') == {'Dinner': 1}
+    add_recipe(user, 'Pasta', tags=['Dinner'])
+    assert counts(facets.facet_counts('', selection()), 'meal') == {'Dinner': 2}
+    db.session.delete(recipe)
+    db.session.commit()
+    assert counts(facets.facet_counts('', selection()), 'meal') == {'Dinner': 1}
+
+def test_recipes_page_shows_facets(client, user, add_recipe):
+    """Test the facet filters on the recipes page"""
+    add_recipe(user, 'Lentil Soup', tags=['Dinner', 'Vegan'])
+    add_recipe(user, 'Steak', tags=['Dinner'])
+    response = client.get('/recipes?meal=Dinner&diet=Vegan')
+    assert response.status_code == 200
+    assert b'Lentil Soup' in response.data
+    assert b'Steak' not in response.data
+    assert b'meal=Dinner' in response.data
+
+def test_new_recipe_saves_tags(client, user):
+    """Test that the tags picked on the form are saved and counted"""
+    dinner = Tag.query.filter_by(name='Dinner').one()
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    response = client.post('/new_recipe', data={
+        'title': 'Chili', 'description': 'Hot', 'prep_time_minutes': 10, 'cook_time_minutes': 60,
+        'servings': 6, 'instructions': 'Simmer', 'meal_tags': [dinner.id],
+        'ingredients-0-ingredient_quantity': '1',
+        'ingredients-0-ingredient_unit': 'lb',
+        'ingredients-0-ingredient_name': 'beans',
+    })
+    assert response.status_code == 302
+    assert [tag.name for tag in Recipe.query.filter_by(title='Chili').one().tags] == ['Dinner']
+    assert counts(facets.facet_counts('', selection()), 'meal') == {'Dinner': 1}
@@ -0,0 +1,73 @@
+import pytest
+from app import db
+
+@pytest.fixture
+def recipe(user, add_recipe):
+    return add_recipe(user, 'Chili', description='Spicy', instructions='Simmer',
+                      prep_time_minutes=10, cook_time_minutes=60, servings=6)
+
+def test_recipe_page_answers_if_none_match(client, recipe):
+    """Test that a matching ETag gets a 304 with no body"""
+    response = client.get(f'/recipe/{recipe.id}')
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert 'public' in response.headers['Cache-Control']
+    again = client.get(f'/recipe/{recipe.id}', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+
+def test_recipe_page_answers_if_modified_since(client, recipe):
+    """Test that Last-Modified can be used as a validator"""
+    response = client.get(f'/recipe/{recipe.id}')
+    again = client.get(f'/recipe/{recipe.id}', headers={'If-Modified-Since': response.headers['Last-Modified']})
+    assert again.status_code == 304
+
+def test_etag_changes_when_recipe_changes(client, recipe):
+    """Test that an update produces a new ETag"""
+    etag = client.get(f'/recipe/{recipe.id}').headers['ETag']
+    recipe.title = 'Vegetarian Chili'
+    db.session.commit()
+    response = client.get(f'/recipe/{recipe.id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Vegetarian Chili' in response.data
+
+def test_listing_is_conditional(client, recipe):
+    """Test that the recipes listing supports If-None-Match"""
+    response = client.get('/recipes')
+    again = client.get('/recipes', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+def test_logged_in_pages_are_private(client, recipe):
+    """Test that pages rendered for a user aren't marked public"""
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    client.get('/home')
+    response = client.get('/home')
+    assert 'private' in response.headers['Cache-Control']
+    again = client.get('/home', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+def test_listing_has_no_last_modified(client, user, add_recipe):
+    """Test that a listing can't be revalidated by date, which a deleted recipe doesn't move"""
+    add_recipe(user, 'Stew')
+    newest = add_recipe(user, 'Curry')
+    response = client.get('/recipes')
+    assert 'Last-Modified' not in response.headers
+    db.session.delete(newest)
+    db.session.commit()
+    again = client.get('/recipes', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert again.status_code == 200
+    assert b'Curry' not in again.data
+
+def test_listing_etag_follows_the_pager(client, user, add_recipe, monkeypatch):
+    """Test that emptying the next page changes the ETag of this one"""
+    monkeypatch.setitem(client.application.config, 'RECIPES_PER_PAGE', 1)
+    older = add_recipe(user, 'Stew')
+    add_recipe(user, 'Curry')
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    response = client.get('/home')
+    assert b'cursor=' in response.data
+    db.session.delete(older)
+    db.session.commit()
+    again = client.get('/home', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 200
+    assert b'cursor=' not in again.data
@@ -0,0 +1,143 @@
+import io
+import os
+import threading
+from concurrent.futures import Future
+import pytest
+from PIL import Image
+from app import db
+from images import InvalidImage, make_variants, recipe_images
+from models import Recipe
+from werkzeug.datastructures import FileStorage
+
+@pytest.fixture(autouse=True)
+def store_in_tmp_path(tmp_path, monkeypatch):
+    # Store under a temporary folder and make variants inside the request
+    monkeypatch.setattr(recipe_images, 'folder', str(tmp_path))
+    monkeypatch.setattr(recipe_images, 'workers', 0)
+
+@pytest.fixture(autouse=True)
+def logged_in(client, default_tags, user):
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+
+def png(width=800, height=600, color=(200, 80, 40)):
+    data = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(data, 'PNG')
+    return data.getvalue()
+
+def recipe_form(**extra):
+    return {
+        'title': 'Tart', 'description': 'Fruit', 'prep_time_minutes': 10, 'cook_time_minutes': 30,
+        'servings': 4, 'instructions': 'Bake',
+        'ingredients-0-ingredient_quantity': '1',
+        'ingredients-0-ingredient_unit': 'cup',
+        'ingredients-0-ingredient_name': 'flour',
+        **extra,
+    }
+
+def test_save_is_content_addressed(client):
+    """Test that the same bytes are stored once under their hash"""
+    first = recipe_images.save(FileStorage(io.BytesIO(png()), 'a.png'))
+    second = recipe_images.save(FileStorage(io.BytesIO(png()), 'copy.png'))
+    assert first == second
+    assert first.endswith('.png') and len(first) == 64 + 4
+    stored = os.listdir(os.path.join(recipe_images.folder, first[:2]))
+    assert stored == [first]
+    assert not [name for name in os.listdir(recipe_images.folder) if name.endswith('.upload')]
+
+def test_save_rejects_non_images(client):
+    """Test that a file Pillow can't read is refused and not kept"""
+    with pytest.raises(InvalidImage):
+        recipe_images.save(FileStorage(io.BytesIO(b'not an image'), 'fake.png'))
+    assert os.listdir(recipe_images.folder) == []
+
+def test_variants_are_resized_and_webp(client):
+    """Test that smaller widths get a PNG and a WebP copy each"""
+    filename = recipe_images.save(FileStorage(io.BytesIO(png()), 'a.png'))
+    assert recipe_images.variants(filename) == []
+    recipe_images.process(filename)
+    variants = recipe_images.variants(filename)
+    assert sorted((v['width'], v['type']) for v in variants) == [
+        (320, 'image/png'), (320, 'image/webp'), (640, 'image/png'), (640, 'image/webp'),
+    ]
+    with Image.open(os.path.join(recipe_images.folder, filename[:2], variants[0]['name'])) as image:
+        assert image.size == (320, 240)
+
+def test_missing_listing_is_remembered_until_made(client):
+    """Test that a missing listing isn't looked up again until the pool reports it made"""
+    filename = recipe_images.save(FileStorage(io.BytesIO(png()), 'a.png'))
+    assert recipe_images.variants(filename) == []
+    path = recipe_images.path(filename)
+    make_variants(path, os.path.dirname(path), filename[:-4], recipe_images.widths)
+    assert recipe_images.variants(filename) == []
+    done = Future()
+    done.set_result([])
+    recipe_images._made(done, filename)
+    assert len(recipe_images.variants(filename)) == 4
+
+def test_one_pool_per_process(monkeypatch):
+    """Test that concurrent first uploads share one pool, whose processes aren't forked from the worker"""
+    monkeypatch.setattr(recipe_images, '_pool', None)
+    monkeypatch.setattr(recipe_images, 'workers', 2)
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(recipe_images._executor())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert len({id(pool) for pool in pools}) == 1
+        assert pools[0]._mp_context.get_start_method() in ('forkserver', 'spawn')
+    finally:
+        pools[0].shutdown()
+
+def test_upload_on_new_recipe(client):
+    """Test that an uploaded photo is stored and the cards offer its variants"""
+    response = client.post('/new_recipe', data=recipe_form(image=(io.BytesIO(png()), 'tart.png')),
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    recipe = Recipe.query.filter_by(title='Tart').one()
+    assert recipe.image_filename.endswith('.png')
+
+    page = client.get('/home').data.decode()
+    stem = recipe.image_filename[:-4]
+    assert f'/images/{stem}-320.webp 320w' in page
+    assert f'/images/{stem}-640.png 640w' in page
+    assert 'loading="lazy"' in page
+    assert f'/images/{stem}-320.webp' in client.get('/recipes').data.decode()
+
+    response = client.get(f'/images/{stem}-320.webp')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+
+def test_invalid_upload_shows_error(client):
+    """Test that a broken image is reported on the form and nothing is saved"""
+    response = client.post('/new_recipe', data=recipe_form(image=(io.BytesIO(b'garbage'), 'tart.jpg')),
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert b'not a readable image' in response.data
+    assert Recipe.query.count() == 0
+
+def test_upload_with_invalid_form_is_not_stored(client):
+    """Test that a valid photo on a form that fails elsewhere leaves no file behind"""
+    response = client.post('/new_recipe', data=recipe_form(title='', image=(io.BytesIO(png()), 'tart.png')),
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert os.listdir(recipe_images.folder) == []
+
+def test_edit_replaces_image(client):
+    """Test that editing keeps the photo unless a new one is uploaded"""
+    client.post('/new_recipe', data=recipe_form(image=(io.BytesIO(png()), 'tart.png')),
+                content_type='multipart/form-data')
+    recipe = Recipe.query.filter_by(title='Tart').one()
+    original = recipe.image_filename
+
+    client.post(f'/recipe/{recipe.id}/edit', data=recipe_form(title='Plain tart'),
+                content_type='multipart/form-data')
+    db.session.expire_all()
+    assert db.session.get(Recipe, recipe.id).image_filename == original
+
+    client.post(f'/recipe/{recipe.id}/edit', data=recipe_form(image=(io.BytesIO(png(color=(0, 0, 255))), 'b.png')),
+                content_type='multipart/form-data')
+    db.session.expire_all()
+    assert db.session.get(Recipe, recipe.id).image_filename not in (None, original)
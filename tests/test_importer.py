@@ -0,0 +1,96 @@
+import csv
+import json
+import pytest
+from app import create_default_tags
+from forms import UNIT_CHOICES
+from ingredients import UNIT_ALIASES, parse_ingredient_line
+from models import Recipe, RecipeIngredient
+import importer
+import search
+
+def write_jsonl(path, records):
+    with open(path, 'w') as f:
+        for record in records:
+            f.write((record if isinstance(record, str) else json.dumps(record)) + '\n')
+
+def recipe_record(i, **extra):
+    return {'title': f'Soup {i}', 'instructions': 'Simmer', 'servings': 4,
+            'ingredients': ['2 cups stock', '1/2 tsp salt'], **extra}
+
+@pytest.mark.parametrize('line, expected', [
+    ('2 tbsp cinnamon', (2.0, 'tbsp', 'cinnamon')),
+    ('1/4 cup butter', (0.25, 'cup', 'butter')),
+    ('1 1/2 cups of flour', (1.5, 'cup', 'flour')),
+    ('½ tsp salt', (0.5, 'tsp', 'salt')),
+    ('2-3 cloves garlic', (2.0, 'piece', 'garlic')),
+    ('1 kg potatoes', (1000.0, 'g', 'potatoes')),
+    ('2 pie crusts', (2.0, 'whole', 'pie crusts')),
+    ('salt to taste', (1.0, 'whole', 'salt to taste')),
+])
+def test_parse_ingredient_line(line, expected):
+    """Test that quantities, fractions and units are parsed"""
+    assert tuple(parse_ingredient_line(line)) == expected
+
+def test_units_match_form_choices():
+    """Test that every parsed unit is one the recipe form offers"""
+    assert set(UNIT_ALIASES) == {value for value, _ in UNIT_CHOICES}
+
+def test_import_jsonl_in_batches(user, tmp_path):
+    """Test that a JSONL file is imported with ingredients, tags and search"""
+    create_default_tags()
+    path = str(tmp_path / 'recipes.jsonl')
+    write_jsonl(path, [recipe_record(i) for i in range(5)] + ['not json', {'title': 'No steps'}]
+                + [recipe_record(5, title='Vegan Chili', tags='Dinner, vegan')])
+    reports = []
+    stats = importer.import_recipes(path, user.id, batch_size=2, report=lambda *args: reports.append(args))
+    assert (stats.imported, stats.skipped) == (6, 2)
+    assert len(reports) == 4
+    assert Recipe.query.count() == 6
+    assert RecipeIngredient.query.count() == 12
+    chili = Recipe.query.filter_by(title='Vegan Chili').one()
+    assert sorted(tag.name for tag in chili.tags) == ['Dinner', 'Vegan']
+    assert search.search_recipes('chili').items == [chili]
+    assert not (tmp_path / 'recipes.jsonl.progress').exists()
+
+def test_import_csv(user, tmp_path):
+    """Test that CSV rows with multi-line ingredient cells are imported"""
+    path = tmp_path / 'recipes.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, ['title', 'instructions', 'ingredients'])
+        writer.writeheader()
+        writer.writerow({'title': 'Toast', 'instructions': 'Toast it', 'ingredients': '2 slices bread\n1 tbsp butter'})
+    stats = importer.import_recipes(str(path), user.id)
+    assert stats.imported == 1
+    units = sorted(row.unit for row in RecipeIngredient.query.all())
+    assert units == ['piece', 'tbsp']
+
+def test_import_resumes_after_failure(user, tmp_path, monkeypatch):
+    """Test that a failed batch is rolled back and a rerun continues after the last good one"""
+    path = str(tmp_path / 'recipes.jsonl')
+    write_jsonl(path, [recipe_record(i) for i in range(6)])
+    write_batch = importer._write_batch
+    calls = []
+    def failing(batch, tag_ids):
+        calls.append(batch)
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        return write_batch(batch, tag_ids)
+    monkeypatch.setattr(importer, '_write_batch', failing)
+    with pytest.raises(RuntimeError):
+        importer.import_recipes(path, user.id, batch_size=2)
+    assert Recipe.query.count() == 2
+    assert importer.load_progress(path) == 2
+
+    monkeypatch.setattr(importer, '_write_batch', write_batch)
+    stats = importer.import_recipes(path, user.id, batch_size=2)
+    assert (stats.resumed_from, stats.imported) == (2, 4)
+    assert sorted(recipe.title for recipe in Recipe.query.all()) == [f'Soup {i}' for i in range(6)]
+
+def test_import_recipes_command(runner, user, tmp_path):
+    """Test the flask import-recipes command"""
+    path = str(tmp_path / 'recipes.jsonl')
+    write_jsonl(path, [recipe_record(i) for i in range(3)])
+    result = runner.invoke(args=['import-recipes', path, '--user', 'cook@test.com', '--batch-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 3 recipes' in result.output
+    assert 'rows/s' in result.output
@@ -0,0 +1,49 @@
+from sqlalchemy import event
+from app import db
+from models import User, Recipe, Ingredient, RecipeIngredient
+from ingredients import resolve_ingredient_ids
+
+def test_resolve_ingredient_ids_reuses_and_creates(client):
+    """Test that existing names are reused and missing ones inserted"""
+    db.session.add(Ingredient(name='flour'))
+    db.session.commit()
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        ids = resolve_ingredient_ids(['flour', ' sugar ', 'sugar', 'eggs', ''])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    db.session.commit()
+    assert set(ids) == {'flour', 'sugar', 'eggs'}
+    assert Ingredient.query.count() == 3
+    # one lookup, one bulk insert, one version bump, one lookup of the new rows
+    assert len(statements) == 4
+
+def test_new_recipe_with_ingredients(client):
+    """Test that a recipe and its ingredients are saved together"""
+    user = User(username='cook', email='cook@test.com')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.add(Ingredient(name='butter'))
+    db.session.commit()
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    response = client.post('/new_recipe', data={
+        'title': 'Shortbread',
+        'description': 'Crumbly',
+        'prep_time_minutes': 10,
+        'cook_time_minutes': 20,
+        'servings': 12,
+        'instructions': 'Mix and bake',
+        'ingredients-0-ingredient_quantity': '1',
+        'ingredients-0-ingredient_unit': 'cup',
+        'ingredients-0-ingredient_name': 'butter',
+        'ingredients-1-ingredient_quantity': '2',
+        'ingredients-1-ingredient_unit': 'cup',
+        'ingredients-1-ingredient_name': 'flour',
+    })
+    assert response.status_code == 302
+    recipe = Recipe.query.filter_by(title='Shortbread').one()
+    rows = RecipeIngredient.query.filter_by(recipe_id=recipe.id).all()
+    assert sorted(row.ingredient.name for row in rows) == ['butter', 'flour']
+    assert Ingredient.query.count() == 2
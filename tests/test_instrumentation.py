@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+from app import app, db
+from flask import Response
+from instrumentation import instrumentation, statement_shape
+from models import Ingredient
+
+def test_statement_shape_ignores_values():
+    """Test that statements differing only in values share a shape"""
+    assert statement_shape("SELECT * FROM t WHERE id = 5 AND name = 'x'") == \
+        statement_shape("SELECT * FROM t WHERE id = 12 AND name = 'y'")
+    assert statement_shape('SELECT * FROM t WHERE id IN (?, ?, ?)') == \
+        statement_shape('SELECT * FROM t WHERE id IN (?)')
+
+@pytest.fixture
+def server_timing():
+    instrumentation.server_timing = True
+    yield
+    instrumentation.server_timing = app.config['SERVER_TIMING']
+
+def test_server_timing_is_opt_in(client):
+    """Test that the header is left out unless SERVER_TIMING is on"""
+    assert not app.config['SERVER_TIMING']
+    assert 'Server-Timing' not in client.get('/recipes').headers
+
+def test_server_timing_header(client, server_timing):
+    """Test that responses report query count, DB and template time"""
+    response = client.get('/recipes')
+    timing = response.headers['Server-Timing']
+    assert 'db;dur=' in timing
+    assert 'queries' in timing
+    assert 'tpl;dur=' in timing
+    assert 'app;dur=' in timing
+
+def test_failed_statement_leaves_no_timer(client, server_timing):
+    """Test that a statement that raises doesn't throw off the timing of later ones"""
+    with app.test_request_context('/recipes'):
+        instrumentation._start_request()
+        with pytest.raises(Exception):
+            db.session.execute(db.text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        db.session.execute(db.select(Ingredient.name)).all()
+        response = instrumentation._finish_request(Response())
+    assert '1 queries' in response.headers['Server-Timing']
+
+def test_n_plus_one_is_logged(client, caplog, server_timing):
+    """Test that a repeated statement shape within one request is flagged"""
+    for i in range(4):
+        db.session.add(Ingredient(name=f'leaf {i}'))
+    db.session.commit()
+
+    threshold = instrumentation.n_plus_one_threshold
+    instrumentation.n_plus_one_threshold = 2
+    try:
+        with caplog.at_level(logging.WARNING, logger='instrumentation'):
+            with app.test_request_context('/recipes'):
+                instrumentation._start_request()
+                for i in range(4):
+                    db.session.execute(db.select(Ingredient.name).where(Ingredient.id == i + 1)).all()
+                response = instrumentation._finish_request(Response())
+    finally:
+        instrumentation.n_plus_one_threshold = threshold
+    assert '4 queries' in response.headers['Server-Timing']
+    assert any('Possible N+1' in message for message in caplog.messages)
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from app import app, db
+from models import Recipe
+from pagination import decode_cursor, encode_cursor, paginate_recipes
+
+def create_recipes(user, count):
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        db.session.add(Recipe(
+            title=f'Recipe {i}', description='Tasty', instructions='Cook it',
+            prep_time_minutes=5, cook_time_minutes=5, servings=2,
+            user_id=user.id, created_at=start + timedelta(days=i)
+        ))
+    db.session.commit()
+
+def test_cursor_round_trip():
+    """Test that cursors decode to the position they were built from"""
+    created_at = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    assert decode_cursor('not-a-cursor') is None
+
+def test_paginate_recipes_walks_all_rows(user):
+    """Test that following next cursors visits every recipe once, newest first"""
+    create_recipes(user, 5)
+    seen = []
+    cursor = None
+    while True:
+        page = paginate_recipes(Recipe.query, cursor, per_page=2)
+        seen.extend(recipe.title for recipe in page.items)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert seen == [f'Recipe {i}' for i in range(4, -1, -1)]
+
+def test_home_is_paginated(client, user):
+    """Test that the home feed only renders one page and links to the next"""
+    create_recipes(user, 3)
+    app.config['RECIPES_PER_PAGE'] = 2
+    try:
+        client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+        response = client.get('/home')
+        assert b'Recipe 2' in response.data
+        assert b'Recipe 0' not in response.data
+        assert b'Older Recipes' in response.data
+    finally:
+        app.config['RECIPES_PER_PAGE'] = 24
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from app import db
+from extensions import password_hasher
+from models import User
+from passwords import HashingBusy, PasswordHasher
+
+def add_user_with_hash(password_hash):
+    user = User(username='cook', email='cook@test.com', password_hash=password_hash)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def login(client, password='password123'):
+    return client.post('/login', data={'email': 'cook@test.com', 'password': password})
+
+def test_hash_and_verify_on_the_pool():
+    """Test that hashes made on the pool use the configured parameters"""
+    other = Flask(__name__)
+    other.config.update(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', PASSWORD_HASH_WORKERS=2)
+    hasher = PasswordHasher(other)
+    password_hash = hasher.hash('secret')
+    assert password_hash.startswith('pbkdf2:sha256:1000$')
+    assert hasher.verify(password_hash, 'secret')
+    assert not hasher.verify(password_hash, 'wrong')
+    assert not hasher.needs_rehash(password_hash)
+    assert hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:2000'))
+
+def test_concurrent_logins_share_one_pool():
+    """Test that the first hashes arriving together don't each make a pool"""
+    hasher = PasswordHasher()
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(hasher._executor())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(pool) for pool in pools}) == 1
+    pools[0].shutdown()
+
+def test_login_upgrades_old_hashes(client):
+    """Test that a hash made with other parameters is replaced on login"""
+    add_user_with_hash(generate_password_hash('password123', 'pbkdf2:sha256:1000'))
+    assert login(client).status_code == 302
+    user = User.query.filter_by(email='cook@test.com').one()
+    assert not user.password_needs_rehash()
+    assert user.check_password('password123')
+
+def test_failed_login_keeps_hash(client):
+    """Test that a wrong password doesn't touch the stored hash"""
+    old = generate_password_hash('password123', 'pbkdf2:sha256:1000')
+    add_user_with_hash(old)
+    login(client, 'wrong')
+    assert User.query.filter_by(email='cook@test.com').one().password_hash == old
+
+def test_full_queue_fails_fast(client, monkeypatch):
+    """Test that logins get a 503 at once when too many hashes are pending"""
+    add_user_with_hash(generate_password_hash('password123'))
+    monkeypatch.setattr(password_hasher, '_slots', threading.BoundedSemaphore(1))
+    password_hasher._slots.acquire()
+    with pytest.raises(HashingBusy):
+        password_hasher.verify(User.query.one().password_hash, 'password123')
+    response = login(client)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(password_hasher.retry_after)
+
+    password_hasher._slots.release()
+    assert login(client).status_code == 302
@@ -0,0 +1,19 @@
+import pytest
+from app import db
+from query_plans import explain, main_route_queries, uses_index
+
+def test_main_route_queries_use_indexes(client):
+    """Test that every main route query is planned with an index"""
+    with db.engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect != 'sqlite':
+            pytest.skip('query plans are only checked on SQLite')
+        for description, query in main_route_queries():
+            plan = explain(connection, query)
+            assert uses_index(dialect, plan), f'{description}: {plan}'
+
+def test_full_scan_is_flagged():
+    """Test that a bare table scan counts as a missing index"""
+    assert not uses_index('sqlite', ['SCAN recipes'])
+    assert uses_index('sqlite', ['SCAN recipes USING INDEX ix_recipes_created_at_id'])
+    assert not uses_index('postgresql', ['Seq Scan on recipes  (cost=0.00..1.01 rows=1 width=4)'])
@@ -0,0 +1,68 @@
+import random
+import pytest
+from app import db
+from models import RecipeIngredient
+from recipe_index import bitmap, cook_with, ingredient_index, iter_ids
+
+@pytest.fixture(autouse=True)
+def check_every_time(monkeypatch):
+    monkeypatch.setattr(ingredient_index, 'check_interval', 0)
+
+def titles(page):
+    return [match.recipe.title for match in page.items]
+
+def test_bitmap_round_trip():
+    """Test that bitmap and iter_ids agree"""
+    assert list(iter_ids(bitmap([3, 70, 0, 9]))) == [70, 9, 3, 0]
+    assert bitmap([]) == 0
+
+def test_cook_with_ranks_by_coverage(user, add_recipe):
+    """Test that recipes are ordered by the share of ingredients on hand"""
+    add_recipe(user, 'Pancakes', ['eggs', 'flour', 'milk', 'sugar'])
+    add_recipe(user, 'Omelette', ['eggs', 'milk'])
+    add_recipe(user, 'Salad', ['lettuce', 'tomatoes'])
+    page, unknown = cook_with(['Eggs', 'milk', 'flour', 'saffron'])
+    assert titles(page) == ['Omelette', 'Pancakes']
+    assert [(match.matched, match.total) for match in page.items] == [(2, 2), (3, 4)]
+    assert unknown == ['saffron']
+
+def test_cook_with_follows_writes(user, add_recipe):
+    """Test that new, changed and deleted recipes reach the index"""
+    add_recipe(user, 'Omelette', ['eggs', 'milk'])
+    assert titles(cook_with(['eggs'])[0]) == ['Omelette']
+
+    toast = add_recipe(user, 'French Toast', ['eggs', 'bread'])
+    assert titles(cook_with(['eggs', 'bread'])[0]) == ['French Toast', 'Omelette']
+
+    db.session.execute(db.delete(RecipeIngredient).where(RecipeIngredient.recipe_id == toast.id))
+    db.session.delete(toast)
+    db.session.commit()
+    assert titles(cook_with(['eggs', 'bread'])[0]) == ['Omelette']
+
+def test_coverage_matches_brute_force(user, add_recipe):
+    """Test the bit-sliced ranking against a direct computation"""
+    rng = random.Random(7)
+    pantry = [f'item {i}' for i in range(12)]
+    recipes = {}
+    for i in range(40):
+        names = rng.sample(pantry, rng.randint(1, 8))
+        recipes[add_recipe(user, f'Dish {i}', names).id] = set(names)
+
+    have = set(rng.sample(pantry, 5))
+    page, _ = cook_with(sorted(have), per_page=100)
+    expected = sorted(
+        ((len(names & have) / len(names), len(names & have), recipe_id) for recipe_id, names in recipes.items() if names & have),
+        reverse=True
+    )
+    assert [match.recipe.id for match in page.items] == [recipe_id for _, _, recipe_id in expected]
+
+    second, _ = cook_with(sorted(have), page=2, per_page=5)
+    assert [match.recipe.id for match in second.items] == [recipe_id for _, _, recipe_id in expected[5:10]]
+
+def test_cook_page(client, user, add_recipe):
+    """Test the cook page lists matching recipes"""
+    add_recipe(user, 'Omelette', ['eggs', 'milk'])
+    response = client.get('/cook?ingredients=eggs, milk')
+    assert response.status_code == 200
+    assert b'Omelette' in response.data
+    assert b'You have 2 of 2 ingredients' in response.data
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from app import db
+from ingredients import resolve_ingredient_ids
+from models import Recipe, RecipeIngredient, RecipeNeighbor, RecipeNeighborList
+from recipe_index import WATERMARK_OVERLAP
+import recommendations
+
+def neighbors(recipe):
+    return [other.title for other, _ in recommendations.related_recipes(recipe.id)]
+
+def backdate(*recipes, before=None):
+    """Set updated_at as if the recipes were last edited before the given time, or well before now."""
+    updated_at = (before or datetime.utcnow() - 2 * WATERMARK_OVERLAP) - timedelta(seconds=1)
+    db.session.execute(db.update(Recipe).where(Recipe.id.in_([recipe.id for recipe in recipes]))
+                       .values(updated_at=updated_at))
+    db.session.commit()
+
+@pytest.fixture
+def recipes(default_tags, user, add_recipe):
+    recipes = {
+        'pancakes': add_recipe(user, 'Pancakes', ['flour', 'eggs', 'milk', 'salt'], ['Breakfast']),
+        'crepes': add_recipe(user, 'Crepes', ['flour', 'eggs', 'milk', 'butter', 'salt'], ['Breakfast']),
+        'waffles': add_recipe(user, 'Waffles', ['flour', 'eggs', 'butter', 'salt'], ['Breakfast']),
+        'salsa': add_recipe(user, 'Salsa', ['tomato', 'onion', 'chili', 'salt'], ['Snack']),
+        'guacamole': add_recipe(user, 'Guacamole', ['avocado', 'onion', 'chili', 'lime', 'salt'], ['Snack']),
+    }
+    # Recent edits are always looked at again, so the fixture's recipes are old ones
+    backdate(*recipes.values())
+    return recipes
+
+def test_full_run_ranks_by_shared_ingredients(recipes):
+    """Test that the closest recipes come first and unrelated ones are left out"""
+    stats = recommendations.compute_neighbors(k=3, full=True)
+    assert stats.full and stats.recomputed == 5
+    assert neighbors(recipes['pancakes'])[0] == 'Crepes'
+    assert set(neighbors(recipes['pancakes'])) == {'Crepes', 'Waffles'}
+    assert neighbors(recipes['salsa']) == ['Guacamole']
+
+def test_common_ingredients_count_for_little(recipes):
+    """Test that sharing only salt is below the score threshold"""
+    recommendations.compute_neighbors(k=5, full=True)
+    assert 'Salsa' not in neighbors(recipes['waffles'])
+
+def test_incremental_run_updates_affected_lists(recipes, user, add_recipe):
+    """Test that a new recipe gets a list and joins the lists it belongs in"""
+    recommendations.compute_neighbors(k=3)
+    salsa_list = db.session.execute(
+        db.select(RecipeNeighbor.computed_at).where(RecipeNeighbor.recipe_id == recipes['salsa'].id)
+    ).scalars().all()
+
+    blini = add_recipe(user, 'Blini', ['flour', 'eggs', 'milk', 'butter', 'yeast'], ['Breakfast'])
+    stats = recommendations.compute_neighbors(k=3)
+    assert not stats.full
+    assert stats.recomputed < 6
+    assert 'Crepes' in neighbors(blini)
+    assert 'Blini' in neighbors(recipes['crepes'])
+    # Lists the new recipe can't reach are left alone
+    assert db.session.execute(
+        db.select(RecipeNeighbor.computed_at).where(RecipeNeighbor.recipe_id == recipes['salsa'].id)
+    ).scalars().all() == salsa_list
+
+def test_recipes_without_neighbors_are_not_recomputed(recipes, user, add_recipe):
+    """Test that an empty list counts as computed, so a run with no changes recomputes nothing"""
+    loner = add_recipe(user, 'Ice Cubes', ['water'])
+    recommendations.compute_neighbors(k=3)
+    assert neighbors(loner) == []
+    backdate(loner)
+    stats = recommendations.compute_neighbors(k=3)
+    assert not stats.full and stats.recomputed == 0
+
+def test_late_commits_are_recomputed(recipes):
+    """Test that an edit stamped before the last run but committed after it still gets recomputed"""
+    recommendations.compute_neighbors(k=3)
+    computed_at = db.session.execute(db.select(db.func.max(RecipeNeighborList.computed_at))).scalar()
+    crepes = recipes['crepes']
+    RecipeIngredient.query.filter_by(recipe_id=crepes.id).delete()
+    ids = resolve_ingredient_ids(['tomato', 'onion', 'chili', 'lime'])
+    db.session.execute(db.insert(RecipeIngredient), [
+        {'recipe_id': crepes.id, 'ingredient_id': ingredient_id, 'quantity': 1, 'unit': 'cup'} for ingredient_id in ids.values()
+    ])
+    db.session.commit()
+    backdate(crepes, before=computed_at)
+    stats = recommendations.compute_neighbors(k=3)
+    assert not stats.full
+    assert 'Salsa' in neighbors(crepes)
+
+def test_deleted_recipes_drop_out(recipes):
+    """Test that lists pointing at a deleted recipe are cleaned up"""
+    recommendations.compute_neighbors(k=3)
+    crepes = recipes['crepes']
+    RecipeIngredient.query.filter_by(recipe_id=crepes.id).delete()
+    crepes.tags = []
+    db.session.delete(crepes)
+    db.session.commit()
+    recommendations.compute_neighbors(k=3)
+    assert 'Crepes' not in neighbors(recipes['pancakes'])
+    assert neighbors(recipes['pancakes']) == ['Waffles']
+
+def test_recipe_page_shows_more_like_this(client, recipes):
+    """Test that the page lists neighbors with one lookup and changes ETag when they do"""
+    page = client.get(f'/recipe/{recipes["pancakes"].id}')
+    assert b'More like this' not in page.data
+
+    recommendations.compute_neighbors(k=3)
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        again = client.get(f'/recipe/{recipes["pancakes"].id}', headers={'If-None-Match': page.headers['ETag']})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert again.status_code == 200
+    assert b'More like this' in again.data and b'Crepes' in again.data
+    assert sum('recipe_neighbors' in statement for statement in statements) == 1
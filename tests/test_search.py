@@ -0,0 +1,45 @@
+from app import db
+import search
+
+def test_search_ranks_title_matches_first(user, add_recipe):
+    """Test that a title hit outranks a hit in the instructions"""
+    add_recipe(user, 'Weeknight Pasta', instructions='Boil the lasagna sheets')
+    add_recipe(user, 'Classic Lasagna', instructions='Layer and bake')
+    add_recipe(user, 'Banana Bread')
+    titles = [recipe.title for recipe in search.search_recipes('lasagna').items]
+    assert titles == ['Classic Lasagna', 'Weeknight Pasta']
+
+def test_search_index_follows_writes(user, add_recipe):
+    """Test that edits and deletes are reflected in search results"""
+    recipe = add_recipe(user, 'Tomato Soup')
+    assert search.search_recipes('tomato').items == [recipe]
+    recipe.title = 'Carrot Soup'
+    db.session.commit()
+    assert search.search_recipes('tomato').items == []
+    assert search.search_recipes('carrot').items == [recipe]
+    db.session.delete(recipe)
+    db.session.commit()
+    assert search.search_recipes('carrot').items == []
+
+def test_search_is_paginated(user, add_recipe):
+    """Test that results are split into pages"""
+    for i in range(3):
+        add_recipe(user, f'Curry {i}')
+    first = search.search_recipes('curry', page=1, per_page=2)
+    second = search.search_recipes('curry', page=2, per_page=2)
+    assert len(first.items) == 2 and first.has_next
+    assert len(second.items) == 1 and not second.has_next
+
+def test_recipes_page_search(client, user, add_recipe):
+    """Test that the recipes page renders search results"""
+    add_recipe(user, 'Apple Pie', description='Grandma\'s favourite')
+    response = client.get('/recipes?q=apple')
+    assert response.status_code == 200
+    assert b'Apple Pie' in response.data
+
+def test_rebuild_search_index_command(runner, user, add_recipe):
+    """Test that the CLI command rebuilds the index"""
+    add_recipe(user, 'Fish Tacos')
+    result = runner.invoke(args=['rebuild-search-index'])
+    assert 'rebuilt' in result.output
+    assert [recipe.title for recipe in search.search_recipes('tacos').items] == ['Fish Tacos']
@@ -0,0 +1,53 @@
+from sqlalchemy import event
+from app import db
+import shopping
+
+def by_name(items):
+    return {(item.name, item.unit): (item.quantity, item.recipes) for item in items}
+
+def test_scales_converts_and_sums(user, add_recipe):
+    """Test that quantities are scaled to the planned servings and summed in base units"""
+    pancakes = add_recipe(user, 'Pancakes', [(1, 'cup', 'flour'), (2, 'whole', 'eggs'), (1, 'pinch', 'salt')], servings=4)
+    bread = add_recipe(user, 'Bread', [(500, 'g', 'flour'), (1, 'tsp', 'salt'), (1, 'piece', 'eggs')], servings=2)
+    items = by_name(shopping.shopping_list({pancakes.id: 8, bread.id: 2}))
+    assert items[('flour', 'ml')] == (473.18, 1)
+    assert items[('flour', 'g')] == (500, 1)
+    assert items[('eggs', 'piece')] == (5, 2)
+    assert items[('salt', 'pinch')] == (2, 1)
+    assert items[('salt', 'ml')] == (4.93, 1)
+
+def test_large_totals_use_larger_units(user, add_recipe):
+    """Test that 1000 g or more is shown in kg"""
+    recipe = add_recipe(user, 'Stew', [(1.5, 'lb', 'beef')], servings=2)
+    assert by_name(shopping.shopping_list({recipe.id: 4})) == {('beef', 'kg'): (1.36, 1)}
+
+def test_fifty_recipe_plan_is_one_query(user, add_recipe):
+    """Test that the whole list comes from a single query"""
+    plan = {
+        add_recipe(user, f'Dish {i}', [(1, 'cup', 'rice'), (100, 'g', f'spice {i % 5}'), (2, 'oz', 'butter')], servings=4).id: 6
+        for i in range(50)
+    }
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        items = by_name(shopping.shopping_list(plan))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(statements) == 1
+    assert items[('rice', 'l')] == (17.74, 50)
+    assert items[('spice 0', 'kg')] == (1.5, 10)
+
+def test_plan_pages(client, user, add_recipe):
+    """Test adding, changing and removing recipes in the session plan"""
+    recipe = add_recipe(user, 'Soup', [(1, 'cup', 'stock')], servings=2)
+    client.post('/login', data={'email': 'cook@test.com', 'password': 'password123'})
+    response = client.post(f'/plan/{recipe.id}', data={'servings': 4})
+    assert response.status_code == 302
+    page = client.get('/plan')
+    assert 'no-store' in page.headers['Cache-Control']
+    assert b'Soup' in page.data and b'473.18 ml' in page.data
+
+    client.post(f'/plan/{recipe.id}', data={'servings': 0})
+    assert b'Your plan is empty' in client.get('/plan').data
+    assert client.post('/plan/9999', data={'servings': 1}).status_code == 404
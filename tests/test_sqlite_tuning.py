@@ -0,0 +1,43 @@
+import sqlite3
+
+from flask import Flask
+
+from app import app, db
+from sqlite_tuning import SQLiteTuning, apply_pragmas, run_maintenance
+
+def tuned_app(tmp_path, **config):
+    # A file database of its own: WAL and the maintenance run need one, whatever DATABASE_URL is
+    tuned = Flask(__name__)
+    tuned.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "tuned.db"}',
+                        SQLITE_PRAGMAS=app.config['SQLITE_PRAGMAS'], **config)
+    db.init_app(tuned)
+    SQLiteTuning(tuned)
+    return tuned
+
+def test_profile_applied_to_app_connections(tmp_path):
+    """Test that new engine connections get the configured pragmas"""
+    with tuned_app(tmp_path).app_context():
+        with db.engine.connect() as connection:
+            assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+            busy_timeout = connection.exec_driver_sql('PRAGMA busy_timeout').scalar()
+            assert connection.exec_driver_sql('PRAGMA foreign_keys').scalar() == 1
+        assert busy_timeout == app.config['SQLITE_PRAGMAS']['busy_timeout']
+        run_maintenance(db.engine)
+        db.engine.dispose()
+
+def test_foreign_keys_without_tuning(tmp_path):
+    """Test that foreign keys are enforced even with the tuning profile off"""
+    with tuned_app(tmp_path, SQLITE_TUNING=False).app_context():
+        with db.engine.connect() as connection:
+            assert connection.exec_driver_sql('PRAGMA foreign_keys').scalar() == 1
+            assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() != 'wal'
+        db.engine.dispose()
+
+def test_apply_pragmas(tmp_path):
+    """Test that apply_pragmas sets every pragma on a raw connection"""
+    conn = sqlite3.connect(str(tmp_path / 'tuned.db'))
+    apply_pragmas(conn, {'synchronous': 'NORMAL', 'journal_mode': 'WAL', 'temp_store': 'MEMORY'})
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+    assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2
+    conn.close()
@@ -0,0 +1,34 @@
+import pytest
+from app import app, db
+from forms import RecipeForm
+from models import CacheVersion, Tag, TagType
+from taxonomy import taxonomy
+
+@pytest.fixture(autouse=True)
+def check_every_time(monkeypatch):
+    monkeypatch.setattr(taxonomy, 'check_interval', 0)
+
+def test_init_tags_bumps_version(runner, client):
+    """Test that writing tags moves the taxonomy version"""
+    assert CacheVersion.current(db.session.connection(), 'taxonomy') == 0
+    runner.invoke(args=['init-tags'])
+    assert CacheVersion.current(db.session.connection(), 'taxonomy') > 0
+
+def test_form_choices_come_from_taxonomy(runner, client):
+    """Test that RecipeForm uses the cached tags and sees new ones"""
+    runner.invoke(args=['init-tags'])
+    with app.test_request_context():
+        form = RecipeForm()
+    assert [name for _, name in form.meal_tags.choices][:2] == ['Breakfast', 'Lunch']
+    assert 'Vegan' in [name for _, name in form.diet_tags.choices]
+
+    diet = TagType.query.filter_by(name='diet').one()
+    db.session.add(Tag(name='Paleo', tag_type=diet))
+    db.session.commit()
+    assert 'Paleo' in [name for _, name in taxonomy.choices('diet')]
+
+def test_taxonomy_is_not_reloaded_when_unchanged(runner, client):
+    """Test that an unchanged version doesn't reload the tags"""
+    runner.invoke(args=['init-tags'])
+    tags = taxonomy.tags('meal')
+    assert taxonomy.tags('meal') is tags